@@ -5,6 +5,7 @@
 import streamlit as st
 from streamlit_option_menu import option_menu
 import os
+import itertools
 import sys
 from pathlib import Path
 from dotenv import load_dotenv
@@ -16,13 +17,14 @@ load_dotenv()
 sys.path.insert(0, str(Path(__file__).parent))
 
 from modules import (
-    get_llm, LLMClient,
-    DocumentProcessor, PDFEditor, DocumentIndex,
-    DocumentTranslator,
+    get_config, get_llm, LLMClient,
+    DocumentProcessor, PDFEditor, DocumentIndex, ExtractionCache,
+    DocumentTranslator, TranslationMemory, TranslationJobStore, PDFTranslator,
     EmailClient, compose_email_with_llm,
     ImageProcessor,
     ProgressTracker, create_offer_application, create_visa_application,
-    WebSearcher, search_and_summarize
+    WebSearcher, search_and_summarize,
+    PromptBudget
 )
 
 # 页面配置
@@ -72,10 +74,19 @@ def init_services():
         services['llm_available'] = False
     
     # 其他服务
-    services['doc_processor'] = DocumentProcessor("./uploads")
+    config = get_config()
+    services['doc_processor'] = DocumentProcessor(
+        "./uploads", extraction_cache=ExtractionCache("./data/extraction_cache"))
     services['pdf_editor'] = PDFEditor()
-    services['doc_index'] = DocumentIndex("./data/chroma")
-    services['translator'] = DocumentTranslator()
+    services['doc_index'] = DocumentIndex(
+        "./data/chroma", doc_processor=services['doc_processor'],
+        summary_max_tokens=config.get("documents", "summary_max_tokens", 8000))
+    # 翻译记忆库：各翻译页面共用，重复出现的段落直接复用已有译文
+    services['translation_memory'] = TranslationMemory(
+        config.get("translation", "memory_path", "./data/translation_memory.db")
+    ) if config.get("translation", "memory_enabled", True) else None
+    services['translator'] = DocumentTranslator(memory=services['translation_memory'])
+    services['translation_jobs'] = TranslationJobStore("./data/translation_jobs.db")
     services['image_processor'] = ImageProcessor("./uploads")
     services['progress_tracker'] = ProgressTracker("./data/progress.db")
     services['web_searcher'] = WebSearcher()
@@ -183,8 +194,8 @@ elif selected == "文档管理":
         
         uploaded_file = st.file_uploader(
             "选择文件",
-            type=['pdf', 'docx', 'txt'],
-            help="支持 PDF、Word、TXT 文件"
+            type=['pdf', 'docx', 'txt', 'xlsx', 'xls'],
+            help="支持 PDF、Word、TXT、Excel 文件"
         )
         
         if uploaded_file:
@@ -200,7 +211,7 @@ elif selected == "文档管理":
             if st.button("索引此文档", type="primary"):
                 with st.spinner("正在索引..."):
                     result = services['doc_index'].add_document(str(save_path))
-                    
+                
                 if result['status'] == 'success':
                     st.success(f"✅ 索引成功！共 {result['pages']} 页")
                 elif result['status'] == 'already_indexed':
@@ -266,8 +277,8 @@ elif selected == "内容创作":
                 with open(save_path, 'wb') as f:
                     f.write(ref_file.getvalue())
                 
-                pages = services['doc_processor'].extract_text(str(save_path))
-                ref_content = "\n\n".join([p['content'] for p in pages[:10]])
+                pages = services['doc_processor'].iter_pages(str(save_path))
+                ref_content = "\n\n".join([p['content'] for p in itertools.islice(pages, 10)])
                 st.success(f"已加载参考材料: {ref_file.name}")
             
             # 网络搜索
@@ -302,16 +313,25 @@ elif selected == "内容创作":
 {requirements}
 
 """
-                    if ref_content:
+                    # 按模型上下文窗口分配参考材料和搜索结果的长度
+                    budget = PromptBudget(services['llm'].model)
+                    budget.add("instructions", prompt, priority=10, truncatable=False)
+                    budget.add("参考材料", ref_content, priority=2)
+                    budget.add("网络搜索结果", search_results, priority=1)
+                    packed = budget.pack()
+                    if packed.truncated:
+                        st.info(f"内容超出模型上下文，已截断：{packed.report()}")
+                    
+                    if packed["参考材料"]:
                         prompt += f"""
 参考材料：
-{ref_content[:8000]}
+{packed["参考材料"]}
 
 """
-                    if search_results:
+                    if packed["网络搜索结果"]:
                         prompt += f"""
 网络搜索结果：
-{search_results[:4000]}
+{packed["网络搜索结果"]}
 
 """
                     
@@ -356,7 +376,8 @@ elif selected == "文档翻译":
         if st.button("翻译", type="primary") and source_text:
             translator = DocumentTranslator(
                 use_llm=use_llm and services['llm_available'],
-                llm_client=services['llm'] if use_llm else None
+                llm_client=services['llm'] if use_llm else None,
+                memory=services['translation_memory']
             )
             
             with st.spinner("翻译中..."):
@@ -373,38 +394,126 @@ elif selected == "文档翻译":
             with open(save_path, 'wb') as f:
                 f.write(uploaded_file.getvalue())
             
+            keep_layout = save_path.suffix.lower() == '.pdf' and st.checkbox(
+                "保留PDF版面（输出翻译后的PDF）")
+            previous = None if keep_layout else services['translation_jobs'].get_version(
+                uploaded_file.name, target_lang)
+            incremental = previous is not None and st.checkbox(
+                "增量翻译（与上次翻译的版本对比，只翻译改动的部分）", value=True)
+            
             if st.button("翻译文档", type="primary"):
-                # 提取文本
-                pages = services['doc_processor'].extract_text(str(save_path))
-                full_text = "\n\n".join([f"[第{p['page']}页]\n{p['content']}" for p in pages])
-                
-                st.info(f"文档共 {len(pages)} 页，开始翻译...")
-                
-                translator = DocumentTranslator(
-                    use_llm=use_llm and services['llm_available'],
-                    llm_client=services['llm'] if use_llm else None
-                )
-                
-                progress_bar = st.progress(0)
-                
-                def update_progress(current, total):
-                    progress_bar.progress(current / total)
-                
-                result = translator.translate_document(
-                    full_text, 
-                    target_lang,
-                    progress_callback=update_progress
-                )
-                
-                st.success("翻译完成！")
-                st.text_area("翻译结果", result, height=400)
-                
-                st.download_button(
-                    "📥 下载翻译结果",
-                    result,
-                    file_name=f"{uploaded_file.name}_translated.txt",
-                    mime="text/plain"
-                )
+                if keep_layout:
+                    translator = DocumentTranslator(
+                        use_llm=use_llm and services['llm_available'],
+                        llm_client=services['llm'] if use_llm else None,
+                        memory=services['translation_memory']
+                    )
+                    pdf_translator = PDFTranslator(translator)
+                    progress_bar = st.progress(0)
+                    
+                    output_path = pdf_translator.translate(
+                        str(save_path), target_lang=target_lang,
+                        progress_callback=lambda done, total: progress_bar.progress(done / total))
+                    
+                    if pdf_translator.last_failures:
+                        st.warning("以下页面翻译失败，已保留原文：第"
+                                   + "、".join(str(f['page']) for f in pdf_translator.last_failures) + "页")
+                    else:
+                        st.success("翻译完成！")
+                    with open(output_path, 'rb') as f:
+                        st.download_button(
+                            "📥 下载翻译后的PDF",
+                            f.read(),
+                            file_name=Path(output_path).name,
+                            mime="application/pdf"
+                        )
+                elif incremental:
+                    pages = services['doc_processor'].extract_text(str(save_path))
+                    full_text = "\n\n".join([f"[第{p['page']}页]\n{p['content']}" for p in pages])
+                    translator = DocumentTranslator(
+                        use_llm=use_llm and services['llm_available'],
+                        llm_client=services['llm'] if use_llm else None,
+                        memory=services['translation_memory']
+                    )
+                    progress_bar = st.progress(0)
+                    
+                    result = translator.translate_revision(
+                        full_text, previous['source'], previous['translation'], target_lang,
+                        progress_callback=lambda done, total: progress_bar.progress(done / total))
+                    services['translation_jobs'].save_version(uploaded_file.name, target_lang, full_text, result)
+                    
+                    reuse = translator.last_reuse
+                    st.success(f"翻译完成！复用上一版本译文 {reuse['reuse_rate']:.0%}"
+                               f"（{reuse['reused']} 段/句复用，{reuse['translated']} 段/句重新翻译）")
+                    if translator.last_failures:
+                        st.warning(f"有 {len(translator.last_failures)} 处翻译失败，已保留原文")
+                    st.text_area("翻译结果", result, height=400)
+                    
+                    st.download_button(
+                        "📥 下载翻译结果",
+                        result,
+                        file_name=f"{uploaded_file.name}_translated.txt",
+                        mime="text/plain"
+                    )
+                else:
+                    doc_processor = services['doc_processor']
+                    page_total = doc_processor.page_count(str(save_path))
+                    st.info(f"文档共 {page_total} 页，开始翻译..." if page_total else "开始翻译...")
+                    
+                    translator = DocumentTranslator(
+                        use_llm=use_llm and services['llm_available'],
+                        llm_client=services['llm'] if use_llm else None,
+                        memory=services['translation_memory'],
+                        jobs=services['translation_jobs']
+                    )
+                    
+                    progress_bar = st.progress(0)
+                    status = st.empty()
+                    preview = st.empty()
+                    
+                    # 边提取边翻译：前面的页翻译完成时，后面的页可能还没有解析
+                    parts = []
+                    sources = []
+                    for page in translator.translate_pages(
+                            doc_processor.iter_pages(str(save_path)), target_lang,
+                            doc_hash=doc_processor.get_file_hash(str(save_path)),
+                            job_name=uploaded_file.name):
+                        parts.append(f"[第{page['page']}页]\n{page['translation']}")
+                        sources.append(f"[第{page['page']}页]\n{page['content']}")
+                        status.caption(f"已翻译到第 {page['page']} 页")
+                        if page_total:
+                            progress_bar.progress(min(page['page'] / page_total, 1.0))
+                        preview.text("\n\n".join(parts[-3:]))
+                    result = "\n\n".join(parts)
+                    services['translation_jobs'].save_version(uploaded_file.name, target_lang,
+                                                              "\n\n".join(sources), result)
+                    progress_bar.progress(1.0)
+                    status.empty()
+                    preview.empty()
+                    
+                    if translator.last_failures:
+                        st.warning(f"有 {len(translator.last_failures)} 个分块翻译失败，已保留原文（第"
+                                   + "、".join(sorted({str(f['page']) for f in translator.last_failures}, key=int))
+                                   + "页）")
+                    else:
+                        st.success("翻译完成！")
+                    st.text_area("翻译结果", result, height=400)
+                    
+                    st.download_button(
+                        "📥 下载翻译结果",
+                        result,
+                        file_name=f"{uploaded_file.name}_translated.txt",
+                        mime="text/plain"
+                    )
+        
+        # 未完成的任务再次翻译同一文档时会从断点继续
+        jobs = services['translation_jobs'].list_jobs(limit=10)
+        if jobs:
+            with st.expander("📋 翻译任务"):
+                status_names = {"running": "进行中/已中断", "completed": "已完成", "partial": "部分失败"}
+                for job in jobs:
+                    st.write(f"**{job['name'] or job['id'][:8]}** → {job['target_lang']}  "
+                             f"{job['done']}/{job['total']} 块  {status_names.get(job['status'], job['status'])}")
 
 
 # ===== PDF编辑 =====
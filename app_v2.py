@@ -11,13 +11,14 @@ sys.path.insert(0, str(Path(__file__).parent))
 
 from modules import (
     get_config,
-    LLMClient, test_llm_connection,
-    DocumentProcessor, PDFEditor,
-    DocumentTranslator,
+    LLMClient, get_llm as get_shared_llm, get_router, test_llm_connection,
+    DocumentProcessor, PDFEditor, ExtractionCache,
+    DocumentTranslator, TranslationMemory, TranslationJobStore,
     EmailClient, compose_email_with_llm,
     ImageProcessor,
     ProgressTracker, create_offer_application, create_visa_application,
-    WebSearcher
+    WebSearcher,
+    get_metrics, get_coalescing_stats
 )
 
 # 页面配置
@@ -37,16 +38,37 @@ def get_llm():
     if not config.is_llm_configured():
         return None
     try:
-        return LLMClient.from_config(config.get_llm_config())
+        # 启用失败切换时在所有已配置的提供商之间路由
+        if config.get("llm", "failover_enabled"):
+            return get_router(config.get_all_llm_configs(),
+                              hedge=config.get("llm", "hedge_enabled", False),
+                              hedge_after=config.get("llm", "hedge_after") or None)
+        # 同一配置复用同一个连接池（进程退出时自动关闭）
+        return get_shared_llm(config.get_llm_config())
     except:
         return None
 
 @st.cache_resource
 def init_services():
     return {
-        'doc_processor': DocumentProcessor("./uploads"),
+        'doc_processor': DocumentProcessor(
+            "./uploads",
+            max_processes=config.get("documents", "extract_processes", 0),
+            parallel_min_pages=config.get("documents", "parallel_min_pages", 64),
+            extraction_cache=ExtractionCache(
+                config.get("documents", "extraction_cache_path", "./data/extraction_cache"),
+                config.get("documents", "extraction_cache_max_mb", 256) * 1024 * 1024
+            ) if config.get("documents", "extraction_cache_enabled", True) else None
+        ),
         'pdf_editor': PDFEditor(),
-        'translator': DocumentTranslator(),
+        'translator': DocumentTranslator(
+            max_workers=config.get("translation", "max_workers", 4),
+            max_retries=config.get("translation", "max_retries", 2),
+            memory=TranslationMemory(config.get("translation", "memory_path", "./data/translation_memory.db"))
+            if config.get("translation", "memory_enabled", True) else None,
+            jobs=TranslationJobStore(config.get("translation", "jobs_path", "./data/translation_jobs.db"))
+            if config.get("translation", "jobs_enabled", True) else None
+        ),
         'image_processor': ImageProcessor("./uploads"),
         'progress_tracker': ProgressTracker("./data/progress.db"),
         'web_searcher': WebSearcher()
@@ -58,8 +80,8 @@ services = init_services()
 with st.sidebar:
     st.markdown("## 🤖 云端小助理")
     selected = option_menu(None, 
-        ["首页", "文档管理", "内容创作", "文档翻译", "PDF编辑", "邮件助手", "图片处理", "进度追踪", "设置"],
-        icons=["house", "folder", "pencil", "translate", "file-pdf", "envelope", "image", "list-check", "gear"])
+        ["首页", "文档管理", "内容创作", "文档翻译", "PDF编辑", "邮件助手", "图片处理", "进度追踪", "性能监控", "设置"],
+        icons=["house", "folder", "pencil", "translate", "file-pdf", "envelope", "image", "list-check", "speedometer", "gear"])
     st.divider()
     if config.is_llm_configured():
         st.success(f"✅ LLM: {config.get('llm', 'provider')}")
@@ -301,17 +323,23 @@ elif selected == "邮件助手":
 # ===== 其他页面简化处理 =====
 elif selected == "文档管理":
     st.header("📁 文档管理")
-    uploaded = st.file_uploader("上传文档", type=['pdf', 'docx', 'txt'])
+    uploaded = st.file_uploader("上传文档", type=['pdf', 'docx', 'txt', 'xlsx', 'xls'])
     if uploaded:
         path = Path("./uploads") / uploaded.name
         path.parent.mkdir(exist_ok=True)
         path.write_bytes(uploaded.getvalue())
         st.success(f"已上传: {uploaded.name}")
-        pages = services['doc_processor'].extract_text(str(path))
-        st.info(f"共 {len(pages)} 页")
+        # 逐页统计，只保留前3页用于预览
+        preview = []
+        page_count = 0
+        for p in services['doc_processor'].iter_pages(str(path)):
+            page_count += 1
+            if len(preview) < 3:
+                preview.append(p['content'][:500])
+        st.info(f"共 {page_count} 页")
         with st.expander("预览"):
-            for p in pages[:3]:
-                st.text(p['content'][:500])
+            for content in preview:
+                st.text(content)
 
 elif selected == "内容创作":
     st.header("✍️ 内容创作")
@@ -324,7 +352,7 @@ elif selected == "内容创作":
             llm = get_llm()
             if llm:
                 with st.spinner("创作中..."):
-                    result = llm.simple_chat(f"请写一篇关于"{topic}"的内容。要求：{req}")
+                    result = llm.simple_chat(f"请写一篇关于“{topic}”的内容。要求：{req}")
                     st.markdown(result)
                     st.download_button("下载", result, f"{topic}.txt")
 
@@ -390,5 +418,50 @@ elif selected == "进度追踪":
                 create_visa_application(tracker, vtype, country)
                 st.success("创建成功"); st.rerun()
 
+elif selected == "性能监控":
+    st.header("📈 性能监控")
+    metrics = get_metrics()
+    rows = metrics.snapshot()
+    if rows:
+        st.subheader("调用延迟（秒）")
+        st.dataframe(rows, use_container_width=True)
+    else:
+        st.info("暂无大模型调用记录")
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        st.subheader("错误与重试")
+        errors = metrics.error_counts()
+        if errors:
+            st.table([{"类型": k, "次数": v} for k, v in errors.items()])
+        else:
+            st.write("无")
+    with col2:
+        st.subheader("缓存与请求合并")
+        llm = get_llm()
+        clients = getattr(llm, "clients", [llm] if llm else [])
+        for client in clients:
+            if client.cache is not None:
+                st.write(f"**{client.provider}** 响应缓存", client.cache.stats())
+        st.write("**请求合并**", get_coalescing_stats())
+        memory = services['translator'].memory
+        if memory is not None:
+            st.write("**翻译记忆库**", memory.stats())
+        extraction_cache = services['doc_processor'].extraction_cache
+        if extraction_cache is not None:
+            st.write("**文档提取缓存**", extraction_cache.stats())
+        jobs = services['translator'].jobs
+        if jobs is not None:
+            unfinished = jobs.list_jobs(status="running", limit=10)
+            if unfinished:
+                st.write("**未完成的翻译任务**",
+                         [{"名称": j['name'], "进度": f"{j['done']}/{j['total']}"} for j in unfinished])
+    
+    c1, c2 = st.columns(2)
+    c1.download_button("导出 Prometheus 指标", metrics.to_prometheus(), "llm_metrics.prom")
+    if c2.button("清空统计"):
+        metrics.reset()
+        st.rerun()
+
 st.divider()
 st.markdown('<div style="text-align:center;color:#888;">云端小助理 v2.0 | Made with ❤️</div>', unsafe_allow_html=True)
@@ -0,0 +1,289 @@
+"""
+大模型调用压测脚本
+默认在进程内启动本地模拟服务（mock_llm_server.py），离线得到可重复的性能数据
+
+使用方法：
+    python benchmark_llm.py                                   # 全部场景
+    python benchmark_llm.py --scenarios chat,stream -n 200 -c 32
+    python benchmark_llm.py --latency 1 --throttle-rate 0.05  # 模拟慢速和限流
+    python benchmark_llm.py --scenarios stream --split-lines  # 换行被切在数据块之间时的SSE解析
+    python benchmark_llm.py --base-url http://127.0.0.1:8900/v1 --json result.json
+    python benchmark_llm.py --scenarios google --latency 0.02   # Google翻译：每块新建翻译器 vs 复用连接
+"""
+import argparse
+import json
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+from unittest import mock
+
+from deep_translator import GoogleTranslator
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from modules.llm_client import LLMClient
+from modules.llm_metrics import get_metrics
+from modules.sse import StreamStats
+from modules.translator import DocumentTranslator
+from modules import web_search
+from mock_llm_server import MockSettings, start_mock_server
+
+
+SCENARIOS = ["chat", "stream", "translate", "search", "google"]
+
+
+def percentile(values: List[float], p: float) -> Optional[float]:
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+class ScenarioResult:
+    """单个场景的压测结果"""
+    
+    def __init__(self, name: str):
+        self.name = name
+        self.latencies: List[float] = []
+        self.ttfts: List[float] = []
+        self.errors: Dict[str, int] = {}
+        self.duration = 0.0
+    
+    def to_dict(self) -> Dict:
+        done = len(self.latencies)
+        result = {
+            "scenario": self.name,
+            "requests": done + sum(self.errors.values()),
+            "errors": dict(self.errors),
+            "duration": round(self.duration, 3),
+            "throughput": round(done / self.duration, 2) if self.duration else None,
+            "p50": percentile(self.latencies, 0.5),
+            "p95": percentile(self.latencies, 0.95),
+            "p99": percentile(self.latencies, 0.99),
+        }
+        if self.ttfts:
+            result["ttft_p50"] = percentile(self.ttfts, 0.5)
+            result["ttft_p95"] = percentile(self.ttfts, 0.95)
+        return result
+
+
+def run_load(name: str, fn: Callable[[int], Optional[float]], requests: int,
+             concurrency: int) -> ScenarioResult:
+    """
+    以 concurrency 个线程执行 fn(i)，i 为请求序号
+    fn 返回首token延迟（可选）
+    """
+    result = ScenarioResult(name)
+    
+    def one(i: int):
+        start = time.monotonic()
+        try:
+            ttft = fn(i)
+        except Exception as e:
+            return None, None, type(e).__name__
+        return time.monotonic() - start, ttft, None
+    
+    start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+        for latency, ttft, error in executor.map(one, range(requests)):
+            if error:
+                result.errors[error] = result.errors.get(error, 0) + 1
+                continue
+            result.latencies.append(latency)
+            if ttft is not None:
+                result.ttfts.append(ttft)
+    result.duration = time.monotonic() - start
+    return result
+
+
+class OfflineSearcher:
+    """替代 WebSearcher 的离线搜索结果，只测大模型部分"""
+    
+    def __init__(self):
+        pass
+    
+    def search(self, query: str, max_results: int = 5) -> List[Dict]:
+        return [
+            {"title": f"{query} 结果{i}", "url": f"https://example.com/{i}",
+             "body": f"关于{query}的第{i}条资料。" * 20}
+            for i in range(max_results)
+        ]
+
+
+def make_document(chars: int) -> str:
+    paragraph = "This is a benchmark paragraph used to measure translation throughput. " * 4
+    paragraphs = []
+    total = 0
+    while total < chars:
+        paragraphs.append(paragraph)
+        total += len(paragraph) + 2
+    return "\n\n".join(paragraphs)
+
+
+def run_scenarios(client: LLMClient, scenarios: List[str], requests: int,
+                  concurrency: int, doc_chars: int, google_url: Optional[str] = None) -> List[ScenarioResult]:
+    results = []
+    
+    if "chat" in scenarios:
+        def chat(i):
+            client.simple_chat(f"压测请求 {i}: 请简要介绍一下你自己。")
+        results.append(run_load("chat", chat, requests, concurrency))
+    
+    if "stream" in scenarios:
+        def stream(i):
+            stats = StreamStats()
+            pieces = 0
+            for _ in client.chat_stream([{"role": "user", "content": f"压测流式请求 {i}"}], stats=stats):
+                pieces += 1
+            # 事件被错误合并或丢失时，片段数与服务端报告的token数不一致
+            if stats.completion_tokens is not None and pieces != stats.completion_tokens:
+                raise ValueError(f"收到 {pieces} 个片段，服务端发送了 {stats.completion_tokens} 个")
+            return stats.ttft
+        results.append(run_load("stream", stream, requests, concurrency))
+    
+    if "translate" in scenarios:
+        translator = DocumentTranslator(use_llm=True, llm_client=client)
+        document = make_document(doc_chars)
+        
+        def translate(i):
+            translator.translate_document(f"[{i}]\n\n" + document, "中文")
+        # 每个请求是一篇完整文档
+        results.append(run_load("translate", translate, max(1, requests // 10), concurrency))
+    
+    if "search" in scenarios:
+        def search(i):
+            web_search.search_and_summarize(f"压测问题{i}", client)
+        with mock.patch.object(web_search, "WebSearcher", OfflineSearcher):
+            results.append(run_load("search", search, requests, concurrency))
+    
+    if "google" in scenarios:
+        chunk = "This is a benchmark paragraph used to measure translation latency. " * 8
+        
+        def google_fresh(i):
+            # 旧做法：每个分块新建 GoogleTranslator，每次请求新建连接
+            translator = GoogleTranslator(source="auto", target="zh-CN")
+            translator._base_url = google_url
+            translator.translate(f"[{i}] {chunk}")
+        results.append(run_load("google_fresh", google_fresh, requests, concurrency))
+        
+        translator = DocumentTranslator(google_base_url=google_url)
+        
+        def google_pooled(i):
+            translator._translate_with_google(f"[{i}] {chunk}", "zh-CN", "auto")
+        results.append(run_load("google_pooled", google_pooled, requests, concurrency))
+    
+    return results
+
+
+def _fmt(value) -> str:
+    if value is None:
+        return "-"
+    if isinstance(value, float):
+        return f"{value:.3f}"
+    return str(value)
+
+
+def print_report(results: List[ScenarioResult]):
+    columns = ["scenario", "requests", "errors", "throughput", "p50", "p95", "p99", "ttft_p50"]
+    rows = []
+    for r in results:
+        row = r.to_dict()
+        row["errors"] = sum(row["errors"].values())
+        rows.append([_fmt(row.get(c)) for c in columns])
+    widths = [max(len(c), *(len(row[i]) for row in rows)) for i, c in enumerate(columns)]
+    print("  ".join(c.ljust(w) for c, w in zip(columns, widths)))
+    for row in rows:
+        print("  ".join(v.ljust(w) for v, w in zip(row, widths)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="大模型调用压测")
+    parser.add_argument("--base-url", default=None, help="已运行的服务地址，默认在进程内启动模拟服务")
+    parser.add_argument("--model", default="mock-model")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="逗号分隔: " + ",".join(SCENARIOS))
+    parser.add_argument("-n", "--requests", type=int, default=100, help="每个场景的请求数（翻译场景为其1/10篇文档）")
+    parser.add_argument("-c", "--concurrency", type=int, default=16)
+    parser.add_argument("--doc-chars", type=int, default=12000, help="翻译场景的文档长度")
+    parser.add_argument("--max-retries", type=int, default=5)
+    parser.add_argument("--json", default=None, help="结果写入JSON文件，便于回归对比")
+    parser.add_argument("--google-url", default=None, help="Google翻译替身地址，默认使用模拟服务的 /m")
+    # 模拟服务参数
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--jitter", type=float, default=0.05)
+    parser.add_argument("--tokens-per-sec", type=float, default=200)
+    parser.add_argument("--completion-tokens", type=int, default=64)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--split-lines", action="store_true", help="流式响应的换行拆成 \\r、\\n 分开发送")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    
+    scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"未知场景: {', '.join(sorted(unknown))}")
+    
+    server = None
+    settings = None
+    base_url = args.base_url
+    if base_url is None:
+        settings = MockSettings(
+            latency=args.latency,
+            jitter=args.jitter,
+            tokens_per_sec=args.tokens_per_sec,
+            completion_tokens=args.completion_tokens,
+            error_rate=args.error_rate,
+            throttle_rate=args.throttle_rate,
+            retry_after=0.1,
+            split_lines=args.split_lines,
+            seed=args.seed
+        )
+        server = start_mock_server(settings=settings)
+        base_url = f"http://127.0.0.1:{server.server_port}/v1"
+    google_url = args.google_url or (f"http://127.0.0.1:{server.server_port}/m" if server else None)
+    if "google" in scenarios and not google_url:
+        parser.error("google 场景需要本地模拟服务或 --google-url")
+    
+    # 关闭请求合并和缓存，保证每个请求都真实到达服务端
+    client = LLMClient(
+        api_key="mock",
+        base_url=base_url,
+        model=args.model,
+        provider="benchmark",
+        max_connections=max(20, args.concurrency),
+        max_keepalive_connections=max(10, args.concurrency),
+        max_retries=args.max_retries,
+        max_concurrency=args.concurrency,
+        coalesce=False
+    )
+    
+    print(f"压测目标: {base_url}  并发: {args.concurrency}  场景: {', '.join(scenarios)}")
+    try:
+        results = run_scenarios(client, scenarios, args.requests, args.concurrency, args.doc_chars, google_url)
+    finally:
+        client.close()
+        if server is not None:
+            server.shutdown()
+    
+    print_report(results)
+    retries = {k: v for k, v in get_metrics().error_counts().items() if k.startswith("benchmark/")}
+    if retries:
+        print(f"错误/重试: {retries}")
+    if settings is not None:
+        print(f"服务端统计: {settings.counters}")
+    
+    if args.json:
+        report = {
+            "base_url": base_url,
+            "concurrency": args.concurrency,
+            "results": [r.to_dict() for r in results],
+            "client_errors": retries,
+        }
+        Path(args.json).write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+        print(f"结果已保存: {args.json}")
+
+
+if __name__ == "__main__":
+    main()
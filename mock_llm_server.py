@@ -0,0 +1,285 @@
+"""
+本地模拟大模型服务（OpenAI兼容接口）
+用于离线压测，不消耗API额度
+
+使用方法：
+    python mock_llm_server.py --port 8900 --latency 0.5 --tokens-per-sec 50 --error-rate 0.01 --throttle-rate 0.05
+然后把大模型的 base_url 设置为 http://127.0.0.1:8900/v1（api_key 任意）
+另外提供 Google 翻译网页接口的替身 http://127.0.0.1:8900/m（回显原文），用于翻译压测
+"""
+import argparse
+import html
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+from urllib.parse import urlsplit, parse_qs
+
+
+class MockSettings:
+    """模拟服务的行为参数"""
+    
+    def __init__(self,
+                 latency: float = 0.2,
+                 jitter: float = 0.05,
+                 tokens_per_sec: float = 100,
+                 completion_tokens: int = 64,
+                 echo: bool = True,
+                 error_rate: float = 0.0,
+                 throttle_rate: float = 0.0,
+                 retry_after: float = 1.0,
+                 split_lines: bool = False,
+                 seed: Optional[int] = None):
+        """
+        latency: 首token前的固定延迟（秒）
+        jitter: 延迟的随机波动（秒）
+        tokens_per_sec: 输出速度，0 表示不限速
+        completion_tokens: 每次回复的token数（echo 时为回显的长度上限）
+        echo: 回显用户消息（翻译等场景输出长度与输入相近）
+        error_rate: 返回 500 的概率
+        throttle_rate: 返回 429 的概率
+        retry_after: 429 响应的 Retry-After（秒）
+        split_lines: 流式响应的每个换行拆成 \r、\n、\n 分别写出（模拟代理把 \r\n 切在两个数据块之间），
+            检验客户端的SSE解析
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.tokens_per_sec = tokens_per_sec
+        self.completion_tokens = completion_tokens
+        self.echo = echo
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.split_lines = split_lines
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.counters = {"requests": 0, "streams": 0, "errors": 0, "throttled": 0, "translations": 0}
+    
+    def count(self, name: str):
+        with self.lock:
+            self.counters[name] += 1
+    
+    def roll(self) -> float:
+        with self.lock:
+            return self.random.random()
+    
+    def delay(self) -> float:
+        with self.lock:
+            return max(0.0, self.latency + self.random.uniform(-self.jitter, self.jitter))
+
+
+def _make_tokens(messages: list, settings: MockSettings) -> list:
+    """生成回复内容（按 token 切分好的片段）"""
+    if settings.echo and messages:
+        text = str(messages[-1].get("content", ""))
+        # 中文约1字1token，英文按单词切分
+        tokens = []
+        for word in text.split(" "):
+            if word.isascii():
+                tokens.append(word + " ")
+            else:
+                tokens.extend(word)
+        tokens = tokens[:settings.completion_tokens] if settings.completion_tokens else tokens
+        if tokens:
+            return tokens
+    return ["mock "] * max(1, settings.completion_tokens)
+
+
+class MockLLMHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # 长连接上头部和正文分开写出，不关闭 Nagle 会与客户端的延迟确认叠加出约40ms的额外延迟
+    disable_nagle_algorithm = True
+    settings: MockSettings = MockSettings()
+    
+    def log_message(self, format, *args):
+        pass
+    
+    def _send_json(self, status: int, payload: dict, headers: Optional[dict] = None):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def _write_event(self, data: str):
+        """写出一个SSE事件并立即发送"""
+        if not self.settings.split_lines:
+            self.wfile.write(f"data: {data}\n\n".encode("utf-8"))
+            self.wfile.flush()
+            return
+        for part in (f"data: {data}\r", "\n", "\n"):
+            self.wfile.write(part.encode("utf-8"))
+            self.wfile.flush()
+    
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if url.path.rstrip("/").endswith("/stats"):
+            with self.settings.lock:
+                self._send_json(200, dict(self.settings.counters))
+        elif url.path == "/m":
+            self._translate_page(parse_qs(url.query))
+        else:
+            self._send_json(404, {"error": {"message": "not found"}})
+    
+    def _translate_page(self, query: dict):
+        """Google 翻译网页接口替身：延迟后返回带译文的HTML（译文为 [目标语言] + 原文）"""
+        settings = self.settings
+        settings.count("translations")
+        if settings.roll() < settings.throttle_rate:
+            settings.count("throttled")
+            self._send_json(429, {"error": {"message": "rate limited"}})
+            return
+        time.sleep(settings.delay())
+        text = query.get("q", [""])[0]
+        target = query.get("tl", [""])[0]
+        body = f'<html><body><div class="result-container">[{html.escape(target)}] {html.escape(text)}</div></body></html>'
+        body = body.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length)
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": "not found"}})
+            return
+        try:
+            request = json.loads(raw or b"{}")
+        except ValueError:
+            self._send_json(400, {"error": {"message": "invalid json"}})
+            return
+        
+        settings = self.settings
+        settings.count("requests")
+        
+        # 故障注入
+        roll = settings.roll()
+        if roll < settings.throttle_rate:
+            settings.count("throttled")
+            self._send_json(429, {"error": {"message": "rate limited"}},
+                            {"Retry-After": str(settings.retry_after)})
+            return
+        if roll < settings.throttle_rate + settings.error_rate:
+            settings.count("errors")
+            self._send_json(500, {"error": {"message": "injected error"}})
+            return
+        
+        messages = request.get("messages") or []
+        tokens = _make_tokens(messages, settings)
+        prompt_tokens = sum(len(str(m.get("content", ""))) // 2 + 4 for m in messages)
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": len(tokens),
+            "total_tokens": prompt_tokens + len(tokens)
+        }
+        model = request.get("model", "mock")
+        interval = 1.0 / settings.tokens_per_sec if settings.tokens_per_sec > 0 else 0.0
+        
+        time.sleep(settings.delay())
+        
+        if not request.get("stream"):
+            time.sleep(interval * len(tokens))
+            self._send_json(200, {
+                "id": "chatcmpl-mock",
+                "object": "chat.completion",
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": "".join(tokens)},
+                    "finish_reason": "stop"
+                }],
+                "usage": usage
+            })
+            return
+        
+        settings.count("streams")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        # 没有 Content-Length 的流式响应结束后关闭连接
+        self.send_header("Connection", "close")
+        self.end_headers()
+        try:
+            for token in tokens:
+                chunk = {
+                    "id": "chatcmpl-mock",
+                    "object": "chat.completion.chunk",
+                    "model": model,
+                    "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}]
+                }
+                self._write_event(json.dumps(chunk, ensure_ascii=False))
+                if interval:
+                    time.sleep(interval)
+            final = {"id": "chatcmpl-mock", "object": "chat.completion.chunk", "model": model,
+                     "choices": [], "usage": usage}
+            self._write_event(json.dumps(final))
+            self._write_event("[DONE]")
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        self.close_connection = True
+
+
+def start_mock_server(port: int = 0,
+                      host: str = "127.0.0.1",
+                      settings: Optional[MockSettings] = None) -> ThreadingHTTPServer:
+    """
+    在后台线程启动模拟服务（port=0 时自动选择端口）
+    返回服务对象，base_url 为 f"http://{host}:{server.server_port}/v1"，用完调用 server.shutdown()
+    """
+    handler = type("Handler", (MockLLMHandler,), {"settings": settings or MockSettings()})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地模拟大模型服务（OpenAI兼容）")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency", type=float, default=0.2, help="首token延迟（秒）")
+    parser.add_argument("--jitter", type=float, default=0.05, help="延迟波动（秒）")
+    parser.add_argument("--tokens-per-sec", type=float, default=100, help="输出速度，0为不限速")
+    parser.add_argument("--completion-tokens", type=int, default=64, help="回复token数")
+    parser.add_argument("--no-echo", action="store_true", help="不回显输入，固定输出")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="返回500的概率")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="返回429的概率")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="429的Retry-After（秒）")
+    parser.add_argument("--split-lines", action="store_true", help="流式响应的换行拆成 \\r、\\n 分开发送")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+    
+    settings = MockSettings(
+        latency=args.latency,
+        jitter=args.jitter,
+        tokens_per_sec=args.tokens_per_sec,
+        completion_tokens=args.completion_tokens,
+        echo=not args.no_echo,
+        error_rate=args.error_rate,
+        throttle_rate=args.throttle_rate,
+        retry_after=args.retry_after,
+        split_lines=args.split_lines,
+        seed=args.seed
+    )
+    handler = type("Handler", (MockLLMHandler,), {"settings": settings})
+    server = ThreadingHTTPServer((args.host, args.port), handler)
+    server.daemon_threads = True
+    print(f"模拟大模型服务已启动: http://{args.host}:{args.port}/v1  (Ctrl+C 退出)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
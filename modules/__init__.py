@@ -2,23 +2,40 @@
 云端小助理 - 模块包
 """
 from .config_manager import ConfigManager, get_config
-from .llm_client import LLMClient, test_llm_connection
+from .llm_client import LLMClient, get_llm, get_coalescing_stats, test_llm_connection
+from .llm_cache import LLMResponseCache
+from .llm_router import LLMRouter, get_router
+from .sse import LLMStreamError, StreamStats
+from .llm_metrics import LLMCallEvent, get_metrics, add_hook, remove_hook, start_metrics_server
 from .document_processor import DocumentProcessor, PDFEditor
+from .file_hash import hash_file, FileHashCache
+from .extraction_cache import ExtractionCache
 from .document_index import DocumentIndex
 from .translator import DocumentTranslator
-from .email_client import EmailClient, compose_email_with_llm
+from .translation_memory import TranslationMemory
+from .translation_jobs import TranslationJobStore
+from .pdf_translator import PDFTranslator
+from .email_client import EmailClient, compose_email_with_llm, compose_emails_with_llm
 from .image_processor import ImageProcessor
 from .progress_tracker import ProgressTracker, create_offer_application, create_visa_application
 from .web_search import WebSearcher, search_and_summarize
+from .token_budget import PromptBudget, count_tokens, truncate_to_tokens
 
 __all__ = [
     'ConfigManager', 'get_config',
-    'LLMClient', 'test_llm_connection',
+    'LLMClient', 'get_llm', 'get_coalescing_stats', 'test_llm_connection',
+    'LLMResponseCache',
+    'LLMRouter', 'get_router',
+    'LLMStreamError', 'StreamStats',
+    'LLMCallEvent', 'get_metrics', 'add_hook', 'remove_hook', 'start_metrics_server',
     'DocumentProcessor', 'PDFEditor',
+    'hash_file', 'FileHashCache', 'ExtractionCache',
     'DocumentIndex',
-    'DocumentTranslator',
-    'EmailClient', 'compose_email_with_llm',
+    'DocumentTranslator', 'TranslationMemory', 'TranslationJobStore',
+    'PDFTranslator',
+    'EmailClient', 'compose_email_with_llm', 'compose_emails_with_llm',
     'ImageProcessor',
     'ProgressTracker', 'create_offer_application', 'create_visa_application',
-    'WebSearcher', 'search_and_summarize'
+    'WebSearcher', 'search_and_summarize',
+    'PromptBudget', 'count_tokens', 'truncate_to_tokens'
 ]
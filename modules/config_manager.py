@@ -4,7 +4,7 @@
 import os
 import json
 from pathlib import Path
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 
 
 class ConfigManager:
@@ -21,7 +21,56 @@ class ConfigManager:
             "moonshot_api_key": "",
             "moonshot_model": "moonshot-v1-8k",
             "deepseek_api_key": "",
-            "deepseek_model": "deepseek-chat"
+            "deepseek_model": "deepseek-chat",
+            # 连接池配置
+            "timeout": 120,
+            "max_connections": 20,
+            "max_keepalive_connections": 10,
+            "keepalive_expiry": 30,
+            "http2": False,
+            # 响应缓存配置
+            "cache_enabled": False,
+            "cache_path": "./data/llm_cache.db",
+            "cache_max_entries": 10000,
+            "cache_max_bytes": 50 * 1024 * 1024,
+            "cache_ttl": 7 * 24 * 3600,
+            # 限流与重试配置（rpm/tpm 为 0 表示不限制）
+            "rate_limits": {
+                "openai": {"rpm": 0, "tpm": 0},
+                "zhipu": {"rpm": 0, "tpm": 0},
+                "moonshot": {"rpm": 0, "tpm": 0},
+                "deepseek": {"rpm": 0, "tpm": 0}
+            },
+            "max_retries": 5,
+            "max_concurrency": 16,
+            # 合并并发的相同请求
+            "coalesce_requests": True,
+            # 多提供商路由：失败切换 + 对冲请求（hedge_after 为 0 时按P95延迟自动计算）
+            "failover_enabled": False,
+            "hedge_enabled": False,
+            "hedge_after": 0
+        },
+        "translation": {
+            # 长文档并发翻译的块数与单块重试次数（重试只用于 Google 翻译，大模型按 llm.max_retries 重试）
+            "max_workers": 4,
+            "max_retries": 2,
+            # 翻译记忆库：重复出现的段落直接复用已有译文
+            "memory_enabled": True,
+            "memory_path": "./data/translation_memory.db",
+            # 长文档逐块保存检查点，中断后再次翻译同一文档时从断点继续
+            "jobs_enabled": True,
+            "jobs_path": "./data/translation_jobs.db"
+        },
+        "documents": {
+            # PDF文本提取的进程数（0 为按CPU核数自动选择，1 为串行），页数达到阈值才启用多进程
+            "extract_processes": 0,
+            "parallel_min_pages": 64,
+            # 提取结果缓存：内容相同的文件再次提取时直接读取（压缩保存，超出容量淘汰最久未用的）
+            "extraction_cache_enabled": True,
+            "extraction_cache_path": "./data/extraction_cache",
+            "extraction_cache_max_mb": 256,
+            # 总结文档时提示词的token上限（不超过模型上下文窗口）
+            "summary_max_tokens": 8000
         },
         "email": {
             "smtp_host": "smtp.gmail.com",
@@ -37,6 +86,8 @@ class ConfigManager:
         }
     }
     
+    LLM_PROVIDERS = ["openai", "zhipu", "moonshot", "deepseek"]
+    
     def __init__(self, config_path: str = "./data/config.json"):
         self.config_path = Path(config_path)
         self.config_path.parent.mkdir(parents=True, exist_ok=True)
@@ -91,11 +142,24 @@ class ConfigManager:
     
     # ===== 便捷方法 =====
     
-    def get_llm_config(self) -> Dict:
-        """获取当前LLM配置"""
+    def get_llm_config(self, provider: Optional[str] = None) -> Dict:
+        """获取LLM配置，默认为当前选择的提供商"""
         llm = self.config.get("llm", {})
-        provider = llm.get("provider", "openai")
-        
+        provider = provider or llm.get("provider", "openai")
+        config = self._get_provider_config(llm, provider)
+        config.update(self._get_shared_llm_config(llm))
+        config.update(self._get_rate_limit_config(llm, provider))
+        return config
+    
+    def get_all_llm_configs(self) -> List[Dict]:
+        """获取所有已配置API Key的提供商配置（当前提供商排在最前）"""
+        current = self.config.get("llm", {}).get("provider", "openai")
+        providers = [current] + [p for p in self.LLM_PROVIDERS if p != current]
+        configs = [self.get_llm_config(p) for p in providers]
+        return [c for c in configs if c.get("api_key")]
+    
+    def _get_provider_config(self, llm: Dict, provider: str) -> Dict:
+        """获取指定提供商的连接信息"""
         if provider == "openai":
             return {
                 "provider": provider,
@@ -127,6 +191,26 @@ class ConfigManager:
         else:
             return {"provider": provider, "api_key": "", "base_url": "", "model": ""}
     
+    def _get_shared_llm_config(self, llm: Dict) -> Dict:
+        """获取连接池、缓存等配置（所有提供商共用）"""
+        defaults = self.DEFAULT_CONFIG["llm"]
+        return {
+            key: llm.get(key, defaults[key])
+            for key in ("timeout", "max_connections", "max_keepalive_connections",
+                        "keepalive_expiry", "http2",
+                        "cache_enabled", "cache_path", "cache_max_entries",
+                        "cache_max_bytes", "cache_ttl",
+                        "max_retries", "max_concurrency", "coalesce_requests")
+        }
+    
+    def _get_rate_limit_config(self, llm: Dict, provider: str) -> Dict:
+        """获取指定提供商的限流配额"""
+        limits = llm.get("rate_limits", {}).get(provider, {})
+        return {
+            "rpm": limits.get("rpm", 0),
+            "tpm": limits.get("tpm", 0)
+        }
+    
     def is_llm_configured(self) -> bool:
         """检查LLM是否已配置"""
         config = self.get_llm_config()
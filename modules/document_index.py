@@ -10,12 +10,23 @@ import hashlib
 import json
 
 from .document_processor import DocumentProcessor
+from .token_budget import PromptBudget, approximate_tokens
 
 
 class DocumentIndex:
     """文档索引管理器"""
     
-    def __init__(self, persist_path: str = "./data/chroma"):
+    # 每次写入向量数据库的页数
+    ADD_BATCH_SIZE = 64
+    
+    def __init__(self,
+                 persist_path: str = "./data/chroma",
+                 doc_processor: Optional[DocumentProcessor] = None,
+                 summary_max_tokens: int = 8000):
+        """
+        doc_processor: 共用的文档处理器（与界面共用提取缓存），默认新建
+        summary_max_tokens: 总结文档时提示词的token上限（不超过模型上下文窗口），控制单次总结的费用和耗时
+        """
         self.persist_path = Path(persist_path)
         self.persist_path.mkdir(parents=True, exist_ok=True)
         
@@ -26,7 +37,8 @@ class DocumentIndex:
             metadata={"description": "文档内容索引"}
         )
         
-        self.doc_processor = DocumentProcessor()
+        self.doc_processor = doc_processor or DocumentProcessor()
+        self.summary_max_tokens = summary_max_tokens
         self._load_file_index()
     
     def _load_file_index(self):
@@ -56,43 +68,55 @@ class DocumentIndex:
         if file_hash in self.file_index:
             return {"file": filename, "status": "already_indexed", "pages": self.file_index[file_hash]["pages"]}
         
-        # 提取文本
-        pages = self.doc_processor.extract_text(file_path)
-        
-        if not pages:
-            return {"file": filename, "status": "no_content", "pages": 0}
-        
-        # 添加到向量数据库
+        # 逐页提取，每满一批写入向量数据库，大文件也只占用一批页面的内存
+        # 用 upsert 写入：上次中途失败遗留的页面会被覆盖，不会因 id 重复而出错
         ids = []
         documents = []
         metadatas = []
+        page_count = 0
         
-        for page in pages:
-            doc_id = f"{file_hash}_p{page['page']}"
-            ids.append(doc_id)
-            documents.append(page['content'])
-            metadatas.append({
-                "file": filename,
-                "file_path": file_path,
-                "page": page['page'],
-                "file_hash": file_hash
-            })
-        
-        self.collection.add(
-            ids=ids,
-            documents=documents,
-            metadatas=metadatas
-        )
+        try:
+            for page in self.doc_processor.iter_pages(file_path):
+                doc_id = f"{file_hash}_p{page['page']}"
+                ids.append(doc_id)
+                documents.append(page['content'])
+                metadatas.append({
+                    "file": filename,
+                    "file_path": file_path,
+                    "page": page['page'],
+                    "file_hash": file_hash
+                })
+                page_count = max(page_count, page['page'])
+                if len(ids) >= self.ADD_BATCH_SIZE:
+                    self.collection.upsert(ids=ids, documents=documents, metadatas=metadatas)
+                    ids, documents, metadatas = [], [], []
+            
+            if ids:
+                self.collection.upsert(
+                    ids=ids,
+                    documents=documents,
+                    metadatas=metadatas
+                )
+        except Exception:
+            # 提取中途出错：删除已写入的页面，文件索引中没有记录的文档不应出现在检索结果中
+            try:
+                self.collection.delete(where={"file_hash": file_hash})
+            except Exception:
+                pass
+            raise
+        
+        if not page_count:
+            return {"file": filename, "status": "no_content", "pages": 0}
         
         # 更新文件索引
         self.file_index[file_hash] = {
             "file": filename,
             "file_path": file_path,
-            "pages": len(pages)
+            "pages": page_count
         }
         self._save_file_index()
         
-        return {"file": filename, "status": "success", "pages": len(pages)}
+        return {"file": filename, "status": "success", "pages": page_count}
     
     def search(self, query: str, top_k: int = 5) -> List[Dict]:
         """
@@ -151,27 +175,42 @@ class DocumentIndex:
     
     def summarize_document(self, file_path: str, llm_client) -> str:
         """使用LLM总结文档"""
-        pages = self.doc_processor.extract_text(file_path)
+        instructions = """请用中文提供一个结构化的总结，包括：
+1. 文档类型和主题
+2. 主要内容要点
+3. 关键信息"""
         
-        if not pages:
+        # 按总结预算（不超过模型上下文窗口）合并内容，超出预算后不再读取后面的页面
+        model = getattr(llm_client, "model", None)
+        limit = min(PromptBudget(model).max_tokens, self.summary_max_tokens)
+        parts = []
+        used = 0
+        more_pages = False
+        for p in self.doc_processor.iter_pages(file_path):
+            if used > limit:
+                more_pages = True
+                break
+            part = f"[第{p['page']}页]\n{p['content']}"
+            parts.append(part)
+            used += approximate_tokens(part)
+        
+        if not parts:
             return "无法提取文档内容"
         
-        # 合并内容（限制长度）
-        full_content = "\n\n".join([
-            f"[第{p['page']}页]\n{p['content']}" 
-            for p in pages[:20]  # 限制前20页
-        ])
+        budget = PromptBudget(model, max_tokens=limit)
+        budget.add("instructions", "请总结以下文档的主要内容：\n\n" + instructions,
+                   priority=10, truncatable=False)
+        budget.add("content", "\n\n".join(parts))
+        packed = budget.pack()
         
-        if len(full_content) > 15000:
-            full_content = full_content[:15000] + "\n...(内容过长，已截断)"
+        full_content = packed["content"]
+        if packed.truncated or more_pages:
+            full_content += "\n...(内容过长，已截断)"
         
         prompt = f"""请总结以下文档的主要内容：
 
 {full_content}
 
-请用中文提供一个结构化的总结，包括：
-1. 文档类型和主题
-2. 主要内容要点
-3. 关键信息"""
-
+{instructions}"""
+        
         return llm_client.simple_chat(prompt)
@@ -2,92 +2,441 @@
 文档处理模块 - 支持PDF、Word、Excel等
 """
 import os
+import atexit
+import multiprocessing
+import threading
+import zipfile
+from collections import deque
+from itertools import islice
+import datetime
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 import fitz  # PyMuPDF
-from docx import Document
-from typing import List, Dict, Optional, Tuple
+import openpyxl
+from typing import List, Dict, Optional, Tuple, Iterator
 import hashlib
 from pathlib import Path
 
+from .file_hash import FileHashCache, get_file_hash_cache
+from .extraction_cache import ExtractionCache
+from .pdf_extract_worker import extract_pdf_range
+
+try:
+    import xlrd
+    XLRD_AVAILABLE = True
+except ImportError:
+    XLRD_AVAILABLE = False
+
+
+def _cell_text(value) -> str:
+    """单元格值转为文本（整数形式的浮点数去掉 .0，日期只保留有效部分）"""
+    if value is None:
+        return ""
+    if isinstance(value, str):
+        # 单元格内的换行、制表符会打乱行列结构
+        return " ".join(value.split()) if "\n" in value or "\t" in value else value.strip()
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    if isinstance(value, datetime.datetime) and value.time() == datetime.time(0):
+        return value.date().isoformat()
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    return str(value).strip()
+
+
+def _row_text(values) -> str:
+    """一行单元格以制表符分隔，去掉行尾空单元格"""
+    cells = [_cell_text(v) for v in values]
+    while cells and not cells[-1]:
+        cells.pop()
+    return "\t".join(cells)
+
+
+# Word文档XML命名空间
+_W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+
+
+# 进程内共用的PDF提取进程池：子进程启动一次后在各文档间复用
+# 创建后大小不变（不会关闭其他线程正在使用的进程池），每次调用同时提交的分片数由调用方控制
+_pdf_pool: Optional[ProcessPoolExecutor] = None
+_pdf_pool_lock = threading.Lock()
+
+
+def _get_pdf_pool(max_workers: int) -> ProcessPoolExecutor:
+    """获取共用的进程池，不存在时按 max_workers 创建"""
+    global _pdf_pool
+    with _pdf_pool_lock:
+        if _pdf_pool is None:
+            # spawn 方式启动子进程：不继承父进程的线程和已打开的文档，各平台行为一致
+            _pdf_pool = ProcessPoolExecutor(max_workers=max_workers,
+                                            mp_context=multiprocessing.get_context("spawn"))
+        return _pdf_pool
+
+
+def _reset_pdf_pool(pool: ProcessPoolExecutor):
+    """进程池损坏（子进程被杀等）时丢弃，下次使用时重建"""
+    global _pdf_pool
+    with _pdf_pool_lock:
+        if _pdf_pool is pool:
+            _pdf_pool = None
+    pool.shutdown(wait=False)
+
+
+def shutdown_pdf_pool():
+    """关闭共用的PDF提取进程池（进程退出时自动调用）"""
+    global _pdf_pool
+    with _pdf_pool_lock:
+        pool, _pdf_pool = _pdf_pool, None
+    if pool is not None:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+atexit.register(shutdown_pdf_pool)
+
+
+def _run_text(run) -> str:
+    """Word文字块（w:r）的文本：文字、制表符、换行；图片、文本框等嵌入内容不计入"""
+    parts = []
+    for elem in run:
+        if elem.tag == _W + "t":
+            parts.append(elem.text or "")
+        elif elem.tag in (_W + "tab", _W + "ptab"):
+            parts.append("\t")
+        elif elem.tag == _W + "br":
+            # 分页符、分栏符不产生文字，只有普通换行算作换行
+            if elem.get(_W + "type", "textWrapping") == "textWrapping":
+                parts.append("\n")
+        elif elem.tag == _W + "cr":
+            parts.append("\n")
+        elif elem.tag == _W + "noBreakHyphen":
+            parts.append("-")
+    return "".join(parts)
+
+
+def _paragraph_text(paragraph) -> str:
+    """
+    Word段落的文本（与 python-docx 的 Paragraph.text 一致）
+    只读取段落直接包含的文字块和超链接内的文字块，不深入图片、文本框
+    （文本框在 mc:Choice 和 mc:Fallback 中各存一份，深入遍历会重复）
+    """
+    parts = []
+    for child in paragraph:
+        if child.tag == _W + "r":
+            parts.append(_run_text(child))
+        elif child.tag == _W + "hyperlink":
+            parts.extend(_run_text(run) for run in child.findall(_W + "r"))
+    return "".join(parts)
+
+
+def iter_docx_paragraphs(file_path: str) -> Iterator[str]:
+    """
+    流式读取Word文档正文段落（不含表格内的段落，与 python-docx 的 document.paragraphs 一致）
+    逐个元素解析 word/document.xml，处理完的段落立即释放，内存占用与文档大小无关
+    """
+    with zipfile.ZipFile(file_path) as archive, archive.open("word/document.xml") as f:
+        depth = 0
+        body_depth = None
+        for event, elem in ET.iterparse(f, events=("start", "end")):
+            if event == "start":
+                depth += 1
+                if elem.tag == _W + "body":
+                    body_depth = depth
+                continue
+            if body_depth is not None and depth == body_depth + 1:
+                if elem.tag == _W + "p":
+                    yield _paragraph_text(elem)
+                # 正文的直接子元素（段落、表格等）处理完即清空
+                elem.clear()
+            depth -= 1
+
 
 class DocumentProcessor:
     """文档处理器"""
     
     SUPPORTED_FORMATS = {'.pdf', '.docx', '.doc', '.txt', '.xlsx', '.xls'}
+    # Word文档每页的段落数
+    DOCX_PAGE_PARAGRAPHS = 10
+    # 文本文件每页的最大字符数（按块读取，不一次读入整个文件）
+    TXT_PAGE_CHARS = 20000
+    # 表格每页的最大行数（每页开头重复工作表名和表头行）
+    SHEET_PAGE_ROWS = 200
+    # 提取逻辑改变时递增，使旧的提取缓存失效
+    EXTRACTOR_VERSION = 3
     
-    def __init__(self, upload_path: str = "./uploads"):
+    def __init__(self,
+                 upload_path: str = "./uploads",
+                 max_processes: int = 0,
+                 parallel_min_pages: int = 64,
+                 hash_cache: Optional[FileHashCache] = None,
+                 extraction_cache: Optional[ExtractionCache] = None):
+        """
+        max_processes: 并行提取PDF的进程数，0 表示按CPU核数自动选择，1 表示始终串行
+        parallel_min_pages: 页数达到此值才使用多进程（小文件启动进程池的开销大于收益）
+        hash_cache: 文件哈希缓存，默认使用进程内共用的缓存
+        extraction_cache: 提取结果缓存（可选），内容相同的文件再次提取时直接读取缓存
+        """
         self.upload_path = Path(upload_path)
         self.upload_path.mkdir(parents=True, exist_ok=True)
+        self.max_processes = max_processes or os.cpu_count() or 1
+        self.parallel_min_pages = parallel_min_pages
+        self.hash_cache = hash_cache or get_file_hash_cache()
+        self.extraction_cache = extraction_cache
     
     def extract_text(self, file_path: str) -> List[Dict]:
         """
         提取文档文本，返回分页内容
         返回: [{"page": 1, "content": "...", "file": "xxx.pdf"}, ...]
+        大文件请使用 iter_pages 逐页处理
+        """
+        if Path(file_path).suffix.lower() == '.pdf':
+            # PDF 未命中缓存时走多进程提取，不经过 iter_pages
+            key = self._cache_key(file_path)
+            cached = self.extraction_cache.iter_pages(key) if key else None
+            if cached is None:
+                pages = self._extract_pdf(file_path)
+                if key is not None:
+                    self.extraction_cache.put(key, pages)
+                return pages
+            filename = Path(file_path).name
+            return [{"page": page, "content": content, "file": filename, "file_path": file_path}
+                    for page, content in cached]
+        return list(self.iter_pages(file_path))
+    
+    def iter_pages(self, file_path: str) -> Iterator[Dict]:
+        """
+        逐页产生文档内容，格式同 extract_text
+        只在需要下一页时才读取，索引、翻译、总结等可以在有限内存内处理很大的文件
         """
         path = Path(file_path)
         suffix = path.suffix.lower()
         
         if suffix == '.pdf':
-            return self._extract_pdf(file_path)
+            extractor = self._iter_pdf
         elif suffix in {'.docx', '.doc'}:
-            return self._extract_docx(file_path)
+            extractor = self._iter_docx
         elif suffix == '.txt':
-            return self._extract_txt(file_path)
+            extractor = self._iter_txt
+        elif suffix == '.xlsx':
+            extractor = self._iter_xlsx
+        elif suffix == '.xls':
+            extractor = self._iter_xls
         else:
             raise ValueError(f"不支持的文件格式: {suffix}")
+        
+        key = self._cache_key(file_path)
+        if key is None:
+            return extractor(file_path)
+        return self._iter_cached(file_path, key, extractor)
+    
+    def _cache_key(self, file_path: str) -> Optional[str]:
+        """提取缓存的键：文件内容哈希 + 格式 + 影响分页结果的参数"""
+        if self.extraction_cache is None:
+            return None
+        digest = self.get_file_hash(file_path, "sha256")
+        params = (f"{Path(file_path).suffix.lower()}|{self.EXTRACTOR_VERSION}|"
+                  f"{self.DOCX_PAGE_PARAGRAPHS}|{self.TXT_PAGE_CHARS}|{self.SHEET_PAGE_ROWS}")
+        return f"{digest[:40]}-{hashlib.sha256(params.encode('utf-8')).hexdigest()[:8]}"
+    
+    def _iter_cached(self, file_path: str, key: str, extractor) -> Iterator[Dict]:
+        """命中缓存时从磁盘读取；未命中时边提取边写入缓存，完整读完才保存"""
+        filename = Path(file_path).name
+        cached = self.extraction_cache.iter_pages(key)
+        if cached is not None:
+            for page, content in cached:
+                yield {"page": page, "content": content, "file": filename, "file_path": file_path}
+            return
+        
+        with self.extraction_cache.writer(key) as writer:
+            for page in extractor(file_path):
+                writer.add(page["page"], page["content"])
+                yield page
     
     def _extract_pdf(self, file_path: str) -> List[Dict]:
-        """提取PDF文本"""
-        results = []
+        """提取PDF文本（页数多时按页范围分给多个进程并行提取，结果按页码顺序合并）"""
+        page_count = self.page_count(file_path)
+        if self.max_processes <= 1 or page_count < self.parallel_min_pages:
+            return list(self._iter_pdf(file_path))
+        # 每个进程至少分到半个阈值的页数，避免进程启动开销超过提取本身
+        processes = min(self.max_processes, max(2, page_count * 2 // max(1, self.parallel_min_pages)))
+        return self._extract_pdf_parallel(file_path, page_count, processes)
+    
+    def _extract_pdf_parallel(self, file_path: str, page_count: int, processes: int) -> List[Dict]:
+        # 分片数多于进程数，避免扫描页、图片页集中在某一段时个别进程拖慢整体
+        shard = max(1, -(-page_count // (processes * 4)))
+        ranges = [(start, start + shard) for start in range(0, page_count, shard)]
+        # 同时提交的分片不超过 processes 个（进程池按 max_processes 创建，页数少的文档不占满所有进程）
+        # 进程池损坏（如子进程被系统杀掉）时换新的进程池重试一次；仍失败或进程池已关闭则串行提取
+        for _ in range(2):
+            pool = _get_pdf_pool(self.max_processes)
+            pending = iter(ranges)
+            futures = deque()
+            pages = []
+            try:
+                for start, end in islice(pending, processes):
+                    futures.append(pool.submit(extract_pdf_range, file_path, start, end))
+                while futures:
+                    pages.extend(futures.popleft().result())
+                    next_range = next(pending, None)
+                    if next_range is not None:
+                        futures.append(pool.submit(extract_pdf_range, file_path, *next_range))
+                return pages
+            except BrokenProcessPool:
+                _reset_pdf_pool(pool)
+            except RuntimeError:
+                # 进程池已关闭（进程退出中），或子进程提取出错：串行提取时会重新报告真正的错误
+                break
+            finally:
+                for future in futures:
+                    future.cancel()
+        return list(self._iter_pdf(file_path))
+    
+    def _iter_pdf(self, file_path: str) -> Iterator[Dict]:
+        """逐页提取PDF文本（跳过空白页）"""
         doc = fitz.open(file_path)
         filename = Path(file_path).name
         
-        for page_num, page in enumerate(doc, 1):
-            text = page.get_text()
-            if text.strip():
-                results.append({
-                    "page": page_num,
-                    "content": text,
-                    "file": filename,
-                    "file_path": file_path
-                })
-        
+        try:
+            for page_num, page in enumerate(doc, 1):
+                text = page.get_text()
+                if text.strip():
+                    yield {
+                        "page": page_num,
+                        "content": text,
+                        "file": filename,
+                        "file_path": file_path
+                    }
+        finally:
+            doc.close()
+    
+    def page_count(self, file_path: str) -> Optional[int]:
+        """PDF页数（只读取目录，不解析内容）；其他格式返回None"""
+        if Path(file_path).suffix.lower() != '.pdf':
+            return None
+        doc = fitz.open(file_path)
+        count = len(doc)
         doc.close()
-        return results
+        return count
     
-    def _extract_docx(self, file_path: str) -> List[Dict]:
-        """提取Word文档文本"""
-        doc = Document(file_path)
+    def _iter_docx(self, file_path: str) -> Iterator[Dict]:
+        """逐页提取Word文档文本"""
         filename = Path(file_path).name
         
         # Word文档按段落处理，每10段为一"页"
-        paragraphs = [p.text for p in doc.paragraphs if p.text.strip()]
-        results = []
-        
-        chunk_size = 10
-        for i in range(0, len(paragraphs), chunk_size):
-            chunk = paragraphs[i:i+chunk_size]
-            page_num = i // chunk_size + 1
-            results.append({
-                "page": page_num,
-                "content": "\n".join(chunk),
-                "file": filename,
-                "file_path": file_path
-            })
-        
-        return results if results else [{"page": 1, "content": "", "file": filename, "file_path": file_path}]
-    
-    def _extract_txt(self, file_path: str) -> List[Dict]:
-        """提取文本文件"""
+        page_num = 0
+        chunk = []
+        for text in iter_docx_paragraphs(file_path):
+            if not text.strip():
+                continue
+            chunk.append(text)
+            if len(chunk) == self.DOCX_PAGE_PARAGRAPHS:
+                page_num += 1
+                yield {"page": page_num, "content": "\n".join(chunk), "file": filename, "file_path": file_path}
+                chunk = []
+        
+        if chunk or page_num == 0:
+            yield {"page": page_num + 1, "content": "\n".join(chunk), "file": filename, "file_path": file_path}
+    
+    def _iter_txt(self, file_path: str) -> Iterator[Dict]:
+        """
+        逐块读取文本文件，每块不超过 TXT_PAGE_CHARS 个字符为一"页"
+        尽量在空行（段落）处分页，其次在换行处
+        """
+        filename = Path(file_path).name
+        page_num = 0
+        rest = ""
+        
         with open(file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
+            while True:
+                block = f.read(self.TXT_PAGE_CHARS - len(rest))
+                buffer = rest + block
+                if not block:
+                    break
+                if len(buffer) < self.TXT_PAGE_CHARS:
+                    rest = buffer
+                    continue
+                
+                cut = buffer.rfind("\n\n", self.TXT_PAGE_CHARS // 2)
+                cut = cut + 2 if cut >= 0 else buffer.rfind("\n", self.TXT_PAGE_CHARS // 2) + 1
+                if cut <= 0:
+                    cut = len(buffer)
+                page_num += 1
+                yield {"page": page_num, "content": buffer[:cut], "file": filename, "file_path": file_path}
+                rest = buffer[cut:]
+        
+        if rest or page_num == 0:
+            yield {"page": page_num + 1, "content": rest, "file": filename, "file_path": file_path}
+    
+    def _iter_xlsx(self, file_path: str) -> Iterator[Dict]:
+        """逐行流式读取Excel工作簿（只读模式，不把整个工作簿载入内存）"""
+        workbook = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+        try:
+            sheets = ((ws.title, ws.iter_rows(values_only=True)) for ws in workbook.worksheets)
+            yield from self._sheet_pages(file_path, sheets)
+        finally:
+            workbook.close()
+    
+    def _iter_xls(self, file_path: str) -> Iterator[Dict]:
+        """读取旧版 .xls 工作簿（需要 xlrd，工作表按需加载）"""
+        if not XLRD_AVAILABLE:
+            raise ImportError("需要安装 xlrd: pip install xlrd")
+        workbook = xlrd.open_workbook(file_path, on_demand=True)
         
+        def rows(index: int):
+            sheet = workbook.sheet_by_index(index)
+            for r in range(sheet.nrows):
+                row = []
+                for cell in sheet.row(r):
+                    if cell.ctype == xlrd.XL_CELL_DATE:
+                        row.append(xlrd.xldate.xldate_as_datetime(cell.value, workbook.datemode))
+                    else:
+                        row.append(cell.value if cell.value != "" else None)
+                yield row
+            workbook.unload_sheet(index)
+        
+        try:
+            sheets = ((name, rows(i)) for i, name in enumerate(workbook.sheet_names()))
+            yield from self._sheet_pages(file_path, sheets)
+        finally:
+            workbook.release_resources()
+    
+    def _sheet_pages(self, file_path: str, sheets) -> Iterator[Dict]:
+        """
+        把工作表的行分页：每个工作表至少一页（空工作表只有 "[工作表名]"），每页最多 SHEET_PAGE_ROWS 行
+        每页开头为 "[工作表名]" 和表头行（第一个非空行），单独检索某一页时也能看懂各列含义
+        """
         filename = Path(file_path).name
-        return [{"page": 1, "content": content, "file": filename, "file_path": file_path}]
+        page_num = 0
+        for name, rows in sheets:
+            header = None
+            lines = []
+            sheet_pages = 0
+            for values in rows:
+                line = _row_text(values)
+                if not line:
+                    continue
+                if header is None:
+                    header = line
+                    continue
+                lines.append(line)
+                if len(lines) == self.SHEET_PAGE_ROWS:
+                    page_num += 1
+                    sheet_pages += 1
+                    yield {"page": page_num, "content": "\n".join([f"[{name}]", header] + lines),
+                           "file": filename, "file_path": file_path}
+                    lines = []
+            if lines or not sheet_pages:
+                page_num += 1
+                head = [f"[{name}]"] if header is None else [f"[{name}]", header]
+                yield {"page": page_num, "content": "\n".join(head + lines),
+                       "file": filename, "file_path": file_path}
     
-    def get_file_hash(self, file_path: str) -> str:
-        """计算文件哈希"""
-        with open(file_path, 'rb') as f:
-            return hashlib.md5(f.read()).hexdigest()
+    def get_file_hash(self, file_path: str, algorithm: str = "md5") -> str:
+        """
+        计算文件哈希（分块流式读取；文件未改动时直接返回缓存的结果）
+        algorithm: md5（默认，与已有索引兼容）、sha256、blake2b、xxhash
+        """
+        return self.hash_cache.hash_file(file_path, algorithm)
 
 
 class PDFEditor:
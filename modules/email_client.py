@@ -247,8 +247,30 @@ def compose_email_with_llm(llm_client,
 xxx"""
 
     response = llm_client.simple_chat(prompt)
+    return _parse_email_response(response)
+
+
+def compose_emails_with_llm(llm_client,
+                            requests: List[Dict[str, str]],
+                            tone: str = "professional") -> List[Dict[str, str]]:
+    """
+    批量撰写邮件（多封邮件打包在少量请求中）
+    requests: [{"purpose": "xxx", "context": "xxx"}, ...]
+    返回: [{"subject": "xxx", "body": "xxx"}, ...]，与输入顺序一致
+    """
+    if not hasattr(llm_client, "batch_chat"):
+        return [compose_email_with_llm(llm_client, r.get("purpose", ""), r.get("context", ""), tone)
+                for r in requests]
     
-    # 解析响应
+    prompts = [f"目的：{r.get('purpose', '')}\n背景信息：{r.get('context', '')}" for r in requests]
+    instruction = (f"根据 input 撰写一封邮件，语气：{tone}。"
+                   "output 格式为：第一行 \"主题：xxx\"，第二行 \"正文：\"，之后是邮件正文")
+    responses = llm_client.batch_chat(prompts, instruction=instruction, temperature=0.7)
+    return [_parse_email_response(r) for r in responses]
+
+
+def _parse_email_response(response: str) -> Dict[str, str]:
+    """解析 "主题：xxx / 正文：xxx" 格式的邮件"""
     lines = response.strip().split('\n')
     subject = ""
     body_lines = []
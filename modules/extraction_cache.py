@@ -0,0 +1,142 @@
+"""
+提取结果缓存 - 按文件内容哈希保存已提取的分页文本（压缩存储，超出容量时淘汰最久未用的）
+"""
+import os
+import gzip
+import json
+import threading
+import time
+from pathlib import Path
+from typing import Optional, Dict, List, Iterator, Tuple
+
+
+class ExtractionCache:
+    """
+    文档提取结果缓存
+    每个文档一个 gzip 压缩的 JSON Lines 文件（每行一页 [页码, 文本]），按页流式读写，
+    命中时不必一次读入整个文档；总大小超过 max_bytes 时删除最久未使用的文件
+    """
+    
+    SUFFIX = ".jsonl.gz"
+    
+    def __init__(self, cache_dir: str = "./data/extraction_cache", max_bytes: int = 256 * 1024 * 1024):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+    
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}{self.SUFFIX}"
+    
+    def iter_pages(self, key: str) -> Optional[Iterator[Tuple[int, str]]]:
+        """读取缓存的分页文本，未命中时返回None"""
+        path = self._path(key)
+        try:
+            f = gzip.open(path, "rt", encoding="utf-8")
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        # 更新修改时间，淘汰时按最近使用排序
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return self._read(f)
+    
+    @staticmethod
+    def _read(f) -> Iterator[Tuple[int, str]]:
+        with f:
+            for line in f:
+                page, content = json.loads(line)
+                yield page, content
+    
+    def writer(self, key: str) -> "_CacheWriter":
+        """
+        逐页写入缓存（with 语句块正常结束才生效，中途出错或被中断时丢弃）
+            with cache.writer(key) as w:
+                w.add(1, "第一页")
+        """
+        return _CacheWriter(self, key)
+    
+    def put(self, key: str, pages: List[Dict]):
+        """一次写入整个文档的分页 [{"page": 1, "content": "..."}, ...]"""
+        with self.writer(key) as w:
+            for page in pages:
+                w.add(page["page"], page["content"])
+    
+    def _commit(self, tmp_path: Path, key: str):
+        os.replace(tmp_path, self._path(key))
+        self._evict()
+    
+    def _entries(self) -> List[os.DirEntry]:
+        return [e for e in os.scandir(self.cache_dir) if e.is_file() and e.name.endswith(self.SUFFIX)]
+    
+    def _evict(self):
+        """总大小超过上限时，从最久未使用的开始删除"""
+        with self._lock:
+            entries = [(e.stat().st_mtime, e.stat().st_size, e.path) for e in self._entries()]
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                    total -= size
+                except OSError:
+                    pass
+    
+    def clear(self):
+        """清空缓存"""
+        for entry in self._entries():
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+    
+    def stats(self) -> Dict:
+        """
+        缓存统计
+        返回: {"entries": 10, "bytes": 1024, "hits": 5, "misses": 3}
+        """
+        entries = self._entries()
+        with self._lock:
+            return {
+                "entries": len(entries),
+                "bytes": sum(e.stat().st_size for e in entries),
+                "hits": self.hits,
+                "misses": self.misses
+            }
+
+
+class _CacheWriter:
+    """逐页写入临时文件，完整写完后原子替换为缓存文件"""
+    
+    def __init__(self, cache: ExtractionCache, key: str):
+        self.cache = cache
+        self.key = key
+        self.tmp_path = cache.cache_dir / f".{key}.{os.getpid()}.{threading.get_ident()}.{time.monotonic_ns()}.tmp"
+        self._file = None
+    
+    def __enter__(self):
+        self._file = gzip.open(self.tmp_path, "wt", encoding="utf-8", compresslevel=4)
+        return self
+    
+    def add(self, page: int, content: str):
+        self._file.write(json.dumps([page, content], ensure_ascii=False))
+        self._file.write("\n")
+    
+    def __exit__(self, exc_type, exc, tb):
+        self._file.close()
+        if exc_type is None:
+            self.cache._commit(self.tmp_path, self.key)
+        else:
+            try:
+                os.remove(self.tmp_path)
+            except OSError:
+                pass
+        return False
@@ -0,0 +1,101 @@
+"""
+文件哈希模块 - 分块流式计算文件哈希，并缓存未改动文件的结果
+"""
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+
+try:
+    import xxhash
+    XXHASH_AVAILABLE = True
+except ImportError:
+    XXHASH_AVAILABLE = False
+
+
+# 每次读取的块大小
+HASH_BLOCK_SIZE = 1024 * 1024
+
+HASH_ALGORITHMS = ("md5", "sha256", "blake2b", "xxhash")
+
+
+def _new_hasher(algorithm: str):
+    if algorithm == "xxhash":
+        if not XXHASH_AVAILABLE:
+            raise ImportError("需要安装 xxhash: pip install xxhash")
+        return xxhash.xxh3_128()
+    if algorithm == "blake2b":
+        return hashlib.blake2b(digest_size=16)
+    if algorithm in ("md5", "sha256"):
+        return hashlib.new(algorithm)
+    raise ValueError(f"不支持的哈希算法: {algorithm}")
+
+
+def hash_file(file_path: str, algorithm: str = "md5", block_size: int = HASH_BLOCK_SIZE) -> str:
+    """
+    分块流式计算文件哈希，内存占用只有一个块
+    algorithm: md5（默认，与已有索引兼容）、sha256（CPU支持SHA指令时最快的内置算法）、blake2b、
+        xxhash（非加密哈希，最快，需安装 xxhash）
+    """
+    hasher = _new_hasher(algorithm)
+    buffer = bytearray(block_size)
+    view = memoryview(buffer)
+    with open(file_path, 'rb', buffering=0) as f:
+        while True:
+            n = f.readinto(buffer)
+            if not n:
+                break
+            hasher.update(view[:n])
+    return hasher.hexdigest()
+
+
+class FileHashCache:
+    """
+    文件哈希缓存
+    以 (路径, 大小, 修改时间, inode) 为键，文件未改动时直接返回上次的结果，不再读取文件
+    """
+    
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[tuple, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+    
+    @staticmethod
+    def make_key(file_path: str, algorithm: str) -> tuple:
+        stat = os.stat(file_path)
+        return (os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns, stat.st_dev, stat.st_ino, algorithm)
+    
+    def hash_file(self, file_path: str, algorithm: str = "md5") -> str:
+        """计算文件哈希，文件未改动时直接返回缓存的结果"""
+        key = self.make_key(file_path, algorithm)
+        with self._lock:
+            digest = self._entries.get(key)
+            if digest is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return digest
+            self.misses += 1
+        
+        digest = hash_file(file_path, algorithm)
+        # 计算期间文件被修改时不缓存
+        if self.make_key(file_path, algorithm) == key:
+            with self._lock:
+                self._entries[key] = digest
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return digest
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_default_cache = FileHashCache()
+
+
+def get_file_hash_cache() -> FileHashCache:
+    """进程内共用的文件哈希缓存"""
+    return _default_cache
@@ -0,0 +1,186 @@
+"""
+大模型响应缓存 - 基于SQLite的内容寻址缓存
+"""
+import json
+import sqlite3
+import hashlib
+import threading
+import time
+from pathlib import Path
+from typing import Optional, Dict
+
+
+class LLMResponseCache:
+    """大模型响应缓存（LRU淘汰 + 过期时间 + 容量上限）"""
+    
+    # 淘汰时每次读取的候选条数
+    EVICT_BATCH = 64
+    
+    def __init__(self,
+                 db_path: str = "./data/llm_cache.db",
+                 max_entries: int = 10000,
+                 max_bytes: int = 50 * 1024 * 1024,
+                 ttl: Optional[float] = 7 * 24 * 3600):
+        """
+        max_entries: 最多缓存条数
+        max_bytes: 缓存响应的总字节数上限
+        ttl: 过期时间（秒），None表示永不过期
+        """
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+        self._init_db()
+    
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(str(self.db_path), timeout=30)
+    
+    def _init_db(self):
+        """初始化数据库"""
+        conn = self._connect()
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                response TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_last_access ON responses(last_access)')
+        conn.commit()
+        conn.close()
+    
+    @staticmethod
+    def make_key(provider: str,
+                 base_url: str,
+                 model: str,
+                 messages: list,
+                 temperature: float,
+                 max_tokens: Optional[int]) -> str:
+        """根据请求内容计算缓存键"""
+        payload = json.dumps({
+            "provider": provider,
+            "base_url": base_url,
+            "model": model,
+            "messages": messages,
+            "temperature": temperature,
+            "max_tokens": max_tokens
+        }, ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+    
+    def _count(self, name: str, n: int = 1):
+        with self._lock:
+            self._stats[name] += n
+    
+    def get(self, key: str) -> Optional[str]:
+        """读取缓存，未命中或已过期返回None"""
+        now = time.time()
+        conn = self._connect()
+        try:
+            row = conn.execute(
+                'SELECT response, created_at FROM responses WHERE key = ?', (key,)
+            ).fetchone()
+            
+            if row is None:
+                self._count("misses")
+                return None
+            
+            response, created_at = row
+            if self.ttl is not None and now - created_at > self.ttl:
+                conn.execute('DELETE FROM responses WHERE key = ?', (key,))
+                conn.commit()
+                self._count("misses")
+                return None
+            
+            conn.execute('UPDATE responses SET last_access = ? WHERE key = ?', (now, key))
+            conn.commit()
+            self._count("hits")
+            return response
+        finally:
+            conn.close()
+    
+    def set(self, key: str, response: str):
+        """写入缓存，并按需淘汰"""
+        now = time.time()
+        size = len(response.encode('utf-8'))
+        if size > self.max_bytes:
+            return
+        
+        conn = self._connect()
+        try:
+            conn.execute('''
+                INSERT OR REPLACE INTO responses (key, response, size, created_at, last_access)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (key, response, size, now, now))
+            self._count("stores")
+            self._evict(conn, now)
+            conn.commit()
+        finally:
+            conn.close()
+    
+    def _evict(self, conn: sqlite3.Connection, now: float):
+        """删除过期条目，再按最近最少使用淘汰到容量以内"""
+        evicted = 0
+        if self.ttl is not None:
+            evicted += conn.execute(
+                'DELETE FROM responses WHERE created_at < ?', (now - self.ttl,)
+            ).rowcount
+        
+        count, total = conn.execute(
+            'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses'
+        ).fetchone()
+        if count <= self.max_entries and total <= self.max_bytes:
+            if evicted:
+                self._count("evictions", evicted)
+            return
+        
+        # 按 last_access 索引从最久未用的开始分批读取，降到容量以内就停止（不读整张表）
+        cursor = conn.execute(
+            'SELECT key, size FROM responses ORDER BY last_access ASC'
+        )
+        to_delete = []
+        while count > self.max_entries or total > self.max_bytes:
+            rows = cursor.fetchmany(self.EVICT_BATCH)
+            if not rows:
+                break
+            for key, size in rows:
+                if count <= self.max_entries and total <= self.max_bytes:
+                    break
+                to_delete.append((key,))
+                count -= 1
+                total -= size
+        cursor.close()
+        
+        conn.executemany('DELETE FROM responses WHERE key = ?', to_delete)
+        self._count("evictions", evicted + len(to_delete))
+    
+    def clear(self):
+        """清空缓存"""
+        conn = self._connect()
+        conn.execute('DELETE FROM responses')
+        conn.commit()
+        conn.close()
+    
+    def stats(self) -> Dict:
+        """
+        缓存统计
+        返回: {"hits": 10, "misses": 5, "hit_rate": 0.67, "entries": 100, "bytes": 12345, ...}
+        """
+        conn = self._connect()
+        entries, total = conn.execute(
+            'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses'
+        ).fetchone()
+        conn.close()
+        
+        with self._lock:
+            result = dict(self._stats)
+        lookups = result["hits"] + result["misses"]
+        result["hit_rate"] = result["hits"] / lookups if lookups else 0.0
+        result["entries"] = entries
+        result["bytes"] = total
+        return result
@@ -1,8 +1,42 @@
 """
 大模型客户端 - 支持多个提供商
 """
+import asyncio
+import atexit
+import json
+import threading
+import time
+import weakref
 import httpx
-from typing import Optional, Generator, Dict
+from contextlib import contextmanager, asynccontextmanager
+from typing import Optional, Generator, AsyncGenerator, Dict, List, Union
+from .llm_cache import LLMResponseCache
+from .rate_limiter import RetryPolicy, estimate_tokens, get_rate_limiter, get_concurrency
+from .single_flight import SingleFlight
+from . import prompt_batch
+from .llm_metrics import LLMCallEvent, emit
+from .sse import StreamStats, iter_chat_deltas, aiter_chat_deltas, track_stream, atrack_stream
+
+try:
+    import h2  # noqa: F401  httpx 的 HTTP/2 支持依赖此包
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+# 所有存活的客户端，进程退出时统一关闭连接池
+_live_clients = weakref.WeakSet()
+
+
+def _close_all_clients():
+    for client in list(_live_clients):
+        client.close()
+
+
+atexit.register(_close_all_clients)
+
+# 进程内共享的请求合并器：多个会话同时发出的相同请求只调用一次上游
+_flights = SingleFlight()
 
 
 class LLMClient:
@@ -12,7 +46,18 @@ class LLMClient:
                  api_key: str,
                  base_url: str,
                  model: str,
-                 provider: str = "openai"):
+                 provider: str = "openai",
+                 timeout: float = 120,
+                 max_connections: int = 20,
+                 max_keepalive_connections: int = 10,
+                 keepalive_expiry: float = 30.0,
+                 http2: bool = False,
+                 cache: Optional[LLMResponseCache] = None,
+                 rpm: float = 0,
+                 tpm: float = 0,
+                 max_retries: int = 5,
+                 max_concurrency: int = 16,
+                 coalesce: bool = True):
         self.api_key = api_key
         self.base_url = base_url
         self.model = model
@@ -20,95 +65,578 @@ class LLMClient:
         
         if not self.api_key:
             raise ValueError("API Key 未配置")
+        
+        # 连接池配置（长连接复用，避免每次请求重新握手）
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self.max_keepalive_connections = max_keepalive_connections
+        self.keepalive_expiry = keepalive_expiry
+        self.http2 = http2 and HTTP2_AVAILABLE
+        
+        # 响应缓存（可选）：默认只缓存 temperature=0 的确定性请求
+        self.cache = cache
+        
+        # 限流与重试：同一提供商的客户端共享配额，429时自动收缩并发
+        self.rate_limiter = get_rate_limiter(provider, rpm, tpm)
+        self.concurrency = get_concurrency(provider, max_concurrency)
+        self.retry_policy = RetryPolicy(max_retries=max_retries)
+        
+        # 合并并发的相同请求（共享同一次上游调用）
+        self.coalesce = coalesce
+        
+        self._http_client: Optional[httpx.Client] = None
+        # 异步连接池只能在创建它的事件循环中使用，每个事件循环一个（多个会话各自 asyncio.run 时互不影响）
+        self._async_clients: Dict[asyncio.AbstractEventLoop, httpx.AsyncClient] = {}
+        self._lock = threading.Lock()
+        _live_clients.add(self)
     
     @classmethod
     def from_config(cls, config: Dict) -> 'LLMClient':
         """从配置字典创建客户端"""
+        cache = None
+        if config.get("cache_enabled"):
+            cache = LLMResponseCache(
+                db_path=config.get("cache_path", "./data/llm_cache.db"),
+                max_entries=config.get("cache_max_entries", 10000),
+                max_bytes=config.get("cache_max_bytes", 50 * 1024 * 1024),
+                ttl=config.get("cache_ttl", 7 * 24 * 3600)
+            )
         return cls(
             api_key=config.get("api_key", ""),
             base_url=config.get("base_url", ""),
             model=config.get("model", ""),
-            provider=config.get("provider", "openai")
+            provider=config.get("provider", "openai"),
+            timeout=config.get("timeout", 120),
+            max_connections=config.get("max_connections", 20),
+            max_keepalive_connections=config.get("max_keepalive_connections", 10),
+            keepalive_expiry=config.get("keepalive_expiry", 30.0),
+            http2=config.get("http2", False),
+            cache=cache,
+            rpm=config.get("rpm", 0),
+            tpm=config.get("tpm", 0),
+            max_retries=config.get("max_retries", 5),
+            max_concurrency=config.get("max_concurrency", 16),
+            coalesce=config.get("coalesce_requests", True)
         )
     
-    def chat(self, 
-             messages: list, 
-             temperature: float = 0.7,
-             max_tokens: int = 4096) -> str:
-        """同步聊天"""
-        headers = {
+    def _headers(self) -> Dict[str, str]:
+        return {
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json"
         }
-        
+    
+    def _limits(self) -> httpx.Limits:
+        return httpx.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_keepalive_connections,
+            keepalive_expiry=self.keepalive_expiry
+        )
+    
+    def _build_payload(self,
+                       messages: list,
+                       temperature: float,
+                       max_tokens: Optional[int] = None,
+                       stream: bool = False) -> Dict:
         data = {
             "model": self.model,
             "messages": messages,
-            "temperature": temperature,
-            "max_tokens": max_tokens
+            "temperature": temperature
         }
-        
-        with httpx.Client(timeout=120) as client:
-            response = client.post(
-                f"{self.base_url}/chat/completions",
-                headers=headers,
-                json=data
-            )
-            response.raise_for_status()
-            result = response.json()
-            return result["choices"][0]["message"]["content"]
+        if max_tokens is not None:
+            data["max_tokens"] = max_tokens
+        if stream:
+            data["stream"] = True
+        return data
+    
+    def _cache_key(self, messages: list, temperature: float, max_tokens: Optional[int],
+                   use_cache: Optional[bool]) -> Optional[str]:
+        """计算缓存键；不走缓存时返回None"""
+        if self.cache is None:
+            return None
+        if use_cache is None:
+            use_cache = temperature == 0
+        if not use_cache:
+            return None
+        return self._request_key(messages, temperature, max_tokens)
+    
+    def _request_key(self, messages: list, temperature: float, max_tokens: Optional[int]) -> str:
+        return LLMResponseCache.make_key(
+            self.provider, self.base_url, self.model, messages, temperature, max_tokens
+        )
+    
+    def _get_http_client(self) -> httpx.Client:
+        """获取共享的连接池（懒加载，线程安全）"""
+        client = self._http_client
+        if client is None or client.is_closed:
+            with self._lock:
+                if self._http_client is None or self._http_client.is_closed:
+                    self._http_client = httpx.Client(
+                        timeout=self.timeout,
+                        headers=self._headers(),
+                        http2=self.http2,
+                        limits=self._limits()
+                    )
+                client = self._http_client
+        return client
+    
+    def _get_async_client(self) -> httpx.AsyncClient:
+        """获取当前事件循环的异步连接池（每个事件循环一个，懒加载）"""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            client = self._async_clients.get(loop)
+            if client is None or client.is_closed:
+                # 顺便释放已关闭事件循环遗留的连接池（这些循环上已无法 await 关闭）
+                for old_loop in [l for l in self._async_clients if l.is_closed()]:
+                    del self._async_clients[old_loop]
+                client = httpx.AsyncClient(
+                    timeout=self.timeout,
+                    headers=self._headers(),
+                    http2=self.http2,
+                    limits=self._limits()
+                )
+                self._async_clients[loop] = client
+            return client
+    
+    def close(self):
+        """关闭连接池"""
+        with self._lock:
+            if self._http_client is not None:
+                self._http_client.close()
+                self._http_client = None
+            # 异步连接池只能在其事件循环中关闭：循环仍在运行的交给它关闭，其余仅释放引用
+            async_clients = self._async_clients
+            self._async_clients = {}
+        for loop, client in async_clients.items():
+            if loop.is_running() and not loop.is_closed():
+                asyncio.run_coroutine_threadsafe(client.aclose(), loop)
+    
+    async def aclose(self):
+        """关闭当前事件循环的异步连接池（其他事件循环上的连接池不受影响）"""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            client = self._async_clients.pop(loop, None)
+        if client is not None:
+            await client.aclose()
+    
+    def _retry_delay(self, attempt: int, error: Exception) -> float:
+        """计算重试等待时间；不可重试或次数用尽时直接抛出"""
+        if self.retry_policy.is_throttled(error):
+            self.concurrency.on_throttle()
+        if attempt >= self.retry_policy.max_retries or not self.retry_policy.is_retryable(error):
+            raise error
+        if isinstance(error, httpx.HTTPStatusError):
+            reason = str(error.response.status_code)
+        else:
+            reason = type(error).__name__
+        emit(LLMCallEvent(self.provider, self.model, kind="retry", error=reason))
+        return self.retry_policy.get_delay(attempt, error)
+    
+    def _post(self, data: Dict) -> Dict:
+        """发送请求（限流 + 自适应并发 + 失败重试）"""
+        tokens = estimate_tokens(data["messages"])
+        attempt = 0
+        while True:
+            self.rate_limiter.acquire(tokens)
+            with self.concurrency:
+                try:
+                    response = self._get_http_client().post(
+                        f"{self.base_url}/chat/completions",
+                        json=data
+                    )
+                    response.raise_for_status()
+                    self.concurrency.on_success()
+                    return response.json()
+                except httpx.HTTPError as e:
+                    error = e
+            time.sleep(self._retry_delay(attempt, error))
+            attempt += 1
+    
+    async def _apost(self, data: Dict) -> Dict:
+        """异步发送请求（限流 + 自适应并发 + 失败重试）"""
+        tokens = estimate_tokens(data["messages"])
+        attempt = 0
+        while True:
+            await self.rate_limiter.aacquire(tokens)
+            await self.concurrency.aacquire()
+            try:
+                response = await self._get_async_client().post(
+                    f"{self.base_url}/chat/completions",
+                    json=data
+                )
+                response.raise_for_status()
+                self.concurrency.on_success()
+                return response.json()
+            except httpx.HTTPError as e:
+                error = e
+            finally:
+                self.concurrency.release()
+            await asyncio.sleep(self._retry_delay(attempt, error))
+            attempt += 1
+    
+    @contextmanager
+    def _open_stream(self, data: Dict):
+        """建立流式连接；只在收到响应前重试，开始输出后的错误直接抛出"""
+        tokens = estimate_tokens(data["messages"])
+        attempt = 0
+        while True:
+            self.rate_limiter.acquire(tokens)
+            established = False
+            with self.concurrency:
+                try:
+                    with self._get_http_client().stream(
+                        "POST",
+                        f"{self.base_url}/chat/completions",
+                        json=data
+                    ) as response:
+                        response.raise_for_status()
+                        established = True
+                        yield response
+                    self.concurrency.on_success()
+                    return
+                except httpx.HTTPError as e:
+                    if established:
+                        raise
+                    error = e
+            time.sleep(self._retry_delay(attempt, error))
+            attempt += 1
+    
+    @asynccontextmanager
+    async def _aopen_stream(self, data: Dict):
+        """异步建立流式连接；只在收到响应前重试"""
+        tokens = estimate_tokens(data["messages"])
+        attempt = 0
+        while True:
+            await self.rate_limiter.aacquire(tokens)
+            await self.concurrency.aacquire()
+            established = False
+            try:
+                async with self._get_async_client().stream(
+                    "POST",
+                    f"{self.base_url}/chat/completions",
+                    json=data
+                ) as response:
+                    response.raise_for_status()
+                    established = True
+                    yield response
+                self.concurrency.on_success()
+                return
+            except httpx.HTTPError as e:
+                if established:
+                    raise
+                error = e
+            finally:
+                self.concurrency.release()
+            await asyncio.sleep(self._retry_delay(attempt, error))
+            attempt += 1
+    
+    def __enter__(self) -> 'LLMClient':
+        return self
+    
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+    
+    def chat(self, 
+             messages: list, 
+             temperature: float = 0.7,
+             max_tokens: int = 4096,
+             use_cache: Optional[bool] = None) -> str:
+        """
+        同步聊天
+        use_cache: 是否使用响应缓存，默认仅 temperature=0 时使用
+        """
+        start = time.monotonic()
+        event = LLMCallEvent(self.provider, self.model)
+        try:
+            cache_key = self._cache_key(messages, temperature, max_tokens, use_cache)
+            if cache_key:
+                cached = self.cache.get(cache_key)
+                if cached is not None:
+                    event.cache_hit = True
+                    return cached
+            
+            data = self._build_payload(messages, temperature, max_tokens)
+            # 只有真正发出请求的调用方才记录token用量，被合并的调用方标记为 coalesced
+            event.coalesced = self.coalesce
+            
+            def request() -> str:
+                event.coalesced = False
+                result = self._post(data)
+                self._record_usage(event, result.get("usage"))
+                content = result["choices"][0]["message"]["content"]
+                if cache_key:
+                    self.cache.set(cache_key, content)
+                return content
+            
+            if not self.coalesce:
+                return request()
+            return _flights.do(self._request_key(messages, temperature, max_tokens), request)
+        except Exception as e:
+            event.error = type(e).__name__
+            raise
+        finally:
+            event.latency = time.monotonic() - start
+            emit(event)
+    
+    @staticmethod
+    def _record_usage(event: LLMCallEvent, usage: Optional[Dict]):
+        if usage:
+            event.prompt_tokens = usage.get("prompt_tokens") or 0
+            event.completion_tokens = usage.get("completion_tokens") or 0
+    
+    def _stream_deltas(self, data: Dict, stats: Optional[StreamStats] = None) -> Generator[str, None, None]:
+        with self._open_stream(data) as response:
+            yield from iter_chat_deltas(response.iter_text(), stats)
+    
+    async def _astream_deltas(self, data: Dict,
+                              stats: Optional[StreamStats] = None) -> AsyncGenerator[str, None]:
+        async with self._aopen_stream(data) as response:
+            async for content in aiter_chat_deltas(response.aiter_text(), stats):
+                yield content
     
     def chat_stream(self, 
                     messages: list,
-                    temperature: float = 0.7) -> Generator[str, None, None]:
-        """流式聊天"""
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json"
-        }
-        
-        data = {
-            "model": self.model,
-            "messages": messages,
-            "temperature": temperature,
-            "stream": True
-        }
-        
-        with httpx.Client(timeout=120) as client:
-            with client.stream(
-                "POST",
-                f"{self.base_url}/chat/completions",
-                headers=headers,
-                json=data
-            ) as response:
-                for line in response.iter_lines():
-                    if line.startswith("data: "):
-                        content = line[6:]
-                        if content == "[DONE]":
-                            break
-                        try:
-                            import json
-                            chunk = json.loads(content)
-                            delta = chunk["choices"][0].get("delta", {})
-                            if "content" in delta:
-                                yield delta["content"]
-                        except:
-                            pass
-
-    def simple_chat(self, prompt: str, system: str = "你是一个有帮助的助手。") -> str:
+                    temperature: float = 0.7,
+                    stats: Optional[StreamStats] = None) -> Generator[str, None, None]:
+        """
+        流式聊天
+        stats: 传入 StreamStats 以获取首token延迟和输出速度
+        流中包含提供商错误时抛出 LLMStreamError
+        """
+        data = self._build_payload(messages, temperature, stream=True)
+        stats = stats if stats is not None else StreamStats()
+        stats.start = time.monotonic()
+        event = LLMCallEvent(self.provider, self.model, kind="stream")
+        try:
+            if not self.coalesce:
+                yield from self._stream_deltas(data, stats)
+                self._record_usage(event, stats.usage)
+                return
+            
+            # 相同的流式请求共享同一上游，后加入者从头重放
+            upstream = StreamStats()
+            event.coalesced = True
+            
+            def produce():
+                event.coalesced = False
+                return self._stream_deltas(data, upstream)
+            
+            key = "stream:" + self._request_key(messages, temperature, None)
+            yield from track_stream(_flights.stream(key, produce), stats)
+            if not event.coalesced:
+                self._record_usage(event, upstream.usage)
+        except Exception as e:
+            event.error = type(e).__name__
+            raise
+        finally:
+            stats.finish()
+            event.latency = time.monotonic() - stats.start
+            event.ttft = stats.ttft
+            emit(event)
+    
+    def simple_chat(self, 
+                    prompt: str, 
+                    system: str = "你是一个有帮助的助手。",
+                    temperature: float = 0.7,
+                    use_cache: Optional[bool] = None) -> str:
         """简单聊天接口"""
         messages = [
             {"role": "system", "content": system},
             {"role": "user", "content": prompt}
         ]
-        return self.chat(messages)
+        return self.chat(messages, temperature, use_cache=use_cache)
+    
+    # ===== 异步接口 =====
+    
+    async def achat(self, 
+                    messages: list, 
+                    temperature: float = 0.7,
+                    max_tokens: int = 4096,
+                    use_cache: Optional[bool] = None) -> str:
+        """异步聊天"""
+        start = time.monotonic()
+        event = LLMCallEvent(self.provider, self.model)
+        try:
+            cache_key = self._cache_key(messages, temperature, max_tokens, use_cache)
+            if cache_key:
+                cached = self.cache.get(cache_key)
+                if cached is not None:
+                    event.cache_hit = True
+                    return cached
+            
+            data = self._build_payload(messages, temperature, max_tokens)
+            event.coalesced = self.coalesce
+            
+            async def request() -> str:
+                event.coalesced = False
+                result = await self._apost(data)
+                self._record_usage(event, result.get("usage"))
+                content = result["choices"][0]["message"]["content"]
+                if cache_key:
+                    self.cache.set(cache_key, content)
+                return content
+            
+            if not self.coalesce:
+                return await request()
+            return await _flights.ado(self._request_key(messages, temperature, max_tokens), request)
+        except Exception as e:
+            event.error = type(e).__name__
+            raise
+        finally:
+            event.latency = time.monotonic() - start
+            emit(event)
+    
+    async def achat_stream(self, 
+                           messages: list,
+                           temperature: float = 0.7,
+                           stats: Optional[StreamStats] = None) -> AsyncGenerator[str, None]:
+        """异步流式聊天"""
+        data = self._build_payload(messages, temperature, stream=True)
+        stats = stats if stats is not None else StreamStats()
+        stats.start = time.monotonic()
+        event = LLMCallEvent(self.provider, self.model, kind="stream")
+        try:
+            if not self.coalesce:
+                async for content in self._astream_deltas(data, stats):
+                    yield content
+                self._record_usage(event, stats.usage)
+                return
+            
+            upstream = StreamStats()
+            event.coalesced = True
+            
+            def produce():
+                event.coalesced = False
+                return self._astream_deltas(data, upstream)
+            
+            key = "stream:" + self._request_key(messages, temperature, None)
+            async for content in atrack_stream(_flights.astream(key, produce), stats):
+                yield content
+            if not event.coalesced:
+                self._record_usage(event, upstream.usage)
+        except Exception as e:
+            event.error = type(e).__name__
+            raise
+        finally:
+            stats.finish()
+            event.latency = time.monotonic() - stats.start
+            event.ttft = stats.ttft
+            emit(event)
+    
+    async def asimple_chat(self, 
+                           prompt: str, 
+                           system: str = "你是一个有帮助的助手。",
+                           temperature: float = 0.7,
+                           use_cache: Optional[bool] = None) -> str:
+        """异步简单聊天接口"""
+        messages = [
+            {"role": "system", "content": system},
+            {"role": "user", "content": prompt}
+        ]
+        return await self.achat(messages, temperature, use_cache=use_cache)
+    
+    async def gather_chat(self,
+                          prompts: List[Union[str, list]],
+                          concurrency: int = 8,
+                          system: str = "你是一个有帮助的助手。",
+                          temperature: float = 0.7,
+                          max_tokens: int = 4096,
+                          use_cache: Optional[bool] = None,
+                          return_exceptions: bool = False) -> List[Union[str, BaseException]]:
+        """
+        并发执行多个请求，结果与输入顺序一致
+        prompts: 字符串（自动加上system）或完整的messages列表
+        concurrency: 同时在途的最大请求数
+        return_exceptions: 为True时失败项返回异常对象而不是直接抛出
+        """
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+        
+        async def run_one(prompt):
+            if isinstance(prompt, str):
+                messages = [
+                    {"role": "system", "content": system},
+                    {"role": "user", "content": prompt}
+                ]
+            else:
+                messages = prompt
+            async with semaphore:
+                return await self.achat(messages, temperature, max_tokens, use_cache)
+        
+        return await asyncio.gather(
+            *(run_one(p) for p in prompts),
+            return_exceptions=return_exceptions
+        )
+    
+    def batch_chat(self,
+                   prompts: List[str],
+                   instruction: str = "",
+                   system: str = "你是一个有帮助的助手。",
+                   temperature: float = 0.3,
+                   max_tokens: int = 4096,
+                   max_items: int = 20,
+                   max_batch_tokens: int = 1500,
+                   use_cache: Optional[bool] = None,
+                   return_exceptions: bool = False) -> List[Union[str, BaseException]]:
+        """
+        批量处理简短的独立提示词：打包成JSON格式的少量请求，结果与输入顺序一致
+        instruction: 所有条目共同的要求（如 "翻译成英文"）
+        max_items / max_batch_tokens: 每个请求最多打包的条数和输入token数
+        解析失败的条目自动单独请求
+        return_exceptions: 为True时单独请求仍失败的条目返回异常对象而不是直接抛出
+        """
+        return prompt_batch.batch_chat(self, prompts, instruction, system, temperature,
+                                       max_tokens, max_items, max_batch_tokens, use_cache,
+                                       return_exceptions)
+    
+    async def abatch_chat(self,
+                          prompts: List[str],
+                          instruction: str = "",
+                          system: str = "你是一个有帮助的助手。",
+                          temperature: float = 0.3,
+                          max_tokens: int = 4096,
+                          max_items: int = 20,
+                          max_batch_tokens: int = 1500,
+                          use_cache: Optional[bool] = None,
+                          concurrency: int = 4,
+                          return_exceptions: bool = False) -> List[Union[str, BaseException]]:
+        """异步版本的 batch_chat，各批次并发执行"""
+        return await prompt_batch.abatch_chat(self, prompts, instruction, system, temperature,
+                                              max_tokens, max_items, max_batch_tokens, use_cache,
+                                              concurrency, return_exceptions)
+
+
+# 按配置共享的客户端（同一配置复用同一个连接池）
+_shared_clients: Dict[str, LLMClient] = {}
+_shared_lock = threading.Lock()
+
+
+def get_coalescing_stats() -> Dict:
+    """请求合并统计 {"calls": 真实调用次数, "shared": 合并掉的调用次数}"""
+    return _flights.stats()
+
+
+def get_llm(config: Optional[Dict] = None) -> LLMClient:
+    """
+    获取共享的LLM客户端
+    config: LLM配置，默认读取 get_config().get_llm_config()
+    """
+    if config is None:
+        from .config_manager import get_config
+        config = get_config().get_llm_config()
+    
+    key = json.dumps(config, sort_keys=True)
+    with _shared_lock:
+        client = _shared_clients.get(key)
+        if client is None:
+            client = LLMClient.from_config(config)
+            _shared_clients[key] = client
+    return client
 
 
 def test_llm_connection(api_key: str, base_url: str, model: str) -> tuple[bool, str]:
     """测试LLM连接"""
     try:
-        client = LLMClient(api_key=api_key, base_url=base_url, model=model)
-        response = client.simple_chat("说'连接成功'两个字")
+        with LLMClient(api_key=api_key, base_url=base_url, model=model) as client:
+            response = client.simple_chat("说'连接成功'两个字")
         return True, response[:100]
     except Exception as e:
         return False, str(e)
@@ -0,0 +1,292 @@
+"""
+大模型调用监控模块 - 调用钩子、延迟直方图、Prometheus导出
+"""
+import threading
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Tuple
+
+
+# 延迟直方图的分桶（秒）
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1, 2, 5, 10, 20, 30, 60, 120)
+
+
+class LLMCallEvent:
+    """
+    一次大模型调用的记录
+    kind: chat / stream / retry
+    """
+    
+    __slots__ = ("provider", "model", "kind", "latency", "ttft", "prompt_tokens",
+                 "completion_tokens", "error", "cache_hit", "coalesced")
+    
+    def __init__(self,
+                 provider: str,
+                 model: str,
+                 kind: str = "chat",
+                 latency: float = 0.0,
+                 ttft: Optional[float] = None,
+                 prompt_tokens: int = 0,
+                 completion_tokens: int = 0,
+                 error: Optional[str] = None,
+                 cache_hit: bool = False,
+                 coalesced: bool = False):
+        self.provider = provider
+        self.model = model
+        self.kind = kind
+        self.latency = latency
+        self.ttft = ttft
+        self.prompt_tokens = prompt_tokens
+        self.completion_tokens = completion_tokens
+        self.error = error
+        self.cache_hit = cache_hit
+        self.coalesced = coalesced
+    
+    def to_dict(self) -> Dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class Histogram:
+    """累积直方图 + 最近样本（用于计算分位数）"""
+    
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS, window: int = 1000):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0.0
+        self.count = 0
+        self.recent = deque(maxlen=window)
+    
+    def observe(self, value: float):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.total += value
+        self.count += 1
+        self.recent.append(value)
+    
+    def percentile(self, p: float) -> Optional[float]:
+        if not self.recent:
+            return None
+        values = sorted(self.recent)
+        return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def _labels(**labels) -> str:
+    parts = []
+    for key, value in labels.items():
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        parts.append(f'{key}="{value}"')
+    return "{" + ",".join(parts) + "}"
+
+
+class LLMMetrics:
+    """调用指标汇总（作为默认钩子注册）"""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+    
+    def reset(self):
+        with self._lock:
+            self.latency: Dict[tuple, Histogram] = {}
+            self.ttft: Dict[tuple, Histogram] = {}
+            self.requests: Dict[tuple, int] = {}
+            self.errors: Dict[tuple, int] = {}
+            self.tokens: Dict[tuple, int] = {}
+            self.cache_hits: Dict[tuple, int] = {}
+            self.coalesced: Dict[tuple, int] = {}
+            self.retries: Dict[tuple, int] = {}
+    
+    @staticmethod
+    def _inc(counter: Dict, key: tuple, n: int = 1):
+        counter[key] = counter.get(key, 0) + n
+    
+    def __call__(self, event: LLMCallEvent):
+        base = (event.provider, event.model)
+        with self._lock:
+            if event.kind == "retry":
+                self._inc(self.retries, base + (event.error or "unknown",))
+                return
+            
+            series = base + (event.kind,)
+            status = "error" if event.error else "ok"
+            self._inc(self.requests, series + (status,))
+            self.latency.setdefault(series, Histogram()).observe(event.latency)
+            if event.ttft is not None:
+                self.ttft.setdefault(base, Histogram()).observe(event.ttft)
+            if event.error:
+                self._inc(self.errors, base + (event.error,))
+            if event.prompt_tokens:
+                self._inc(self.tokens, base + ("prompt",), event.prompt_tokens)
+            if event.completion_tokens:
+                self._inc(self.tokens, base + ("completion",), event.completion_tokens)
+            if event.cache_hit:
+                self._inc(self.cache_hits, base)
+            if event.coalesced:
+                self._inc(self.coalesced, base)
+    
+    def snapshot(self) -> List[Dict]:
+        """
+        按 提供商/模型/类型 汇总
+        返回: [{"provider": "openai", "model": "gpt-4o-mini", "kind": "chat", "requests": 10,
+                "errors": 1, "p50": 1.2, "p95": 3.4, ...}, ...]
+        """
+        rows = []
+        with self._lock:
+            for (provider, model, kind), hist in self.latency.items():
+                base = (provider, model)
+                ttft = self.ttft.get(base) if kind == "stream" else None
+                rows.append({
+                    "provider": provider,
+                    "model": model,
+                    "kind": kind,
+                    "requests": hist.count,
+                    "errors": self.requests.get((provider, model, kind, "error"), 0),
+                    "avg": hist.total / hist.count if hist.count else None,
+                    "p50": hist.percentile(0.5),
+                    "p95": hist.percentile(0.95),
+                    "p99": hist.percentile(0.99),
+                    "ttft_p50": ttft.percentile(0.5) if ttft else None,
+                    "prompt_tokens": self.tokens.get(base + ("prompt",), 0),
+                    "completion_tokens": self.tokens.get(base + ("completion",), 0),
+                    "cache_hits": self.cache_hits.get(base, 0),
+                    "coalesced": self.coalesced.get(base, 0),
+                })
+        return rows
+    
+    def error_counts(self) -> Dict[str, int]:
+        """按错误类型统计 {"openai/gpt-4o-mini HTTPStatusError": 3}"""
+        with self._lock:
+            items = list(self.errors.items()) + list(self.retries.items())
+        result = {}
+        for (provider, model, error), count in items:
+            name = f"{provider}/{model} {error}"
+            result[name] = result.get(name, 0) + count
+        return result
+    
+    def to_prometheus(self) -> str:
+        """导出为 Prometheus 文本格式"""
+        lines = []
+        with self._lock:
+            lines.append("# HELP llm_request_duration_seconds LLM request latency")
+            lines.append("# TYPE llm_request_duration_seconds histogram")
+            for (provider, model, kind), hist in self.latency.items():
+                self._histogram_lines(lines, "llm_request_duration_seconds", hist,
+                                      provider=provider, model=model, kind=kind)
+            
+            lines.append("# HELP llm_time_to_first_token_seconds Streaming time to first token")
+            lines.append("# TYPE llm_time_to_first_token_seconds histogram")
+            for (provider, model), hist in self.ttft.items():
+                self._histogram_lines(lines, "llm_time_to_first_token_seconds", hist,
+                                      provider=provider, model=model)
+            
+            lines.append("# HELP llm_requests_total LLM requests by status")
+            lines.append("# TYPE llm_requests_total counter")
+            for (provider, model, kind, status), count in self.requests.items():
+                lines.append(f"llm_requests_total{_labels(provider=provider, model=model, kind=kind, status=status)} {count}")
+            
+            lines.append("# HELP llm_errors_total LLM errors by exception class")
+            lines.append("# TYPE llm_errors_total counter")
+            for (provider, model, error), count in self.errors.items():
+                lines.append(f"llm_errors_total{_labels(provider=provider, model=model, error=error)} {count}")
+            
+            lines.append("# HELP llm_retries_total LLM retries by reason")
+            lines.append("# TYPE llm_retries_total counter")
+            for (provider, model, reason), count in self.retries.items():
+                lines.append(f"llm_retries_total{_labels(provider=provider, model=model, reason=reason)} {count}")
+            
+            lines.append("# HELP llm_tokens_total Tokens reported by the provider usage field")
+            lines.append("# TYPE llm_tokens_total counter")
+            for (provider, model, token_type), count in self.tokens.items():
+                lines.append(f"llm_tokens_total{_labels(provider=provider, model=model, type=token_type)} {count}")
+            
+            lines.append("# HELP llm_cache_hits_total Responses served from the local cache")
+            lines.append("# TYPE llm_cache_hits_total counter")
+            for (provider, model), count in self.cache_hits.items():
+                lines.append(f"llm_cache_hits_total{_labels(provider=provider, model=model)} {count}")
+            
+            lines.append("# HELP llm_coalesced_total Requests served by an identical in-flight call")
+            lines.append("# TYPE llm_coalesced_total counter")
+            for (provider, model), count in self.coalesced.items():
+                lines.append(f"llm_coalesced_total{_labels(provider=provider, model=model)} {count}")
+        return "\n".join(lines) + "\n"
+    
+    @staticmethod
+    def _histogram_lines(lines: List[str], name: str, hist: Histogram, **labels):
+        for bound, count in zip(hist.buckets, hist.counts):
+            lines.append(f"{name}_bucket{_labels(**labels, le=bound)} {count}")
+        lines.append(f"{name}_bucket{_labels(**labels, le='+Inf')} {hist.count}")
+        lines.append(f"{name}_sum{_labels(**labels)} {hist.total}")
+        lines.append(f"{name}_count{_labels(**labels)} {hist.count}")
+
+
+# ===== 钩子 =====
+
+_hooks: List[Callable[[LLMCallEvent], None]] = []
+_hooks_lock = threading.Lock()
+
+# 全局指标（默认钩子）
+metrics = LLMMetrics()
+
+
+def add_hook(hook: Callable[[LLMCallEvent], None]):
+    """注册调用钩子，每次调用结束后以 LLMCallEvent 为参数调用"""
+    with _hooks_lock:
+        if hook not in _hooks:
+            _hooks.append(hook)
+
+
+def remove_hook(hook: Callable[[LLMCallEvent], None]):
+    """移除调用钩子"""
+    with _hooks_lock:
+        if hook in _hooks:
+            _hooks.remove(hook)
+
+
+def emit(event: LLMCallEvent):
+    """分发调用记录；钩子出错不影响调用本身"""
+    with _hooks_lock:
+        hooks = list(_hooks)
+    for hook in hooks:
+        try:
+            hook(event)
+        except Exception:
+            pass
+
+
+add_hook(metrics)
+
+
+def get_metrics() -> LLMMetrics:
+    """获取全局指标"""
+    return metrics
+
+
+# ===== Prometheus HTTP 导出 =====
+
+_server: Optional[ThreadingHTTPServer] = None
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = metrics.to_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def log_message(self, format, *args):
+        pass
+
+
+def start_metrics_server(port: int = 9108, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """在后台线程启动 /metrics 端点（重复调用返回同一个服务）"""
+    global _server
+    if _server is None:
+        _server = ThreadingHTTPServer((host, port), _MetricsHandler)
+        threading.Thread(target=_server.serve_forever, daemon=True).start()
+    return _server
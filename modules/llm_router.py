@@ -0,0 +1,352 @@
+"""
+多提供商路由 - 失败自动切换与对冲请求
+"""
+import asyncio
+import json
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Optional, Generator, Dict, List, Union
+
+from .llm_client import LLMClient, get_llm
+from .sse import StreamStats
+from . import prompt_batch
+
+
+class LLMRouter:
+    """
+    在多个 LLMClient 之间路由请求
+    - 失败切换：当前提供商超时/报错时依次尝试下一个
+    - 对冲请求：首个提供商超过延迟阈值仍未返回时，向下一个提供商发送同样的请求，取先返回者
+    接口与 LLMClient 保持一致，可直接替换使用
+    """
+    
+    def __init__(self,
+                 clients: List[LLMClient],
+                 hedge: bool = False,
+                 hedge_after: Optional[float] = None,
+                 hedge_percentile: float = 0.95,
+                 min_samples: int = 20):
+        """
+        clients: 按优先级排列的客户端
+        hedge: 是否启用对冲请求
+        hedge_after: 固定的对冲阈值（秒），None 表示按历史延迟的P95自动计算
+        min_samples: 自动计算阈值所需的最少样本数，样本不足时不对冲
+        """
+        if not clients:
+            raise ValueError("没有可用的大模型提供商")
+        self.clients = clients
+        self.hedge = hedge and len(clients) > 1
+        self.hedge_after = hedge_after
+        self.hedge_percentile = hedge_percentile
+        self.min_samples = min_samples
+        
+        self._latencies: Dict[str, deque] = {}
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+    
+    @classmethod
+    def from_configs(cls,
+                     configs: List[Dict],
+                     hedge: bool = False,
+                     hedge_after: Optional[float] = None,
+                     max_retries: int = 1) -> 'LLMRouter':
+        """
+        从多个LLM配置创建路由
+        max_retries: 每个提供商内部的重试次数（调小以便尽快切换）
+        """
+        clients = [get_llm(dict(c, max_retries=max_retries)) for c in configs]
+        return cls(clients, hedge=hedge, hedge_after=hedge_after)
+    
+    # 兼容 LLMClient 的常用属性
+    @property
+    def provider(self) -> str:
+        return self.clients[0].provider
+    
+    @property
+    def model(self) -> str:
+        return self.clients[0].model
+    
+    def _name(self, client: LLMClient) -> str:
+        return f"{client.provider}:{client.model}"
+    
+    def _record(self, client: LLMClient, latency: float):
+        with self._lock:
+            history = self._latencies.setdefault(self._name(client), deque(maxlen=200))
+            history.append(latency)
+    
+    def _hedge_delay(self, client: LLMClient) -> Optional[float]:
+        """计算对冲阈值；样本不足时返回None"""
+        if self.hedge_after:
+            return self.hedge_after
+        with self._lock:
+            history = sorted(self._latencies.get(self._name(client), ()))
+        if len(history) < self.min_samples:
+            return None
+        index = min(len(history) - 1, int(len(history) * self.hedge_percentile))
+        return history[index]
+    
+    def latency_stats(self) -> Dict[str, Dict]:
+        """各提供商的延迟统计 {name: {"count": n, "p50": x, "p95": y}}"""
+        stats = {}
+        with self._lock:
+            items = [(name, sorted(history)) for name, history in self._latencies.items()]
+        for name, history in items:
+            if history:
+                stats[name] = {
+                    "count": len(history),
+                    "p50": history[len(history) // 2],
+                    "p95": history[min(len(history) - 1, int(len(history) * 0.95))]
+                }
+        return stats
+    
+    def _timed_chat(self, client: LLMClient, messages: list, temperature: float,
+                    max_tokens: int, use_cache: Optional[bool]) -> str:
+        start = time.monotonic()
+        result = client.chat(messages, temperature, max_tokens, use_cache)
+        self._record(client, time.monotonic() - start)
+        return result
+    
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="llm-hedge")
+            return self._executor
+    
+    def _hedged_chat(self, primary: LLMClient, backup: LLMClient, delay: float,
+                     *args) -> str:
+        """
+        先向 primary 发送请求，超过 delay 秒未返回再向 backup 发送，取先成功者
+        注意：同步请求无法中途取消，落后的请求会在后台完成（仍会计费）
+        """
+        executor = self._get_executor()
+        futures = [executor.submit(self._timed_chat, primary, *args)]
+        done, _ = wait(futures, timeout=delay)
+        # 超时未返回或已失败，都转向备用提供商
+        if not done or futures[0].exception() is not None:
+            futures.append(executor.submit(self._timed_chat, backup, *args))
+        
+        pending = set(futures)
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    return future.result()
+                error = future.exception()
+        raise error
+    
+    def chat(self,
+             messages: list,
+             temperature: float = 0.7,
+             max_tokens: int = 4096,
+             use_cache: Optional[bool] = None) -> str:
+        """同步聊天（失败自动切换，可选对冲）"""
+        error = None
+        i = 0
+        while i < len(self.clients):
+            client = self.clients[i]
+            delay = self._hedge_delay(client) if self.hedge else None
+            hedged = delay is not None and i + 1 < len(self.clients)
+            try:
+                if hedged:
+                    return self._hedged_chat(client, self.clients[i + 1], delay,
+                                             messages, temperature, max_tokens, use_cache)
+                return self._timed_chat(client, messages, temperature, max_tokens, use_cache)
+            except Exception as e:
+                error = e
+            # 对冲失败说明两个提供商都已尝试过
+            i += 2 if hedged else 1
+        raise error
+    
+    def chat_stream(self,
+                    messages: list,
+                    temperature: float = 0.7,
+                    stats: Optional[StreamStats] = None) -> Generator[str, None, None]:
+        """流式聊天（仅在输出首个片段前切换提供商）"""
+        error = None
+        for client in self.clients:
+            started = False
+            try:
+                for piece in client.chat_stream(messages, temperature, stats):
+                    started = True
+                    yield piece
+                return
+            except Exception as e:
+                if started:
+                    raise
+                error = e
+        raise error
+    
+    def simple_chat(self,
+                    prompt: str,
+                    system: str = "你是一个有帮助的助手。",
+                    temperature: float = 0.7,
+                    use_cache: Optional[bool] = None) -> str:
+        """简单聊天接口"""
+        messages = [
+            {"role": "system", "content": system},
+            {"role": "user", "content": prompt}
+        ]
+        return self.chat(messages, temperature, use_cache=use_cache)
+    
+    # ===== 异步接口 =====
+    
+    async def _atimed_chat(self, client: LLMClient, messages: list, temperature: float,
+                           max_tokens: int, use_cache: Optional[bool]) -> str:
+        start = time.monotonic()
+        result = await client.achat(messages, temperature, max_tokens, use_cache)
+        self._record(client, time.monotonic() - start)
+        return result
+    
+    async def _ahedged_chat(self, primary: LLMClient, backup: LLMClient, delay: float,
+                            *args) -> str:
+        """异步对冲请求，先成功者返回，另一个请求会被取消"""
+        tasks = [asyncio.ensure_future(self._atimed_chat(primary, *args))]
+        done, _ = await asyncio.wait(tasks, timeout=delay)
+        if not done or tasks[0].exception() is not None:
+            tasks.append(asyncio.ensure_future(self._atimed_chat(backup, *args)))
+        
+        pending = set(tasks)
+        error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+    
+    async def achat(self,
+                    messages: list,
+                    temperature: float = 0.7,
+                    max_tokens: int = 4096,
+                    use_cache: Optional[bool] = None) -> str:
+        """异步聊天（失败自动切换，可选对冲）"""
+        error = None
+        i = 0
+        while i < len(self.clients):
+            client = self.clients[i]
+            delay = self._hedge_delay(client) if self.hedge else None
+            hedged = delay is not None and i + 1 < len(self.clients)
+            try:
+                if hedged:
+                    return await self._ahedged_chat(client, self.clients[i + 1], delay,
+                                                    messages, temperature, max_tokens, use_cache)
+                return await self._atimed_chat(client, messages, temperature, max_tokens, use_cache)
+            except Exception as e:
+                error = e
+            i += 2 if hedged else 1
+        raise error
+    
+    async def asimple_chat(self,
+                           prompt: str,
+                           system: str = "你是一个有帮助的助手。",
+                           temperature: float = 0.7,
+                           use_cache: Optional[bool] = None) -> str:
+        """异步简单聊天接口"""
+        messages = [
+            {"role": "system", "content": system},
+            {"role": "user", "content": prompt}
+        ]
+        return await self.achat(messages, temperature, use_cache=use_cache)
+    
+    async def gather_chat(self,
+                          prompts: List[Union[str, list]],
+                          concurrency: int = 8,
+                          system: str = "你是一个有帮助的助手。",
+                          temperature: float = 0.7,
+                          max_tokens: int = 4096,
+                          use_cache: Optional[bool] = None,
+                          return_exceptions: bool = False) -> List[Union[str, BaseException]]:
+        """并发执行多个请求，结果与输入顺序一致"""
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+        
+        async def run_one(prompt):
+            if isinstance(prompt, str):
+                messages = [
+                    {"role": "system", "content": system},
+                    {"role": "user", "content": prompt}
+                ]
+            else:
+                messages = prompt
+            async with semaphore:
+                return await self.achat(messages, temperature, max_tokens, use_cache)
+        
+        return await asyncio.gather(
+            *(run_one(p) for p in prompts),
+            return_exceptions=return_exceptions
+        )
+    
+    def batch_chat(self,
+                   prompts: List[str],
+                   instruction: str = "",
+                   system: str = "你是一个有帮助的助手。",
+                   temperature: float = 0.3,
+                   max_tokens: int = 4096,
+                   max_items: int = 20,
+                   max_batch_tokens: int = 1500,
+                   use_cache: Optional[bool] = None,
+                   return_exceptions: bool = False) -> List[Union[str, BaseException]]:
+        """批量处理简短的独立提示词（见 LLMClient.batch_chat）"""
+        return prompt_batch.batch_chat(self, prompts, instruction, system, temperature,
+                                       max_tokens, max_items, max_batch_tokens, use_cache,
+                                       return_exceptions)
+    
+    async def abatch_chat(self,
+                          prompts: List[str],
+                          instruction: str = "",
+                          system: str = "你是一个有帮助的助手。",
+                          temperature: float = 0.3,
+                          max_tokens: int = 4096,
+                          max_items: int = 20,
+                          max_batch_tokens: int = 1500,
+                          use_cache: Optional[bool] = None,
+                          concurrency: int = 4,
+                          return_exceptions: bool = False) -> List[Union[str, BaseException]]:
+        """异步批量处理"""
+        return await prompt_batch.abatch_chat(self, prompts, instruction, system, temperature,
+                                              max_tokens, max_items, max_batch_tokens, use_cache,
+                                              concurrency, return_exceptions)
+    
+    async def aclose(self):
+        """关闭各客户端在当前事件循环上的异步连接池"""
+        for client in self.clients:
+            await client.aclose()
+    
+    def close(self):
+        """关闭后台线程池"""
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+                self._executor = None
+
+
+# 按配置共享的路由
+_shared_routers: Dict[str, LLMRouter] = {}
+_shared_lock = threading.Lock()
+
+
+def get_router(configs: Optional[List[Dict]] = None,
+               hedge: bool = False,
+               hedge_after: Optional[float] = None) -> LLMRouter:
+    """
+    获取共享的多提供商路由
+    configs: 多个LLM配置，默认读取 get_config().get_all_llm_configs()
+    """
+    if configs is None:
+        from .config_manager import get_config
+        configs = get_config().get_all_llm_configs()
+    
+    key = json.dumps([configs, hedge, hedge_after], sort_keys=True)
+    with _shared_lock:
+        router = _shared_routers.get(key)
+        if router is None:
+            router = LLMRouter.from_configs(configs, hedge=hedge, hedge_after=hedge_after)
+            _shared_routers[key] = router
+    return router
@@ -0,0 +1,28 @@
+"""
+PDF并行提取的子进程函数
+只依赖 PyMuPDF；进程池长期复用，子进程导入本模块（及所在包）的开销只在启动时付出一次
+"""
+from pathlib import Path
+from typing import List, Dict
+
+import fitz  # PyMuPDF
+
+
+def extract_pdf_range(file_path: str, start: int, end: int) -> List[Dict]:
+    """提取PDF第 start 到 end-1 页（从0开始）的文本，跳过空白页；每个子进程独立打开文件"""
+    results = []
+    doc = fitz.open(file_path)
+    filename = Path(file_path).name
+    try:
+        for page_index in range(start, min(end, len(doc))):
+            text = doc[page_index].get_text()
+            if text.strip():
+                results.append({
+                    "page": page_index + 1,
+                    "content": text,
+                    "file": filename,
+                    "file_path": file_path
+                })
+    finally:
+        doc.close()
+    return results
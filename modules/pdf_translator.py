@@ -0,0 +1,174 @@
+"""
+PDF翻译模块 - 保留版面的PDF到PDF翻译
+"""
+import re
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import List, Dict, Optional
+
+import fitz  # PyMuPDF
+
+from .translator import DocumentTranslator
+
+
+logger = logging.getLogger(__name__)
+
+# 只含数字、标点的文本块（页码、编号等）不翻译
+_NO_WORDS = re.compile(r'^[\W\d_]*$')
+# 以中日韩字符结尾的行与下一行直接相连，其他语言用空格连接
+_CJK_END = re.compile(r'[\u3000-\u30ff\u3400-\u9fff\uac00-\ud7af\uff00-\uffef]$')
+
+
+class PDFTranslator:
+    """
+    保留版面的PDF翻译器
+    按文本块翻译，把译文写回原位置（原文被遮盖删除），图片和线条保持不变
+    - 多页同时翻译（线程池），PyMuPDF 的读写只在调用线程中进行
+    - 同时在途的页数有上限，页面不渲染成图片，数百页的文档内存占用也较小
+    - 译文字体在整个文档中只嵌入一次，保存时只保留用到的字形
+    """
+    
+    FONT_NAME = "trfont"
+    
+    def __init__(self,
+                 translator: Optional[DocumentTranslator] = None,
+                 max_workers: Optional[int] = None,
+                 window: Optional[int] = None,
+                 fontfile: Optional[str] = None,
+                 min_fontsize: float = 4):
+        """
+        translator: 文档翻译器（决定翻译后端、记忆库等），默认使用 Google 翻译
+        max_workers: 同时翻译的页数，默认使用 translator.max_workers
+        window: 同时在途的最多页数，默认 max_workers 的两倍
+        fontfile: 译文字体文件，默认使用 PyMuPDF 自带的 Droid Sans Fallback（含中日韩、拉丁、西里尔字母）
+        min_fontsize: 译文放不下时缩小字号的下限
+        """
+        self.translator = translator or DocumentTranslator()
+        self.max_workers = max(1, max_workers or self.translator.max_workers)
+        self.window = max(1, window or self.max_workers * 2)
+        self.min_fontsize = min_fontsize
+        self._font_buffer = Path(fontfile).read_bytes() if fontfile else fitz.Font("cjk").buffer
+        # 最近一次翻译失败的页 [{"page": 1, "error": "xxx"}]
+        self.last_failures: List[Dict] = []
+    
+    @staticmethod
+    def extract_blocks(page) -> List[Dict]:
+        """
+        提取页面中需要翻译的文本块
+        返回: [{"rect": Rect, "text": "...", "size": 11.0, "color": (0, 0, 0)}, ...]
+        """
+        blocks = []
+        for block in page.get_text("dict", flags=fitz.TEXTFLAGS_TEXT)["blocks"]:
+            if block.get("type") != 0:
+                continue
+            lines = []
+            sizes = []
+            color = 0
+            for line in block["lines"]:
+                line_text = "".join(span["text"] for span in line["spans"]).strip()
+                if line_text:
+                    lines.append(line_text)
+                for span in line["spans"]:
+                    if span["text"].strip():
+                        sizes.append(span["size"])
+                        color = span["color"]
+            text = ""
+            for line_text in lines:
+                if text and not _CJK_END.search(text):
+                    text += " "
+                text += line_text
+            if not text or _NO_WORDS.match(text):
+                continue
+            blocks.append({
+                "rect": fitz.Rect(block["bbox"]),
+                "text": text,
+                "size": max(sizes) if sizes else 11,
+                "color": fitz.sRGB_to_pdf(color)
+            })
+        return blocks
+    
+    def translate(self,
+                  pdf_path: str,
+                  output_path: Optional[str] = None,
+                  target_lang: str = "中文",
+                  source_lang: str = "auto",
+                  progress_callback=None) -> str:
+        """
+        翻译PDF并保存为新文件，返回输出路径
+        progress_callback: 进度回调函数 callback(已完成页数, 总页数)
+        翻译失败的页保留原文，并记录在 self.last_failures 中
+        """
+        output = output_path or str(Path(pdf_path).with_name(f"{Path(pdf_path).stem}_translated.pdf"))
+        self.last_failures = []
+        doc = fitz.open(pdf_path)
+        total = len(doc)
+        executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        inflight = deque()
+        completed = 0
+        
+        try:
+            for page_index in range(total):
+                blocks = self.extract_blocks(doc[page_index])
+                future = executor.submit(self.translator.translate_batch,
+                                         [b["text"] for b in blocks], target_lang, source_lang) if blocks else None
+                inflight.append((page_index, blocks, future))
+                # 窗口已满时等待最早的页；最早的页已完成时立即写回
+                while inflight and (len(inflight) >= self.window
+                                    or inflight[0][2] is None or inflight[0][2].done()):
+                    self._write_page(doc, *inflight.popleft())
+                    completed += 1
+                    if progress_callback:
+                        progress_callback(completed, total)
+            while inflight:
+                self._write_page(doc, *inflight.popleft())
+                completed += 1
+                if progress_callback:
+                    progress_callback(completed, total)
+            
+            try:
+                # 只保留用到的字形（MuPDF 自带的子集化）；失败时保存完整字体，不影响译文
+                doc.subset_fonts()
+            except fitz.mupdf.FzErrorBase as e:
+                logger.warning("字体子集化失败，保存完整字体: %s", e)
+            doc.save(output, garbage=3, deflate=True)
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+            doc.close()
+        return output
+    
+    def _write_page(self, doc, page_index: int, blocks: List[Dict], future):
+        """等待一页的译文，删除原文并在原位置写入译文"""
+        if future is None:
+            return
+        try:
+            translations = future.result()
+        except Exception as e:
+            self.last_failures.append({"page": page_index + 1, "error": str(e)})
+            return
+        
+        page = doc[page_index]
+        for block in blocks:
+            page.add_redact_annot(block["rect"])
+        page.apply_redactions(images=fitz.PDF_REDACT_IMAGE_NONE,
+                              graphics=fitz.PDF_REDACT_LINE_ART_NONE)
+        # 同一字体数据在文档中只嵌入一次，其他页引用同一个对象
+        page.insert_font(fontname=self.FONT_NAME, fontbuffer=self._font_buffer)
+        for block, translated in zip(blocks, translations):
+            self._insert_text(page, block, translated or block["text"])
+    
+    def _insert_text(self, page, block: Dict, text: str):
+        """在文本块原位置写入译文，放不下时逐步缩小字号，仍放不下则向下延伸文本框"""
+        rect = block["rect"]
+        fontsize = block["size"]
+        while True:
+            rc = page.insert_textbox(rect, text, fontname=self.FONT_NAME, fontsize=fontsize,
+                                     color=block["color"])
+            if rc >= 0:
+                return
+            if fontsize <= self.min_fontsize:
+                break
+            fontsize = max(self.min_fontsize, fontsize * 0.9)
+        rect = fitz.Rect(rect.x0, rect.y0, rect.x1, page.rect.y1)
+        page.insert_textbox(rect, text, fontname=self.FONT_NAME, fontsize=fontsize, color=block["color"])
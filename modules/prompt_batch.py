@@ -0,0 +1,181 @@
+"""
+批量提示词打包 - 把多个简短的独立任务合并为一次请求
+"""
+import asyncio
+import json
+import re
+from typing import Optional, List, Union
+
+from .token_budget import count_tokens
+
+
+# 批量请求附加在调用方系统提示词之后的说明
+BATCH_SYSTEM = "你会收到多个相互独立的任务，请逐个完成，并严格按要求的JSON格式输出。"
+
+_FENCE_PATTERN = re.compile(r"^```(?:json)?\s*|\s*```$")
+
+
+def pack_prompts(prompts: List[str],
+                 model: Optional[str] = None,
+                 max_items: int = 20,
+                 max_tokens: int = 1500) -> List[List[int]]:
+    """
+    按条数和token数把提示词分组，返回每组的下标列表（保持原顺序）
+    单条超过 max_tokens 的提示词单独成组
+    """
+    groups: List[List[int]] = []
+    current: List[int] = []
+    current_tokens = 0
+    for i, prompt in enumerate(prompts):
+        tokens = count_tokens(prompt, model) + 8
+        if current and (len(current) >= max_items or current_tokens + tokens > max_tokens):
+            groups.append(current)
+            current, current_tokens = [], 0
+        current.append(i)
+        current_tokens += tokens
+    if current:
+        groups.append(current)
+    return groups
+
+
+def build_batch_prompt(items: List[str], instruction: str = "") -> str:
+    """生成批量请求的提示词，每个任务带有编号"""
+    tasks = json.dumps([{"id": i, "input": text} for i, text in enumerate(items)],
+                       ensure_ascii=False, indent=1)
+    requirement = f"对每个任务的要求：{instruction}\n\n" if instruction else ""
+    return f"""{requirement}下面是 {len(items)} 个相互独立的任务（JSON数组，id 为任务编号）：
+{tasks}
+
+请逐个完成，只输出一个JSON对象，不要输出其他内容：
+{{"results": [{{"id": 任务编号, "output": "该任务的结果"}}, ...]}}"""
+
+
+def parse_batch_response(response: str, count: int) -> List[Optional[str]]:
+    """
+    解析批量响应，返回与任务一一对应的结果
+    无法解析或缺失的任务为 None
+    """
+    results: List[Optional[str]] = [None] * count
+    text = _FENCE_PATTERN.sub("", (response or "").strip())
+    start, end = text.find("{"), text.rfind("}")
+    if start < 0 or end <= start:
+        return results
+    try:
+        data = json.loads(text[start:end + 1])
+    except ValueError:
+        return results
+    
+    items = data.get("results") if isinstance(data, dict) else None
+    if not isinstance(items, list):
+        return results
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        index, output = item.get("id"), item.get("output")
+        if isinstance(index, str) and index.isdigit():
+            index = int(index)
+        if isinstance(index, int) and 0 <= index < count and isinstance(output, str):
+            results[index] = output
+    return results
+
+
+def _single_messages(prompt: str, instruction: str, system: str) -> list:
+    content = f"{instruction}\n\n{prompt}" if instruction else prompt
+    return [
+        {"role": "system", "content": system},
+        {"role": "user", "content": content}
+    ]
+
+
+def _batch_messages(items: List[str], instruction: str, system: str) -> list:
+    return [
+        {"role": "system", "content": f"{system}\n{BATCH_SYSTEM}" if system else BATCH_SYSTEM},
+        {"role": "user", "content": build_batch_prompt(items, instruction)}
+    ]
+
+
+def batch_chat(llm_client,
+               prompts: List[str],
+               instruction: str = "",
+               system: str = "你是一个有帮助的助手。",
+               temperature: float = 0.3,
+               max_tokens: int = 4096,
+               max_items: int = 20,
+               max_batch_tokens: int = 1500,
+               use_cache: Optional[bool] = None,
+               return_exceptions: bool = False) -> List[Union[str, BaseException]]:
+    """
+    批量聊天：把多个简短的独立提示词打包成少量请求，结果与输入顺序一致
+    llm_client: LLMClient 或 LLMRouter
+    instruction: 所有任务共同的要求（如 "翻译成中文"）
+    解析失败或缺失的条目会单独重新请求
+    system: 系统提示词，批量请求时在其后附加 BATCH_SYSTEM 的格式说明
+    return_exceptions: 为True时单独请求仍失败的条目返回异常对象，其余条目的结果照常返回
+    """
+    model = getattr(llm_client, "model", None)
+    results: List[Optional[str]] = [None] * len(prompts)
+    
+    for group in pack_prompts(prompts, model, max_items, max_batch_tokens):
+        if len(group) > 1:
+            try:
+                response = llm_client.chat(_batch_messages([prompts[i] for i in group], instruction, system),
+                                           temperature, max_tokens, use_cache)
+                for i, output in zip(group, parse_batch_response(response, len(group))):
+                    results[i] = output
+            except Exception:
+                # 整批失败时逐条重试
+                pass
+        for i in group:
+            if results[i] is not None:
+                continue
+            try:
+                results[i] = llm_client.chat(_single_messages(prompts[i], instruction, system),
+                                             temperature, max_tokens, use_cache)
+            except Exception as e:
+                if not return_exceptions:
+                    raise
+                results[i] = e
+    return results
+
+
+async def abatch_chat(llm_client,
+                      prompts: List[str],
+                      instruction: str = "",
+                      system: str = "你是一个有帮助的助手。",
+                      temperature: float = 0.3,
+                      max_tokens: int = 4096,
+                      max_items: int = 20,
+                      max_batch_tokens: int = 1500,
+                      use_cache: Optional[bool] = None,
+                      concurrency: int = 4,
+                      return_exceptions: bool = False) -> List[Union[str, BaseException]]:
+    """异步版本的 batch_chat，各批次并发执行（批量请求和逐条重试共用 concurrency 个并发名额）"""
+    model = getattr(llm_client, "model", None)
+    results: List[Optional[str]] = [None] * len(prompts)
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    
+    async def run_group(group: List[int]):
+        async with semaphore:
+            if len(group) > 1:
+                try:
+                    response = await llm_client.achat(
+                        _batch_messages([prompts[i] for i in group], instruction, system),
+                        temperature, max_tokens, use_cache)
+                    for i, output in zip(group, parse_batch_response(response, len(group))):
+                        results[i] = output
+                except Exception:
+                    pass
+        await asyncio.gather(*(run_single(i) for i in group if results[i] is None))
+    
+    async def run_single(i: int):
+        async with semaphore:
+            try:
+                results[i] = await llm_client.achat(_single_messages(prompts[i], instruction, system),
+                                                    temperature, max_tokens, use_cache)
+            except Exception as e:
+                if not return_exceptions:
+                    raise
+                results[i] = e
+    
+    await asyncio.gather(*(run_group(g) for g in pack_prompts(prompts, model, max_items, max_batch_tokens)))
+    return results
@@ -0,0 +1,216 @@
+"""
+限流与重试模块 - 令牌桶限流、指数退避重试、自适应并发
+"""
+import asyncio
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Optional, Dict
+
+import httpx
+
+from .token_budget import count_message_tokens
+
+
+# 可重试的HTTP状态码（超时、限流 + 服务端错误；409 冲突重试也不会成功）
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """令牌桶（按分钟配额匀速补充，线程安全）"""
+    
+    def __init__(self, per_minute: float, capacity: Optional[float] = None):
+        """
+        per_minute: 每分钟补充的令牌数，<=0 表示不限制
+        capacity: 桶容量（允许的突发量），默认等于每分钟配额
+        """
+        self.per_minute = per_minute
+        self.rate = per_minute / 60.0
+        self.capacity = capacity or per_minute
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+    
+    @property
+    def unlimited(self) -> bool:
+        return self.per_minute <= 0
+    
+    def _reserve(self, amount: float) -> float:
+        """预扣令牌，返回需要等待的秒数"""
+        if self.unlimited:
+            return 0.0
+        # 超过桶容量的请求按容量计算，避免永远等不到
+        amount = min(amount, self.capacity)
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= amount
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+    
+    def acquire(self, amount: float = 1):
+        """获取令牌（阻塞等待）"""
+        wait = self._reserve(amount)
+        if wait > 0:
+            time.sleep(wait)
+    
+    async def aacquire(self, amount: float = 1):
+        """获取令牌（异步等待）"""
+        wait = self._reserve(amount)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+class ProviderRateLimiter:
+    """单个提供商的限流器（请求数/分钟 + tokens/分钟）"""
+    
+    def __init__(self, rpm: float = 0, tpm: float = 0):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+    
+    def acquire(self, tokens: int = 0):
+        self.requests.acquire(1)
+        if tokens:
+            self.tokens.acquire(tokens)
+    
+    async def aacquire(self, tokens: int = 0):
+        await self.requests.aacquire(1)
+        if tokens:
+            await self.tokens.aacquire(tokens)
+
+
+class AdaptiveConcurrency:
+    """
+    自适应并发控制（AIMD）
+    遇到429时并发上限减半，连续成功后逐步加一
+    """
+    
+    def __init__(self, initial: int = 4, minimum: int = 1, maximum: int = 16,
+                 increase_after: int = 10):
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.limit = min(max(initial, self.minimum), self.maximum)
+        self.increase_after = increase_after
+        self._in_flight = 0
+        self._successes = 0
+        self._cond = threading.Condition()
+    
+    def _try_enter(self) -> bool:
+        with self._cond:
+            if self._in_flight < self.limit:
+                self._in_flight += 1
+                return True
+            return False
+    
+    def acquire(self):
+        with self._cond:
+            while self._in_flight >= self.limit:
+                self._cond.wait()
+            self._in_flight += 1
+    
+    async def aacquire(self):
+        # 异步调用方可能分布在多个事件循环/线程中，这里用轮询等待
+        while not self._try_enter():
+            await asyncio.sleep(0.05)
+    
+    def release(self):
+        with self._cond:
+            self._in_flight -= 1
+            self._cond.notify()
+    
+    def on_success(self):
+        with self._cond:
+            self._successes += 1
+            if self._successes >= self.increase_after and self.limit < self.maximum:
+                self.limit += 1
+                self._successes = 0
+                self._cond.notify()
+    
+    def on_throttle(self):
+        with self._cond:
+            self.limit = max(self.minimum, self.limit // 2)
+            self._successes = 0
+    
+    def __enter__(self):
+        self.acquire()
+        return self
+    
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.release()
+
+
+class RetryPolicy:
+    """指数退避重试策略（带随机抖动，优先遵循 Retry-After）"""
+    
+    def __init__(self, max_retries: int = 5, base_delay: float = 1.0, max_delay: float = 60.0):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+    
+    @staticmethod
+    def is_retryable(error: Exception) -> bool:
+        """判断错误是否值得重试"""
+        if isinstance(error, httpx.HTTPStatusError):
+            return error.response.status_code in RETRYABLE_STATUS
+        return isinstance(error, httpx.TransportError)
+    
+    @staticmethod
+    def is_throttled(error: Exception) -> bool:
+        return isinstance(error, httpx.HTTPStatusError) and error.response.status_code == 429
+    
+    @staticmethod
+    def retry_after(error: Exception) -> Optional[float]:
+        """解析 Retry-After 响应头（秒数或HTTP日期）"""
+        if not isinstance(error, httpx.HTTPStatusError):
+            return None
+        value = error.response.headers.get("retry-after")
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+    
+    def get_delay(self, attempt: int, error: Exception) -> float:
+        """第 attempt 次重试前的等待时间（attempt 从0开始）"""
+        retry_after = self.retry_after(error)
+        if retry_after is not None:
+            return min(retry_after, self.max_delay)
+        # Full jitter: 在 [0, base * 2^attempt] 内随机
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+
+def estimate_tokens(messages: list) -> int:
+    """粗略估算消息的token数（用于TPM限流，不指定模型，使用快速估算）"""
+    return count_message_tokens(messages)
+
+
+# 按提供商共享的限流器和并发控制（同一提供商的多个客户端共用配额）
+_limiters: Dict[str, ProviderRateLimiter] = {}
+_concurrency: Dict[str, AdaptiveConcurrency] = {}
+_registry_lock = threading.Lock()
+
+
+def get_rate_limiter(provider: str, rpm: float = 0, tpm: float = 0) -> ProviderRateLimiter:
+    """获取提供商共享的限流器"""
+    key = f"{provider}:{rpm}:{tpm}"
+    with _registry_lock:
+        if key not in _limiters:
+            _limiters[key] = ProviderRateLimiter(rpm, tpm)
+        return _limiters[key]
+
+
+def get_concurrency(provider: str, maximum: int = 16) -> AdaptiveConcurrency:
+    """获取提供商共享的自适应并发控制"""
+    key = f"{provider}:{maximum}"
+    with _registry_lock:
+        if key not in _concurrency:
+            _concurrency[key] = AdaptiveConcurrency(initial=maximum, maximum=maximum)
+        return _concurrency[key]
@@ -0,0 +1,210 @@
+"""
+请求合并模块 - 并发的相同请求只发送一次
+"""
+import asyncio
+import threading
+from typing import Callable, Dict, Iterator, AsyncIterator, Awaitable, Any
+
+
+class _Call:
+    """一次进行中的同步调用"""
+    
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class _StreamCall:
+    """一次进行中的流式调用，已收到的片段会重放给后加入的调用方"""
+    
+    def __init__(self):
+        self.pieces = []
+        self.done = False
+        self.error = None
+        self.cond = threading.Condition()
+
+
+class _AsyncStreamCall:
+    def __init__(self):
+        self.pieces = []
+        self.done = False
+        self.error = None
+        self.cond = asyncio.Condition()
+        self.task = None
+
+
+class SingleFlight:
+    """
+    相同请求合并（single-flight）
+    同一个 key 同时只有一次真实调用，其余调用方等待并共享同一结果；
+    流式调用的后加入者会从头重放已收到的片段
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[str, _Call] = {}
+        self._async_calls: Dict[tuple, asyncio.Future] = {}
+        self._streams: Dict[str, _StreamCall] = {}
+        self._async_streams: Dict[tuple, _AsyncStreamCall] = {}
+        self._stats = {"calls": 0, "shared": 0}
+    
+    def stats(self) -> Dict:
+        """{"calls": 真实调用次数, "shared": 合并掉的调用次数}"""
+        with self._lock:
+            return dict(self._stats)
+    
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        """执行 fn，若相同 key 的调用正在进行则等待其结果"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+                self._stats["calls"] += 1
+            else:
+                self._stats["shared"] += 1
+        
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.event.set()
+    
+    async def ado(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """异步版本的 do（只在同一个事件循环内合并）"""
+        loop = asyncio.get_running_loop()
+        loop_key = (id(loop), key)
+        with self._lock:
+            future = self._async_calls.get(loop_key)
+            leader = future is None
+            if leader:
+                future = loop.create_future()
+                self._async_calls[loop_key] = future
+                self._stats["calls"] += 1
+            else:
+                self._stats["shared"] += 1
+        
+        if not leader:
+            return await asyncio.shield(future)
+        
+        try:
+            result = await fn()
+            future.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # 没有其他等待者时避免 "exception was never retrieved" 警告
+            future.exception()
+            raise
+        finally:
+            with self._lock:
+                self._async_calls.pop(loop_key, None)
+    
+    def stream(self, key: str, fn: Callable[[], Iterator[Any]]) -> Iterator[Any]:
+        """
+        流式合并：上游在后台线程中读取，所有调用方（包括第一个）从共享缓冲区读取
+        即使调用方提前退出，上游也会读完，保证其他调用方拿到完整结果
+        """
+        with self._lock:
+            call = self._streams.get(key)
+            if call is None:
+                call = _StreamCall()
+                self._streams[key] = call
+                self._stats["calls"] += 1
+                threading.Thread(target=self._produce, args=(key, call, fn), daemon=True).start()
+            else:
+                self._stats["shared"] += 1
+        
+        index = 0
+        while True:
+            with call.cond:
+                while index >= len(call.pieces) and not call.done:
+                    call.cond.wait()
+                pieces = call.pieces[index:]
+                done = call.done
+                error = call.error
+            index += len(pieces)
+            yield from pieces
+            if done and not pieces:
+                if error is not None:
+                    raise error
+                return
+    
+    def _produce(self, key: str, call: _StreamCall, fn: Callable[[], Iterator[Any]]):
+        try:
+            for piece in fn():
+                with call.cond:
+                    call.pieces.append(piece)
+                    call.cond.notify_all()
+        except BaseException as e:
+            call.error = e
+        finally:
+            with self._lock:
+                if self._streams.get(key) is call:
+                    del self._streams[key]
+            with call.cond:
+                call.done = True
+                call.cond.notify_all()
+    
+    async def astream(self, key: str, fn: Callable[[], AsyncIterator[Any]]) -> AsyncIterator[Any]:
+        """异步流式合并（只在同一个事件循环内合并）"""
+        loop = asyncio.get_running_loop()
+        loop_key = (id(loop), key)
+        with self._lock:
+            call = self._async_streams.get(loop_key)
+            if call is None:
+                call = _AsyncStreamCall()
+                self._async_streams[loop_key] = call
+                self._stats["calls"] += 1
+                # 保存任务引用，避免被垃圾回收
+                call.task = loop.create_task(self._aproduce(loop_key, call, fn))
+            else:
+                self._stats["shared"] += 1
+        
+        index = 0
+        while True:
+            async with call.cond:
+                await call.cond.wait_for(lambda: index < len(call.pieces) or call.done)
+                pieces = call.pieces[index:]
+                done = call.done
+                error = call.error
+            index += len(pieces)
+            for piece in pieces:
+                yield piece
+            if done and not pieces:
+                if error is not None:
+                    raise error
+                return
+    
+    async def _aproduce(self, loop_key: tuple, call: _AsyncStreamCall,
+                        fn: Callable[[], AsyncIterator[Any]]):
+        try:
+            async for piece in fn():
+                async with call.cond:
+                    call.pieces.append(piece)
+                    call.cond.notify_all()
+        except BaseException as e:
+            call.error = e
+        finally:
+            with self._lock:
+                if self._async_streams.get(loop_key) is call:
+                    del self._async_streams[loop_key]
+            async with call.cond:
+                call.done = True
+                call.cond.notify_all()
@@ -0,0 +1,279 @@
+"""
+SSE流式解析模块 - 增量解析 Server-Sent Events
+"""
+import time
+from typing import Optional, Iterable, AsyncIterable, Iterator, AsyncIterator, List, Dict
+
+try:
+    import orjson
+    
+    def json_loads(data: str):
+        return orjson.loads(data)
+    
+    JSONDecodeError = orjson.JSONDecodeError
+except ImportError:
+    import json
+    
+    def json_loads(data: str):
+        return json.loads(data)
+    
+    JSONDecodeError = json.JSONDecodeError
+
+
+class LLMStreamError(Exception):
+    """流式响应中由提供商返回的错误，或无法解析的数据"""
+    
+    def __init__(self, message: str, payload: Optional[Dict] = None):
+        super().__init__(message)
+        self.payload = payload
+
+
+class SSEEvent:
+    """一个完整的SSE事件"""
+    
+    __slots__ = ("event", "data", "id", "retry")
+    
+    def __init__(self, event: str = "message", data: str = "",
+                 id: Optional[str] = None, retry: Optional[int] = None):
+        self.event = event
+        self.data = data
+        self.id = id
+        self.retry = retry
+    
+    def __repr__(self):
+        return f"SSEEvent(event={self.event!r}, data={self.data!r})"
+
+
+class SSEDecoder:
+    """
+    增量SSE解码器
+    - 支持任意位置切分的数据块、\\n / \\r\\n / \\r 换行
+    - 多行 data: 按规范用换行拼接
+    - 注释行（以 : 开头）和没有数据的保活事件会被忽略
+    """
+    
+    def __init__(self):
+        self._buffer = ""
+        self._skip_lf = False
+        self._reset()
+    
+    def _reset(self):
+        self._event = ""
+        self._data: List[str] = []
+        self._id: Optional[str] = None
+        self._retry: Optional[int] = None
+    
+    def feed(self, chunk: str) -> List[SSEEvent]:
+        """输入一段文本，返回其中已完整的事件"""
+        if not chunk:
+            return []
+        # 上一块以 \r 结尾时，本块开头的 \n 属于同一个 \r\n（只跳过这一个）
+        if self._skip_lf:
+            self._skip_lf = False
+            if chunk.startswith("\n"):
+                chunk = chunk[1:]
+                if not chunk:
+                    return []
+        self._skip_lf = chunk.endswith("\r")
+        
+        text = self._buffer + chunk
+        lines = text.replace("\r\n", "\n").replace("\r", "\n").split("\n")
+        self._buffer = lines.pop()
+        
+        events = []
+        for line in lines:
+            event = self._process_line(line)
+            if event is not None:
+                events.append(event)
+        return events
+    
+    def flush(self) -> List[SSEEvent]:
+        """流结束时处理残留数据"""
+        events = []
+        if self._buffer:
+            event = self._process_line(self._buffer)
+            self._buffer = ""
+            if event is not None:
+                events.append(event)
+        event = self._process_line("")
+        if event is not None:
+            events.append(event)
+        return events
+    
+    def _process_line(self, line: str) -> Optional[SSEEvent]:
+        if not line:
+            # 空行：分发事件（没有数据的事件按规范丢弃，例如保活ping）
+            data = "\n".join(self._data)
+            event = None
+            if data:
+                event = SSEEvent(self._event or "message", data, self._id, self._retry)
+            self._reset()
+            return event
+        
+        if line.startswith(":"):
+            return None
+        
+        field, sep, value = line.partition(":")
+        if sep and value.startswith(" "):
+            value = value[1:]
+        
+        if field == "data":
+            self._data.append(value)
+        elif field == "event":
+            self._event = value
+        elif field == "id":
+            self._id = value
+        elif field == "retry" and value.isdigit():
+            self._retry = int(value)
+        return None
+
+
+class StreamStats:
+    """流式响应统计：首token延迟、输出速度"""
+    
+    def __init__(self):
+        self.start = time.monotonic()
+        self.first_token_at: Optional[float] = None
+        self.end: Optional[float] = None
+        self.chunks = 0
+        self.completion_tokens: Optional[int] = None
+        self.usage: Optional[Dict] = None
+    
+    def on_token(self):
+        if self.first_token_at is None:
+            self.first_token_at = time.monotonic()
+        self.chunks += 1
+    
+    def finish(self):
+        if self.end is None:
+            self.end = time.monotonic()
+    
+    @property
+    def ttft(self) -> Optional[float]:
+        """首token延迟（秒）"""
+        if self.first_token_at is None:
+            return None
+        return self.first_token_at - self.start
+    
+    @property
+    def tokens(self) -> int:
+        """输出token数（优先使用提供商返回的usage，否则按片段数估算）"""
+        return self.completion_tokens if self.completion_tokens is not None else self.chunks
+    
+    @property
+    def tokens_per_sec(self) -> Optional[float]:
+        """首token之后的输出速度"""
+        if self.first_token_at is None:
+            return None
+        elapsed = (self.end or time.monotonic()) - self.first_token_at
+        return self.tokens / elapsed if elapsed > 0 else None
+    
+    def to_dict(self) -> Dict:
+        return {
+            "ttft": self.ttft,
+            "tokens": self.tokens,
+            "tokens_per_sec": self.tokens_per_sec,
+            "duration": (self.end or time.monotonic()) - self.start
+        }
+
+
+def _handle_event(event: SSEEvent, stats: Optional[StreamStats]) -> Optional[str]:
+    """解析一个chat.completions事件，返回文本片段（无内容时返回None）"""
+    if event.event == "error":
+        raise LLMStreamError(f"提供商返回错误: {event.data}")
+    
+    try:
+        chunk = json_loads(event.data)
+    except JSONDecodeError:
+        raise LLMStreamError(f"无法解析的流式数据: {event.data[:200]}")
+    
+    if not isinstance(chunk, dict):
+        raise LLMStreamError(f"无法解析的流式数据: {event.data[:200]}")
+    
+    if chunk.get("error"):
+        error = chunk["error"]
+        message = error.get("message", error) if isinstance(error, dict) else error
+        raise LLMStreamError(f"提供商返回错误: {message}", chunk)
+    
+    if chunk.get("usage") and stats is not None:
+        stats.usage = chunk["usage"]
+        stats.completion_tokens = chunk["usage"].get("completion_tokens")
+    
+    choices = chunk.get("choices") or []
+    if not choices:
+        return None
+    content = (choices[0].get("delta") or {}).get("content")
+    if content and stats is not None:
+        stats.on_token()
+    return content or None
+
+
+def iter_chat_deltas(chunks: Iterable[str],
+                     stats: Optional[StreamStats] = None) -> Iterator[str]:
+    """将原始文本流解析为 chat.completions 的内容片段"""
+    decoder = SSEDecoder()
+    try:
+        for chunk in chunks:
+            for event in decoder.feed(chunk):
+                if event.data == "[DONE]":
+                    return
+                content = _handle_event(event, stats)
+                if content:
+                    yield content
+        for event in decoder.flush():
+            if event.data == "[DONE]":
+                return
+            content = _handle_event(event, stats)
+            if content:
+                yield content
+    finally:
+        if stats is not None:
+            stats.finish()
+
+
+async def aiter_chat_deltas(chunks: AsyncIterable[str],
+                            stats: Optional[StreamStats] = None) -> AsyncIterator[str]:
+    """异步版本的 iter_chat_deltas"""
+    decoder = SSEDecoder()
+    try:
+        async for chunk in chunks:
+            for event in decoder.feed(chunk):
+                if event.data == "[DONE]":
+                    return
+                content = _handle_event(event, stats)
+                if content:
+                    yield content
+        for event in decoder.flush():
+            if event.data == "[DONE]":
+                return
+            content = _handle_event(event, stats)
+            if content:
+                yield content
+    finally:
+        if stats is not None:
+            stats.finish()
+
+
+def track_stream(pieces: Iterable[str], stats: Optional[StreamStats]) -> Iterator[str]:
+    """在消费端统计已解析的片段（用于合并后的共享流）"""
+    try:
+        for piece in pieces:
+            if stats is not None:
+                stats.on_token()
+            yield piece
+    finally:
+        if stats is not None:
+            stats.finish()
+
+
+async def atrack_stream(pieces: AsyncIterable[str],
+                        stats: Optional[StreamStats]) -> AsyncIterator[str]:
+    """异步版本的 track_stream"""
+    try:
+        async for piece in pieces:
+            if stats is not None:
+                stats.on_token()
+            yield piece
+    finally:
+        if stats is not None:
+            stats.finish()
@@ -0,0 +1,155 @@
+"""
+文本分段模块 - 按句子边界分块，同时满足字符数和token数限制
+"""
+import re
+from typing import Optional, List, Tuple
+
+from .token_budget import count_tokens
+
+
+# 句末标点（含中日文标点）及其后的引号/括号；单个换行也视为句子边界
+_SENTENCE_END = re.compile(
+    r'(?:[。！？；!?…]+|\.(?=\s|$))[”’"\'」』）)\]]*[ \t　]*|\n[ \t　]*'
+)
+# 超长句子的次级切分点：逗号、顿号、空白
+_SOFT_BREAK = re.compile(r'[，、,：:\s]')
+
+
+def split_sentences(text: str) -> List[Tuple[str, str]]:
+    """
+    把一段文本切分为句子
+    返回: [(句子, 句后空白), ...]，所有片段按顺序拼接即为原文
+    """
+    sentences = []
+    start = 0
+    for match in _SENTENCE_END.finditer(text):
+        end = match.end()
+        if end <= start:
+            continue
+        piece = text[start:end]
+        body = piece.rstrip()
+        sentences.append((body, piece[len(body):]))
+        start = end
+    if start < len(text):
+        piece = text[start:]
+        body = piece.rstrip()
+        sentences.append((body, piece[len(body):]))
+    return [(body, tail) for body, tail in sentences if body or tail]
+
+
+class TextSplitter:
+    """
+    句子感知的文本分块器
+    - 优先在段落边界切分，段落过长时在句子边界切分，句子过长时在逗号/空白处切分
+    - 尽量把每块装满到限制附近，减少请求次数
+    - 线性时间：只用列表收集片段，不做重复的字符串拼接
+    """
+    
+    def __init__(self,
+                 max_chars: int = 4000,
+                 max_tokens: Optional[int] = None,
+                 model: Optional[str] = None):
+        """
+        max_chars: 每块最大字符数（如 Google 翻译单次请求上限）
+        max_tokens: 每块最大token数（大模型后端），None 表示不限制
+        model: 计算token数使用的模型
+        """
+        self.max_chars = max(1, max_chars)
+        self.max_tokens = max_tokens
+        self.model = model
+    
+    def tokens(self, text: str) -> int:
+        return count_tokens(text, self.model) if self.max_tokens else 0
+    
+    def fits(self, chars: int, tokens: int = 0) -> bool:
+        return chars <= self.max_chars and (not self.max_tokens or tokens <= self.max_tokens)
+    
+    def split(self, text: str) -> List[str]:
+        """分块，返回各块文本"""
+        return self.split_with_separators(text)[0]
+    
+    def split_with_separators(self, text: str) -> Tuple[List[str], List[str]]:
+        """
+        分块，同时返回每块之前的分隔符（段落间为 "\\n\\n"，句子间为原有空白）
+        按顺序拼接 分隔符 + 分块 即为原文；第一个分隔符是文档开头的空白（通常为空）
+        """
+        chunks: List[str] = []
+        separators: List[str] = []
+        buffer: List[str] = []
+        buffer_sep = ""
+        chars = tokens = 0
+        
+        def flush():
+            nonlocal buffer, chars, tokens
+            if buffer:
+                chunks.append("".join(buffer))
+                separators.append(buffer_sep)
+                buffer, chars, tokens = [], 0, 0
+        
+        for sep, piece in self._units(text):
+            piece_chars, piece_tokens = len(piece), self.tokens(piece)
+            if buffer and not self.fits(chars + len(sep) + piece_chars, tokens + piece_tokens):
+                flush()
+            if not buffer:
+                buffer_sep = sep
+                buffer.append(piece)
+                chars, tokens = piece_chars, piece_tokens
+            else:
+                buffer.append(sep)
+                buffer.append(piece)
+                chars += len(sep) + piece_chars
+                tokens += piece_tokens
+        flush()
+        return chunks, separators
+    
+    def _units(self, text: str):
+        """
+        依次产生 (前置分隔符, 片段)，每个片段都不超过限制
+        超长段落末尾的空白并入下一个片段的分隔符，不计入片段长度
+        """
+        sep = ""
+        for p, paragraph in enumerate(text.split("\n\n")):
+            if p:
+                sep += "\n\n"
+            if self.fits(len(paragraph), self.tokens(paragraph)):
+                yield sep, paragraph
+                sep = ""
+                continue
+            
+            for sentence, tail in split_sentences(paragraph):
+                if sentence:
+                    for piece in self._split_long(sentence):
+                        yield sep, piece
+                        sep = ""
+                sep += tail
+        # 文档末尾的空白作为片段产生，同样受长度限制
+        if sep:
+            for piece in self._split_long(sep):
+                yield "", piece
+    
+    def _split_long(self, sentence: str) -> List[str]:
+        """切分超长句子：优先在逗号/空白处切，找不到时按长度硬切"""
+        pieces = []
+        start = 0
+        while start < len(sentence):
+            rest = len(sentence) - start
+            window = min(rest, self.max_chars)
+            if window == rest and self.fits(rest, self.tokens(sentence[start:])):
+                pieces.append(sentence[start:])
+                break
+            
+            end = start + window
+            # token 超限时按比例缩小窗口
+            while window > 1 and not self.fits(window, self.tokens(sentence[start:end])):
+                window = max(1, int(window * 0.8))
+                end = start + window
+            
+            # 在窗口后半段寻找最后一个软切分点
+            cut = end
+            lower = start + window // 2
+            for match in _SOFT_BREAK.finditer(sentence, lower, end):
+                cut = match.end()
+            pieces.append(sentence[start:cut])
+            start = cut
+        return pieces
+
@@ -0,0 +1,202 @@
+"""
+Token预算模块 - 按模型上下文窗口计算和分配提示词长度
+"""
+import re
+from functools import lru_cache
+from typing import Optional, Dict, List
+
+try:
+    import tiktoken
+    TIKTOKEN_AVAILABLE = True
+except ImportError:
+    TIKTOKEN_AVAILABLE = False
+
+
+# 各模型的上下文窗口（tokens）
+MODEL_CONTEXT_WINDOWS = {
+    "gpt-4o": 128000,
+    "gpt-4o-mini": 128000,
+    "gpt-4-turbo": 128000,
+    "gpt-4": 8192,
+    "gpt-3.5-turbo": 16385,
+    "glm-4-flash": 128000,
+    "glm-4": 128000,
+    "glm-4-plus": 128000,
+    "moonshot-v1-8k": 8192,
+    "moonshot-v1-32k": 32768,
+    "moonshot-v1-128k": 131072,
+    "deepseek-chat": 64000,
+    "deepseek-reasoner": 64000,
+}
+DEFAULT_CONTEXT_WINDOW = 8192
+
+# 中日韩字符（约1个token/字），其他文本约4个字符/token
+_CJK_PATTERN = re.compile(r'[\u3000-\u303f\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uff00-\uffef]')
+
+
+def get_context_window(model: Optional[str]) -> int:
+    """获取模型的上下文窗口大小"""
+    if not model:
+        return DEFAULT_CONTEXT_WINDOW
+    if model in MODEL_CONTEXT_WINDOWS:
+        return MODEL_CONTEXT_WINDOWS[model]
+    # 带日期后缀的型号，如 gpt-4o-mini-2024-07-18
+    for name in sorted(MODEL_CONTEXT_WINDOWS, key=len, reverse=True):
+        if model.startswith(name):
+            return MODEL_CONTEXT_WINDOWS[name]
+    return DEFAULT_CONTEXT_WINDOW
+
+
+@lru_cache(maxsize=16)
+def _get_encoding(model: Optional[str]):
+    """获取tiktoken编码器（仅OpenAI模型有精确编码，其他模型用近似值）"""
+    if not TIKTOKEN_AVAILABLE or not model or not model.startswith("gpt"):
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("o200k_base")
+
+
+def approximate_tokens(text: str) -> int:
+    """快速估算token数"""
+    if not text:
+        return 0
+    cjk = len(_CJK_PATTERN.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def count_tokens(text: str, model: Optional[str] = None) -> int:
+    """计算文本token数（有tiktoken时精确计算，否则估算）"""
+    if not text:
+        return 0
+    encoding = _get_encoding(model)
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return approximate_tokens(text)
+
+
+def count_message_tokens(messages: list, model: Optional[str] = None) -> int:
+    """计算消息列表的token数（每条消息约有4个token的格式开销）"""
+    return sum(count_tokens(str(m.get("content", "")), model) + 4 for m in messages) + 2
+
+
+def truncate_to_tokens(text: str, max_tokens: int, model: Optional[str] = None) -> str:
+    """截断文本使其不超过 max_tokens"""
+    if max_tokens <= 0:
+        return ""
+    encoding = _get_encoding(model)
+    if encoding is not None:
+        tokens = encoding.encode(text, disallowed_special=())
+        if len(tokens) <= max_tokens:
+            return text
+        return encoding.decode(tokens[:max_tokens])
+    
+    total = approximate_tokens(text)
+    if total <= max_tokens:
+        return text
+    # 按比例估算截断位置，再逐步收缩直到满足预算
+    end = int(len(text) * max_tokens / total)
+    while end > 0 and approximate_tokens(text[:end]) > max_tokens:
+        end = int(end * 0.95)
+    return text[:end]
+
+
+class PromptBudget:
+    """
+    提示词预算打包器
+    按优先级把多个片段（系统提示、参考资料、搜索结果、指令等）装入模型上下文窗口，
+    放不下的片段会被截断或丢弃，并在结果中报告
+    """
+    
+    def __init__(self,
+                 model: Optional[str] = None,
+                 max_tokens: Optional[int] = None,
+                 reserve_output: int = 4096):
+        """
+        model: 模型名称，用于确定上下文窗口和分词方式
+        max_tokens: 提示词总预算，默认为上下文窗口减去 reserve_output
+        reserve_output: 为模型输出预留的token数
+        """
+        self.model = model
+        if max_tokens is None:
+            max_tokens = get_context_window(model) - reserve_output
+        self.max_tokens = max(0, max_tokens)
+        self._sections: List[Dict] = []
+    
+    def add(self,
+            name: str,
+            text: str,
+            priority: int = 0,
+            truncatable: bool = True,
+            min_tokens: int = 0) -> 'PromptBudget':
+        """
+        添加片段
+        priority: 越大越优先分配预算
+        truncatable: 预算不足时是否允许截断（否则整体丢弃）
+        min_tokens: 截断后至少保留的token数，达不到则整体丢弃
+        """
+        self._sections.append({
+            "name": name,
+            "text": text or "",
+            "priority": priority,
+            "truncatable": truncatable,
+            "min_tokens": min_tokens,
+            "order": len(self._sections)
+        })
+        return self
+    
+    def pack(self) -> 'PackedPrompt':
+        """按优先级分配预算"""
+        remaining = self.max_tokens
+        kept: Dict[str, str] = {}
+        dropped: List[Dict] = []
+        used = 0
+        
+        for section in sorted(self._sections, key=lambda s: (-s["priority"], s["order"])):
+            text = section["text"]
+            tokens = count_tokens(text, self.model)
+            
+            if tokens <= remaining:
+                kept[section["name"]] = text
+                remaining -= tokens
+                used += tokens
+                continue
+            
+            if section["truncatable"] and remaining > 0 and remaining >= section["min_tokens"]:
+                truncated = truncate_to_tokens(text, remaining, self.model)
+                kept_tokens = count_tokens(truncated, self.model)
+                kept[section["name"]] = truncated
+                remaining -= kept_tokens
+                used += kept_tokens
+                dropped.append({"name": section["name"], "tokens": tokens, "kept_tokens": kept_tokens})
+            else:
+                kept[section["name"]] = ""
+                dropped.append({"name": section["name"], "tokens": tokens, "kept_tokens": 0})
+        
+        return PackedPrompt(kept, used, self.max_tokens, dropped)
+
+
+class PackedPrompt:
+    """打包结果"""
+    
+    def __init__(self, sections: Dict[str, str], used_tokens: int, max_tokens: int,
+                 dropped: List[Dict]):
+        self.sections = sections
+        self.used_tokens = used_tokens
+        self.max_tokens = max_tokens
+        # 被截断或丢弃的片段 [{"name": "xxx", "tokens": 原长度, "kept_tokens": 保留长度}]
+        self.dropped = dropped
+    
+    def __getitem__(self, name: str) -> str:
+        return self.sections.get(name, "")
+    
+    @property
+    def truncated(self) -> bool:
+        return bool(self.dropped)
+    
+    def report(self) -> str:
+        """生成截断说明，如 "参考材料: 12000→3000 tokens" """
+        return "；".join(
+            f"{d['name']}: {d['tokens']}→{d['kept_tokens']} tokens" for d in self.dropped
+        )
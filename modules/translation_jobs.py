@@ -0,0 +1,213 @@
+"""
+翻译任务模块 - 长文档翻译的断点续传
+"""
+import json
+import sqlite3
+import hashlib
+import time
+from pathlib import Path
+from typing import Optional, Dict, List
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+class TranslationJobStore:
+    """
+    翻译任务存储（SQLite）
+    每完成一个分块立即写入磁盘；同一文档以相同参数再次翻译时自动从断点继续
+    任务键: (文档哈希, 源语言, 目标语言, 翻译后端, 分块参数)
+    """
+    
+    def __init__(self, db_path: str = "./data/translation_jobs.db"):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._init_db()
+    
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(str(self.db_path), timeout=30)
+    
+    def _init_db(self):
+        """初始化数据库"""
+        conn = self._connect()
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                name TEXT,
+                doc_hash TEXT NOT NULL,
+                source_lang TEXT NOT NULL,
+                target_lang TEXT NOT NULL,
+                backend TEXT NOT NULL,
+                params TEXT NOT NULL,
+                total INTEGER DEFAULT 0,
+                done INTEGER DEFAULT 0,
+                failed INTEGER DEFAULT 0,
+                status TEXT DEFAULT 'running',
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        ''')
+        
+        # 分块按内容哈希保存，分块方式不变时重跑可直接复用
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS job_chunks (
+                job_id TEXT NOT NULL,
+                chunk_hash TEXT NOT NULL,
+                translation TEXT NOT NULL,
+                PRIMARY KEY (job_id, chunk_hash),
+                FOREIGN KEY (job_id) REFERENCES jobs(id)
+            )
+        ''')
+        
+        # 每个文档（按名称和目标语言）最近一次的原文和译文，新版本上传时用于增量翻译
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS document_versions (
+                name TEXT NOT NULL,
+                target_lang TEXT NOT NULL,
+                source TEXT NOT NULL,
+                translation TEXT NOT NULL,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (name, target_lang)
+            )
+        ''')
+        
+        conn.commit()
+        conn.close()
+    
+    @staticmethod
+    def make_job_id(doc_hash: str, source_lang: str, target_lang: str, backend: str, params: Dict) -> str:
+        payload = json.dumps([doc_hash, source_lang, target_lang, backend, params],
+                             ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:32]
+    
+    def start(self,
+              text: str,
+              source_lang: str,
+              target_lang: str,
+              backend: str,
+              params: Dict,
+              total: int,
+              name: str = "",
+              doc_hash: Optional[str] = None) -> str:
+        """
+        创建任务或继续已有任务，返回任务ID
+        doc_hash: 文档标识，默认为 text 的哈希（边提取边翻译时可传入文件哈希）
+        """
+        doc_hash = doc_hash or text_hash(text)
+        job_id = self.make_job_id(doc_hash, source_lang, target_lang, backend, params)
+        now = time.time()
+        
+        conn = self._connect()
+        try:
+            exists = conn.execute('SELECT 1 FROM jobs WHERE id = ?', (job_id,)).fetchone()
+            if exists:
+                conn.execute('''
+                    UPDATE jobs SET total = ?, status = 'running', updated_at = ?,
+                    name = CASE WHEN ? != '' THEN ? ELSE name END
+                    WHERE id = ?
+                ''', (total, now, name, name, job_id))
+            else:
+                conn.execute('''
+                    INSERT INTO jobs (id, name, doc_hash, source_lang, target_lang, backend, params,
+                                      total, created_at, updated_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ''', (job_id, name, doc_hash, source_lang, target_lang, backend,
+                      json.dumps(params, sort_keys=True), total, now, now))
+            conn.commit()
+        finally:
+            conn.close()
+        return job_id
+    
+    def load_chunks(self, job_id: str) -> Dict[str, str]:
+        """读取已完成的分块 {分块哈希: 译文}"""
+        conn = self._connect()
+        rows = conn.execute(
+            'SELECT chunk_hash, translation FROM job_chunks WHERE job_id = ?', (job_id,)
+        ).fetchall()
+        conn.close()
+        return dict(rows)
+    
+    def save_chunk(self, job_id: str, chunk: str, translation: str):
+        """保存一个已完成的分块（检查点）"""
+        conn = self._connect()
+        try:
+            conn.execute('''
+                INSERT OR REPLACE INTO job_chunks (job_id, chunk_hash, translation)
+                VALUES (?, ?, ?)
+            ''', (job_id, text_hash(chunk), translation))
+            conn.execute('''
+                UPDATE jobs SET done = (SELECT COUNT(*) FROM job_chunks WHERE job_id = ?),
+                updated_at = ? WHERE id = ?
+            ''', (job_id, time.time(), job_id))
+            conn.commit()
+        finally:
+            conn.close()
+    
+    def finish(self, job_id: str, failed: int = 0, total: Optional[int] = None):
+        """
+        结束任务：全部成功为 completed，有失败分块为 partial
+        total: 开始时不知道总块数的任务在结束时补上
+        """
+        status = "partial" if failed else "completed"
+        conn = self._connect()
+        conn.execute(
+            'UPDATE jobs SET status = ?, failed = ?, total = COALESCE(?, total), updated_at = ? WHERE id = ?',
+            (status, failed, total, time.time(), job_id)
+        )
+        conn.commit()
+        conn.close()
+    
+    def get_job(self, job_id: str) -> Optional[Dict]:
+        """获取任务状态"""
+        conn = self._connect()
+        conn.row_factory = sqlite3.Row
+        row = conn.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        conn.close()
+        return dict(row) if row else None
+    
+    def list_jobs(self, status: Optional[str] = None, limit: int = 50) -> List[Dict]:
+        """列出任务（最近更新的在前）"""
+        conn = self._connect()
+        conn.row_factory = sqlite3.Row
+        if status:
+            rows = conn.execute(
+                'SELECT * FROM jobs WHERE status = ? ORDER BY updated_at DESC LIMIT ?', (status, limit)
+            ).fetchall()
+        else:
+            rows = conn.execute(
+                'SELECT * FROM jobs ORDER BY updated_at DESC LIMIT ?', (limit,)
+            ).fetchall()
+        conn.close()
+        return [dict(r) for r in rows]
+    
+    def delete_job(self, job_id: str):
+        """删除任务及其检查点"""
+        conn = self._connect()
+        conn.execute('DELETE FROM job_chunks WHERE job_id = ?', (job_id,))
+        conn.execute('DELETE FROM jobs WHERE id = ?', (job_id,))
+        conn.commit()
+        conn.close()
+    
+    def save_version(self, name: str, target_lang: str, source: str, translation: str):
+        """保存文档最近一次翻译的原文和译文"""
+        conn = self._connect()
+        conn.execute('''
+            INSERT OR REPLACE INTO document_versions (name, target_lang, source, translation, updated_at)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (name, target_lang, source, translation, time.time()))
+        conn.commit()
+        conn.close()
+    
+    def get_version(self, name: str, target_lang: str) -> Optional[Dict]:
+        """获取文档上一版本 {"source": ..., "translation": ..., "updated_at": ...}，没有时返回None"""
+        conn = self._connect()
+        conn.row_factory = sqlite3.Row
+        row = conn.execute(
+            'SELECT source, translation, updated_at FROM document_versions WHERE name = ? AND target_lang = ?',
+            (name, target_lang)
+        ).fetchone()
+        conn.close()
+        return dict(row) if row else None
@@ -0,0 +1,168 @@
+"""
+翻译记忆库 - 按句段复用已有译文（SQLite）
+"""
+import sqlite3
+import hashlib
+import re
+import threading
+import time
+import unicodedata
+from pathlib import Path
+from typing import Optional, Dict, List
+
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_segment(text: str) -> str:
+    """规范化句段：全半角统一、合并空白，使仅有排版差异的段落也能命中"""
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFKC", text)).strip()
+
+
+def _with_outer_whitespace(source: str, translation: str) -> str:
+    """译文换上原文首尾的空白（键忽略首尾空白，同一条译文会用于首尾空白不同的原文）"""
+    body = source.strip()
+    if not body:
+        return translation
+    start = source.index(body[0])
+    return source[:start] + translation.strip() + source[start + len(body):]
+
+
+class TranslationMemory:
+    """
+    翻译记忆库
+    以 规范化原文 + 语言对 + 翻译后端 为键保存译文，翻译前先查询，精确命中直接复用
+    """
+    
+    def __init__(self, db_path: str = "./data/translation_memory.db"):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "stores": 0}
+        self._init_db()
+    
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(str(self.db_path), timeout=30)
+    
+    def _init_db(self):
+        """初始化数据库"""
+        conn = self._connect()
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS segments (
+                key TEXT PRIMARY KEY,
+                source TEXT NOT NULL,
+                translation TEXT NOT NULL,
+                source_lang TEXT NOT NULL,
+                target_lang TEXT NOT NULL,
+                backend TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL,
+                use_count INTEGER DEFAULT 0
+            )
+        ''')
+        conn.commit()
+        conn.close()
+    
+    @staticmethod
+    def make_key(text: str, source_lang: str, target_lang: str, backend: str) -> str:
+        """计算句段键"""
+        payload = "\x1f".join([backend, source_lang, target_lang, normalize_segment(text)])
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+    
+    def _count(self, name: str, n: int = 1):
+        with self._lock:
+            self._stats[name] += n
+    
+    def lookup(self,
+               texts: List[str],
+               source_lang: str,
+               target_lang: str,
+               backend: str) -> List[Optional[str]]:
+        """批量查询，返回与 texts 对应的译文（未命中为None）"""
+        keys = [self.make_key(t, source_lang, target_lang, backend) for t in texts]
+        found: Dict[str, str] = {}
+        conn = self._connect()
+        try:
+            unique = list(set(keys))
+            # SQLite 单条语句的参数个数有限，分批查询
+            for i in range(0, len(unique), 500):
+                batch = unique[i:i + 500]
+                rows = conn.execute(
+                    f'SELECT key, translation FROM segments WHERE key IN ({",".join("?" * len(batch))})',
+                    batch
+                ).fetchall()
+                found.update(rows)
+            if found:
+                conn.executemany(
+                    'UPDATE segments SET last_used = ?, use_count = use_count + 1 WHERE key = ?',
+                    [(time.time(), key) for key in found]
+                )
+                conn.commit()
+        finally:
+            conn.close()
+        
+        results = [None if key not in found else _with_outer_whitespace(text, found[key])
+                   for text, key in zip(texts, keys)]
+        hits = sum(1 for r in results if r is not None)
+        self._count("hits", hits)
+        self._count("misses", len(results) - hits)
+        return results
+    
+    def get(self, text: str, source_lang: str, target_lang: str, backend: str) -> Optional[str]:
+        """查询单个句段"""
+        return self.lookup([text], source_lang, target_lang, backend)[0]
+    
+    def store(self,
+              pairs: List[tuple],
+              source_lang: str,
+              target_lang: str,
+              backend: str):
+        """保存译文 pairs: [(原文, 译文), ...]"""
+        now = time.time()
+        rows = [
+            (self.make_key(source, source_lang, target_lang, backend), source, translation.strip(),
+             source_lang, target_lang, backend, now, now)
+            for source, translation in pairs
+            if source.strip() and translation and translation.strip()
+        ]
+        if not rows:
+            return
+        conn = self._connect()
+        try:
+            conn.executemany('''
+                INSERT OR REPLACE INTO segments
+                (key, source, translation, source_lang, target_lang, backend, created_at, last_used)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', rows)
+            conn.commit()
+        finally:
+            conn.close()
+        self._count("stores", len(rows))
+    
+    def set(self, text: str, translation: str, source_lang: str, target_lang: str, backend: str):
+        """保存单个句段"""
+        self.store([(text, translation)], source_lang, target_lang, backend)
+    
+    def clear(self):
+        """清空记忆库"""
+        conn = self._connect()
+        conn.execute('DELETE FROM segments')
+        conn.commit()
+        conn.close()
+    
+    def stats(self) -> Dict:
+        """
+        复用统计
+        返回: {"hits": 10, "misses": 5, "reuse_rate": 0.67, "stores": 5, "entries": 100}
+        """
+        conn = self._connect()
+        entries = conn.execute('SELECT COUNT(*) FROM segments').fetchone()[0]
+        conn.close()
+        
+        with self._lock:
+            result = dict(self._stats)
+        lookups = result["hits"] + result["misses"]
+        result["reuse_rate"] = result["hits"] / lookups if lookups else 0.0
+        result["entries"] = entries
+        return result
@@ -2,9 +2,96 @@
 翻译模块 - 支持长文档翻译
 """
 import os
-from typing import List, Optional, Generator
+import asyncio
+import difflib
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import List, Optional, Generator, Dict, Iterable, Union
+import requests
+from bs4 import BeautifulSoup
 from deep_translator import GoogleTranslator
+from deep_translator.exceptions import TooManyRequests, RequestError, TranslationNotFound
+from deep_translator.validate import is_input_valid, request_failed
 from .llm_client import LLMClient
+from .translation_memory import TranslationMemory, normalize_segment
+from .text_splitter import TextSplitter, split_sentences
+from .translation_jobs import TranslationJobStore, text_hash
+
+
+class PooledGoogleTranslator(GoogleTranslator):
+    """
+    复用 HTTP 连接的 Google 翻译器
+    deep-translator 每次请求都调用 requests.get（每次新建连接），并在实例上修改请求参数（多线程不安全）；
+    这里每个实例持有一个连接池，请求参数只在局部构造，同一实例可被多个线程共用
+    translate 按 deep-translator 1.11.4 的 GoogleTranslator.translate 改写，用到它的内部属性，
+    requirements.txt 中固定了 deep-translator 的版本范围，升级时需对照上游实现核对
+    """
+    
+    def __init__(self, source: str = "auto", target: str = "en", base_url: Optional[str] = None,
+                 pool_size: int = 16, timeout: float = 30, **url_params):
+        """
+        base_url: 替换 Google 翻译地址（如压测用的本地模拟服务）
+        url_params: 附加的请求参数（如 hl），与 GoogleTranslator 相同
+        """
+        super().__init__(source=source, target=target, **url_params)
+        if base_url:
+            self._base_url = base_url
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+    
+    def translate(self, text: str, **kwargs) -> str:
+        is_input_valid(text, max_chars=5000)
+        text = text.strip()
+        if self._same_source_target() or not text:
+            return text
+        params = dict(self._url_params, tl=self._target, sl=self._source)
+        params[self.payload_key] = text
+        
+        translated = self._fetch(params, text)
+        if translated == text and "hl" in params:
+            # 与上游一致：译文与原文相同时去掉界面语言参数 hl 再请求一次
+            del params["hl"]
+            translated = self._fetch(params, text)
+        return translated
+    
+    def _fetch(self, params: Dict, text: str) -> str:
+        """发送一次翻译请求，从返回的网页中取出译文"""
+        response = self.session.get(self._base_url, params=params, proxies=self.proxies, timeout=self.timeout)
+        try:
+            if response.status_code == 429:
+                raise TooManyRequests()
+            if request_failed(status_code=response.status_code):
+                raise RequestError()
+            soup = BeautifulSoup(response.text, "html.parser")
+        finally:
+            response.close()
+        
+        element = (soup.find(self._element_tag, self._element_query)
+                   or soup.find(self._element_tag, self._alt_element_query))
+        if not element:
+            raise TranslationNotFound(text)
+        return element.get_text(strip=True)
+
+
+_google_translators: Dict[tuple, PooledGoogleTranslator] = {}
+_google_lock = threading.Lock()
+
+
+def get_google_translator(source: str, target: str, base_url: Optional[str] = None) -> PooledGoogleTranslator:
+    """获取（缓存的）Google 翻译器，每个语言对只创建一次，进程内共用连接池"""
+    key = (source, target, base_url)
+    translator = _google_translators.get(key)
+    if translator is None:
+        with _google_lock:
+            translator = _google_translators.get(key)
+            if translator is None:
+                translator = _google_translators[key] = PooledGoogleTranslator(source, target, base_url)
+    return translator
 
 
 class DocumentTranslator:
@@ -23,65 +110,80 @@ class DocumentTranslator:
         "葡萄牙文": "pt"
     }
     
-    def __init__(self, use_llm: bool = False, llm_client: Optional[LLMClient] = None):
+    def __init__(self,
+                 use_llm: bool = False,
+                 llm_client: Optional[LLMClient] = None,
+                 max_workers: int = 4,
+                 max_retries: int = 2,
+                 memory: Optional[TranslationMemory] = None,
+                 jobs: Optional[TranslationJobStore] = None,
+                 google_base_url: Optional[str] = None):
+        """
+        max_workers: 长文档并发翻译的块数（1 为逐块顺序翻译）
+        max_retries: Google 翻译单个分块失败后的重试次数（大模型客户端自带按错误类型退避的重试，不再叠加）
+        memory: 翻译记忆库（可选），已翻译过的段落直接复用
+        jobs: 翻译任务存储（可选），长文档每完成一块即保存检查点，中断后可续传
+        google_base_url: 替换 Google 翻译地址（压测时指向本地模拟服务）
+        """
         self.use_llm = use_llm
         self.llm_client = llm_client
         self.chunk_size = 4000  # 每块最大字符数
+        self.llm_chunk_tokens = 1500  # 大模型后端每块最大token数（译文长度与原文相近，需为输出留出余量）
+        self.max_workers = max(1, max_workers)
+        self.max_retries = max_retries
+        self.memory = memory
+        self.jobs = jobs
+        self.google_base_url = google_base_url
+        self.last_job_id: Optional[str] = None
+        # 最近一次 translate_document 中翻译失败的分块 [{"index": 0, "error": "xxx"}]
+        self.last_failures: List[Dict] = []
+        # 最近一次 translate_revision 的复用统计
+        self.last_reuse: Dict = {}
+    
+    def _splitter(self) -> TextSplitter:
+        """按翻译后端的限制创建分块器"""
+        if self.use_llm and self.llm_client:
+            return TextSplitter(self.chunk_size, self.llm_chunk_tokens,
+                                getattr(self.llm_client, "model", None))
+        return TextSplitter(self.chunk_size)
     
     def _split_text(self, text: str) -> List[str]:
-        """将长文本分块"""
-        if len(text) <= self.chunk_size:
-            return [text]
-        
-        chunks = []
-        paragraphs = text.split('\n\n')
-        current_chunk = ""
-        
-        for para in paragraphs:
-            if len(current_chunk) + len(para) + 2 <= self.chunk_size:
-                current_chunk += para + "\n\n"
-            else:
-                if current_chunk:
-                    chunks.append(current_chunk.strip())
-                # 如果单个段落超过限制，强制分割
-                if len(para) > self.chunk_size:
-                    for i in range(0, len(para), self.chunk_size):
-                        chunks.append(para[i:i+self.chunk_size])
-                    current_chunk = ""
-                else:
-                    current_chunk = para + "\n\n"
-        
-        if current_chunk:
-            chunks.append(current_chunk.strip())
-        
-        return chunks
+        """将长文本按段落和句子边界分块"""
+        return self._splitter().split(text)
     
     def translate_text(self, 
                        text: str, 
                        target_lang: str = "中文",
                        source_lang: str = "auto") -> str:
         """翻译单段文本"""
-        target_code = self.LANGUAGE_MAP.get(target_lang, target_lang)
-        source_code = self.LANGUAGE_MAP.get(source_lang, source_lang)
-        if source_code == "auto":
-            source_code = "auto"
+        if self.memory is not None:
+            cached = self.memory.get(text, source_lang, target_lang, self._backend_name())
+            if cached is not None:
+                return cached
         
-        if self.use_llm and self.llm_client:
-            return self._translate_with_llm(text, target_lang, source_lang)
-        else:
-            return self._translate_with_google(text, target_code, source_code)
-    
-    def _translate_with_google(self, text: str, target: str, source: str) -> str:
-        """使用Google翻译"""
         try:
-            translator = GoogleTranslator(source=source, target=target)
-            return translator.translate(text)
+            translated = self._translate_chunk(text, target_lang, source_lang)
         except Exception as e:
+            if self.use_llm and self.llm_client:
+                raise
             return f"[翻译错误: {e}]"
+        
+        if self.memory is not None:
+            self.memory.set(text, translated, source_lang, target_lang, self._backend_name())
+        return translated
     
-    def _translate_with_llm(self, text: str, target_lang: str, source_lang: str) -> str:
-        """使用大模型翻译"""
-        prompt = f"""请将以下文本翻译成{target_lang}。
+    def _backend_name(self) -> str:
+        """翻译后端标识（不同后端的译文分开保存在记忆库中）"""
+        if self.use_llm and self.llm_client:
+            return f"llm:{getattr(self.llm_client, 'provider', '')}:{getattr(self.llm_client, 'model', '')}"
+        return "google"
+    
+    def _translate_with_google(self, text: str, target: str, source: str) -> str:
+        """使用Google翻译（按语言对复用翻译器和连接）"""
+        return get_google_translator(source, target, self.google_base_url).translate(text)
+    
+    def _llm_prompt(self, text: str, target_lang: str) -> str:
+        return f"""请将以下文本翻译成{target_lang}。
 要求：
 1. 保持原文格式和段落结构
 2. 专业术语翻译准确
@@ -91,39 +193,654 @@ class DocumentTranslator:
 {text}
 
 翻译："""
+    
+    def _translate_with_llm(self, text: str, target_lang: str, source_lang: str) -> str:
+        """使用大模型翻译"""
+        return self.llm_client.simple_chat(self._llm_prompt(text, target_lang))
+    
+    def _translate_chunk(self, text: str, target_lang: str, source_lang: str) -> str:
+        """翻译一个分块，失败时抛出异常（不把错误写进译文）"""
+        if self.use_llm and self.llm_client:
+            return self._translate_with_llm(text, target_lang, source_lang)
+        target_code = self.LANGUAGE_MAP.get(target_lang, target_lang)
+        source_code = self.LANGUAGE_MAP.get(source_lang, source_lang)
+        return self._translate_with_google(text, target_code, source_code)
+    
+    def _translate_chunk_with_retry(self, text: str, target_lang: str, source_lang: str) -> str:
+        # 大模型客户端内部已按 RetryPolicy 重试，这里再重试会让一个坏分块的请求次数成倍增加
+        retries = 0 if self.use_llm and self.llm_client else self.max_retries
+        for attempt in range(retries + 1):
+            try:
+                return self._translate_chunk(text, target_lang, source_lang)
+            except Exception:
+                if attempt >= retries:
+                    raise
+                time.sleep(2 ** attempt)
+    
+    async def _atranslate_chunk(self, text: str, target_lang: str) -> str:
+        """大模型后端的异步翻译（重试由大模型客户端完成）"""
+        return await self.llm_client.asimple_chat(self._llm_prompt(text, target_lang))
+    
+    def translate_batch(self,
+                        texts: List[str],
+                        target_lang: str = "中文",
+                        source_lang: str = "auto",
+                        return_exceptions: bool = False) -> List[Union[str, BaseException]]:
+        """
+        批量翻译多段简短文本（如标题、单个段落），结果与输入顺序一致
+        使用大模型时多段文本打包在同一个请求中，大幅减少请求次数
+        重试后仍失败时抛出异常；return_exceptions 为True时该段返回异常对象，其余段照常返回
+        """
+        results: List[Optional[str]] = [None] * len(texts)
+        if self.memory is not None:
+            results = self.memory.lookup(texts, source_lang, target_lang, self._backend_name())
+        missing = [i for i, r in enumerate(results) if r is None]
+        if not missing:
+            return results
         
-        return self.llm_client.simple_chat(prompt)
+        if self.use_llm and self.llm_client:
+            source = "" if source_lang == "auto" else f"从{source_lang}"
+            instruction = f"将 input 的文本{source}翻译成{target_lang}，保持原文格式，专业术语翻译准确，语句通顺自然，output 只包含译文"
+            translated = self.llm_client.batch_chat([texts[i] for i in missing], instruction=instruction,
+                                                    return_exceptions=return_exceptions)
+        else:
+            translated = []
+            for i in missing:
+                try:
+                    translated.append(self._translate_chunk_with_retry(texts[i], target_lang, source_lang))
+                except Exception as e:
+                    if not return_exceptions:
+                        raise
+                    translated.append(e)
+        for i, t in zip(missing, translated):
+            results[i] = t
+        if self.memory is not None:
+            self.memory.store([(texts[i], t) for i, t in zip(missing, translated) if isinstance(t, str)],
+                              source_lang, target_lang, self._backend_name())
+        return results
     
     def translate_document(self, 
                           text: str, 
                           target_lang: str = "中文",
                           source_lang: str = "auto",
-                          progress_callback=None) -> str:
+                          progress_callback=None,
+                          max_workers: Optional[int] = None,
+                          job_name: str = "") -> str:
         """
-        翻译长文档
-        progress_callback: 进度回调函数 callback(current, total)
+        翻译长文档（分块并发翻译，结果保持原文顺序）
+        progress_callback: 进度回调函数 callback(已完成块数, 总块数)
+        max_workers: 并发块数，默认使用 self.max_workers
+        重试后仍失败的分块保留原文，并记录在 self.last_failures 中
+        有翻译记忆库时按段落查询，只翻译未命中的段落
+        有任务存储时每完成一块保存检查点，再次翻译同一文档时跳过已完成的分块
+        job_name: 任务名称（显示在任务列表中）
         """
-        chunks = self._split_text(text)
-        translated_chunks = []
+        plan = self._plan_document(text, target_lang, source_lang)
+        restored = self._start_job(plan, text, target_lang, source_lang, job_name)
+        pending = [i for i in range(len(plan.chunks)) if i not in restored]
+        
+        def on_progress(completed: int, total: int):
+            if progress_callback:
+                progress_callback(len(restored) + completed, len(plan.chunks))
+        
+        def on_chunk(index: int, translated: str):
+            self._chunk_done(plan, pending[index], translated, target_lang, source_lang)
+        
+        translated, failures = self._translate_chunks([plan.chunks[i] for i in pending], target_lang,
+                                                      source_lang, on_progress, max_workers, on_chunk)
+        results = [restored.get(i) for i in range(len(plan.chunks))]
+        for i, t in zip(pending, translated):
+            results[i] = t
+        self.last_failures = [dict(f, index=pending[f["index"]]) for f in failures]
+        self._finish_job()
+        
+        if not pending and progress_callback:
+            progress_callback(1, 1)
+        return plan.assemble(results)
+    
+    def _start_job(self, plan: '_DocumentPlan', text: str, target_lang: str, source_lang: str,
+                   job_name: str) -> Dict[int, str]:
+        """开始（或继续）翻译任务，返回已有检查点的分块 {分块序号: 译文}"""
+        self.last_job_id = None
+        if self.jobs is None or not plan.chunks:
+            return {}
+        saved = self._open_job(text, target_lang, source_lang, len(plan.chunks), job_name)
+        if not saved:
+            return {}
+        restored = {}
+        for i, chunk in enumerate(plan.chunks):
+            translation = saved.get(text_hash(chunk))
+            if translation is not None:
+                restored[i] = translation
+        return restored
+    
+    def _open_job(self, text: str, target_lang: str, source_lang: str, total: int,
+                  job_name: str, doc_hash: Optional[str] = None) -> Dict[str, str]:
+        """创建或继续任务，返回已保存的检查点 {分块哈希: 译文}"""
+        params = {"chunk_size": self.chunk_size}
+        if self.use_llm and self.llm_client:
+            params["llm_chunk_tokens"] = self.llm_chunk_tokens
+        if doc_hash is not None:
+            params["pages"] = True
+        self.last_job_id = self.jobs.start(text, source_lang, target_lang, self._backend_name(),
+                                           params, total, job_name, doc_hash)
+        return self.jobs.load_chunks(self.last_job_id)
+    
+    def _chunk_done(self, plan: '_DocumentPlan', index: int, translated: str,
+                    target_lang: str, source_lang: str):
+        """分块完成：写入记忆库和任务检查点"""
+        if self.memory is not None:
+            # 译文的段落划分不一定与原文一一对应（可能拆分或合并段落），只按整块保存
+            self.memory.set(plan.chunks[index], translated, source_lang, target_lang, self._backend_name())
+        if self.last_job_id is not None:
+            self.jobs.save_chunk(self.last_job_id, plan.chunks[index], translated)
+    
+    def _finish_job(self):
+        if self.last_job_id is not None:
+            self.jobs.finish(self.last_job_id, len(self.last_failures))
+    
+    def _plan_document(self, text: str, target_lang: str, source_lang: str) -> '_DocumentPlan':
+        """
+        把文档拆成输出单元：需要翻译的分块，以及（有记忆库时）已有译文的段落和分块
+        未命中的连续段落合并成块，超长段落按句子切分
+        """
+        splitter = self._splitter()
+        if self.memory is None:
+            chunks, separators = splitter.split_with_separators(text)
+            return _DocumentPlan([(sep, "chunk", i) for i, sep in enumerate(separators)], chunks)
+        
+        backend = self._backend_name()
+        paragraphs = text.split('\n\n')
+        cached: List[Optional[str]] = [None] * len(paragraphs)
+        non_empty = [i for i, p in enumerate(paragraphs) if p.strip()]
+        found = self.memory.lookup([paragraphs[i] for i in non_empty], source_lang, target_lang, backend)
+        for i, translation in zip(non_empty, found):
+            cached[i] = translation
+        
+        plan = _DocumentPlan([], [])
+        current: List[str] = []
+        chars = tokens = 0
         
-        for i, chunk in enumerate(chunks):
-            translated = self.translate_text(chunk, target_lang, source_lang)
-            translated_chunks.append(translated)
+        def close_chunk():
+            nonlocal chars, tokens
+            if current:
+                plan.add_chunk("\n\n".join(current))
+                current.clear()
+                chars = tokens = 0
+        
+        for para, translation in zip(paragraphs, cached):
+            if translation is not None or not para.strip():
+                close_chunk()
+                plan.add_text(para if translation is None else translation)
+                continue
+            
+            para_chars, para_tokens = len(para), splitter.tokens(para)
+            if not splitter.fits(para_chars, para_tokens):
+                # 超长段落按句子切分
+                close_chunk()
+                pieces, separators = splitter.split_with_separators(para)
+                for j, (sep, piece) in enumerate(zip(separators, pieces)):
+                    plan.add_chunk(piece, sep if j else plan.next_separator() + sep)
+                continue
             
+            if current and not splitter.fits(chars + 2 + para_chars, tokens + para_tokens):
+                close_chunk()
+            current.append(para)
+            chars += para_chars + (2 if len(current) > 1 else 0)
+            tokens += para_tokens
+        close_chunk()
+        
+        # 多段落的分块按整块保存在记忆库中（同样的段落分到同样的块时命中）
+        found = self.memory.lookup(plan.chunks, source_lang, target_lang, backend)
+        if any(t is not None for t in found):
+            plan = plan.with_translations(found)
+        return plan
+    
+    def _translate_chunks(self, chunks: List[str], target_lang: str, source_lang: str,
+                          progress_callback, max_workers: Optional[int],
+                          on_chunk=None) -> tuple:
+        """
+        并发翻译分块，返回 (按原顺序排列的译文, 失败列表)
+        失败的分块保留原文；on_chunk(index, translated) 在每个分块成功后调用
+        """
+        if not chunks:
+            return [], []
+        workers = min(max_workers or self.max_workers, len(chunks))
+        results: List[Optional[str]] = [None] * len(chunks)
+        failures: List[Dict] = []
+        
+        def on_done(index: int, translated: Optional[str], error: Optional[Exception], completed: int):
+            if error is None:
+                results[index] = translated
+                if on_chunk:
+                    on_chunk(index, translated)
+            else:
+                results[index] = chunks[index]
+                failures.append({"index": index, "error": str(error)})
+            if progress_callback:
+                progress_callback(completed, len(chunks))
+        
+        if workers <= 1:
+            for i, chunk in enumerate(chunks):
+                try:
+                    on_done(i, self._translate_chunk_with_retry(chunk, target_lang, source_lang), None, i + 1)
+                except Exception as e:
+                    on_done(i, None, e, i + 1)
+        elif self.use_llm and self.llm_client and not self._in_event_loop():
+            asyncio.run(self._atranslate_in_new_loop(chunks, target_lang, workers, on_done))
+        else:
+            # Google翻译为阻塞调用，用线程池并发；回调在当前线程中按完成顺序触发
+            executor = ThreadPoolExecutor(max_workers=workers)
+            try:
+                futures = {
+                    executor.submit(self._translate_chunk_with_retry, chunk, target_lang, source_lang): i
+                    for i, chunk in enumerate(chunks)
+                }
+                for completed, future in enumerate(as_completed(futures), 1):
+                    error = future.exception()
+                    on_done(futures[future], None if error else future.result(), error, completed)
+            finally:
+                # 中途被打断（如页面重新运行）时不再启动排队中的分块
+                executor.shutdown(wait=False, cancel_futures=True)
+        
+        return results, sorted(failures, key=lambda f: f["index"])
+    
+    @staticmethod
+    def _in_event_loop() -> bool:
+        try:
+            asyncio.get_running_loop()
+            return True
+        except RuntimeError:
+            return False
+    
+    async def _atranslate_chunks(self, chunks: List[str], target_lang: str, workers: int, on_done):
+        """大模型后端：在事件循环中并发翻译，最多 workers 个请求同时在途"""
+        semaphore = asyncio.Semaphore(workers)
+        completed = 0
+        
+        async def run_one(index: int, chunk: str):
+            nonlocal completed
+            async with semaphore:
+                try:
+                    translated, error = await self._atranslate_chunk(chunk, target_lang), None
+                except Exception as e:
+                    translated, error = None, e
+            completed += 1
+            on_done(index, translated, error, completed)
+        
+        await asyncio.gather(*(run_one(i, c) for i, c in enumerate(chunks)))
+    
+    async def _atranslate_in_new_loop(self, chunks: List[str], target_lang: str, workers: int, on_done):
+        """
+        在 asyncio.run 新建的事件循环中翻译
+        大模型客户端为每个事件循环单独建连接池，这个循环结束后它的连接池不会再用到，结束前只关闭它
+        （共享客户端的同步连接池和其他会话事件循环上的连接池不受影响）
+        """
+        try:
+            await self._atranslate_chunks(chunks, target_lang, workers, on_done)
+        finally:
+            if hasattr(self.llm_client, "aclose"):
+                await self.llm_client.aclose()
+    
+    def translate_document_unordered(self,
+                                     text: str,
+                                     target_lang: str = "中文",
+                                     source_lang: str = "auto",
+                                     max_workers: Optional[int] = None,
+                                     job_name: str = "") -> Generator[tuple, None, None]:
+        """
+        并发流式翻译：各分块同时翻译，谁先完成先返回
+        yield: (index, total, translated, separator)
+            index 为输出单元序号（从0开始），separator 为该单元之前的分隔符
+            按序号重组即可随时得到已连续完成的前缀（见 translate_document_stream）
+        记忆库命中的段落和已有检查点的分块最先返回；失败的分块返回原文并记录在 self.last_failures 中
+        """
+        plan = self._plan_document(text, target_lang, source_lang)
+        restored = self._start_job(plan, text, target_lang, source_lang, job_name)
+        total = len(plan.units)
+        self.last_failures = []
+        unit_of_chunk = {}
+        for i, (sep, kind, value) in enumerate(plan.units):
+            if kind == "text":
+                yield (i, total, value, sep)
+            elif value in restored:
+                yield (i, total, restored[value], sep)
+            else:
+                unit_of_chunk[value] = i
+        if not unit_of_chunk:
+            self._finish_job()
+            return
+        
+        executor = ThreadPoolExecutor(max_workers=min(max_workers or self.max_workers, len(unit_of_chunk)))
+        try:
+            futures = {
+                executor.submit(self._translate_chunk_with_retry, plan.chunks[c], target_lang, source_lang): c
+                for c in unit_of_chunk
+            }
+            for future in as_completed(futures):
+                c = futures[future]
+                error = future.exception()
+                if error is None:
+                    translated = future.result()
+                    self._chunk_done(plan, c, translated, target_lang, source_lang)
+                else:
+                    translated = plan.chunks[c]
+                    self.last_failures.append({"index": c, "error": str(error)})
+                i = unit_of_chunk[c]
+                yield (i, total, translated, plan.units[i][0])
+            self._finish_job()
+        finally:
+            # 调用方提前停止读取时，取消尚未开始的分块
+            executor.shutdown(wait=False, cancel_futures=True)
+    
+    def translate_revision(self,
+                           text: str,
+                           previous_source: str,
+                           previous_translation: str,
+                           target_lang: str = "中文",
+                           source_lang: str = "auto",
+                           progress_callback=None,
+                           max_workers: Optional[int] = None) -> str:
+        """
+        增量翻译文档的新版本：与上一版本的原文逐段对比，未改动的段落直接复用上一版译文，
+        改动的段落中未改动的句子也尽量复用，只翻译新增和修改的部分
+        previous_source / previous_translation: 上一版本的原文和译文（段落以空行分隔）
+        上一版本的原文与译文段落数不一致时无法对齐，退回 translate_document
+        需要翻译的相邻片段按分块限制合并成块（超长的按句子切分），与 translate_document 的分块一致
+        复用统计记录在 self.last_reuse 中（chunks 为实际翻译的分块数）:
+            {"segments": 12, "reused": 10, "translated": 2, "chunks": 1, "reused_chars": 3000, "total_chars": 3200,
+             "reuse_rate": 0.94}
+        """
+        old_paragraphs = previous_source.split('\n\n')
+        old_translations = previous_translation.split('\n\n')
+        if len(old_paragraphs) != len(old_translations):
+            result = self.translate_document(text, target_lang, source_lang, progress_callback, max_workers)
+            self.last_reuse = {"segments": 0, "reused": 0, "translated": 0, "chunks": 0, "reused_chars": 0,
+                               "total_chars": len(text), "reuse_rate": 0.0}
+            return result
+        
+        paragraphs = text.split('\n\n')
+        # 每个输出段落是若干片段 [原文, 复用的译文或None, 译文中片段后的分隔符, 原文中片段后的分隔符]
+        outputs: List[List[list]] = []
+        matcher = difflib.SequenceMatcher(None, [normalize_segment(p) for p in old_paragraphs],
+                                          [normalize_segment(p) for p in paragraphs], autojunk=False)
+        for op, i1, i2, j1, j2 in matcher.get_opcodes():
+            if op == "equal":
+                outputs.extend([[paragraphs[j], old_translations[i], "", ""]]
+                               for i, j in zip(range(i1, i2), range(j1, j2)))
+                continue
+            for k, j in enumerate(range(j1, j2)):
+                if op == "replace" and i1 + k < i2:
+                    outputs.append(self._diff_sentences(old_paragraphs[i1 + k], old_translations[i1 + k],
+                                                        paragraphs[j]))
+                else:
+                    outputs.append([[paragraphs[j], None if paragraphs[j].strip() else paragraphs[j], "", ""]])
+        
+        pending = [seg for segments in outputs for seg in segments if seg[1] is None]
+        plan = self._plan_revision(outputs)
+        translated, failures = self._translate_revision_chunks(plan.chunks, target_lang, source_lang,
+                                                               progress_callback, max_workers)
+        self.last_failures = failures
+        
+        segments = [seg for segs in outputs for seg in segs if seg[0].strip()]
+        reused_chars = sum(len(seg[0]) for seg in segments) - sum(len(seg[0]) for seg in pending)
+        self.last_reuse = {
+            "segments": len(segments),
+            "reused": len(segments) - len(pending),
+            "translated": len(pending),
+            "chunks": len(plan.chunks),
+            "reused_chars": reused_chars,
+            "total_chars": len(text),
+            "reuse_rate": reused_chars / len(text) if text else 0.0
+        }
+        if not pending and progress_callback:
+            progress_callback(1, 1)
+        return plan.assemble(translated)
+    
+    def _translate_revision_chunks(self, chunks: List[str], target_lang: str, source_lang: str,
+                                   progress_callback, max_workers: Optional[int]) -> tuple:
+        """
+        翻译增量翻译的分块，返回 (译文, 失败列表)
+        大模型后端：改动往往分散在各处、每块都很短，用 translate_batch 按编号打包进少量请求；
+        打包翻译后仍没有译文的分块再逐块翻译
+        """
+        translated: List = [None] * len(chunks)
+        if self.use_llm and self.llm_client and len(chunks) > 1:
+            try:
+                translated = self.translate_batch(chunks, target_lang, source_lang, return_exceptions=True)
+            except Exception:
+                pass
+        missing = [i for i, t in enumerate(translated) if not isinstance(t, str)]
+        done = len(chunks) - len(missing)
+        if progress_callback and done:
+            progress_callback(done, len(chunks))
+        if not missing:
+            return translated, []
+        
+        def on_progress(completed: int, total: int):
             if progress_callback:
-                progress_callback(i + 1, len(chunks))
+                progress_callback(done + completed, len(chunks))
+        
+        retried, failures = self._translate_chunks([chunks[i] for i in missing], target_lang, source_lang,
+                                                   on_progress, max_workers)
+        for f in failures:
+            f["index"] = missing[f["index"]]
+        failed = {f["index"] for f in failures}
+        for i, t in zip(missing, retried):
+            translated[i] = t
+        if self.memory is not None:
+            self.memory.store([(chunks[i], translated[i]) for i in missing if i not in failed],
+                              source_lang, target_lang, self._backend_name())
+        return translated, failures
+    
+    def _plan_revision(self, outputs: List[List[list]]) -> '_DocumentPlan':
+        """
+        把增量翻译的片段排成输出单元：复用的译文为文本单元，相邻的待翻译片段（可跨段落）按原文拼接，
+        在分块限制内合并成一块，超长片段按句子切分
+        """
+        splitter = self._splitter()
+        plan = _DocumentPlan([], [])
+        span: List[str] = []
+        span_sep = ""
+        chars = tokens = 0
         
-        return "\n\n".join(translated_chunks)
+        def close_span():
+            nonlocal chars, tokens
+            if span:
+                plan.add_chunk("".join(span), span_sep)
+                span.clear()
+                chars = tokens = 0
+        
+        out_sep = src_sep = ""
+        for p, segments in enumerate(outputs):
+            for k, (source, translation, tail, source_tail) in enumerate(segments):
+                if k == 0 and p > 0:
+                    out_sep = src_sep = "\n\n"
+                if translation is not None:
+                    close_span()
+                    plan.add_text(translation, out_sep)
+                else:
+                    seg_chars, seg_tokens = len(source), splitter.tokens(source)
+                    if not splitter.fits(seg_chars, seg_tokens):
+                        close_span()
+                        pieces, separators = splitter.split_with_separators(source)
+                        for j, (sep, piece) in enumerate(zip(separators, pieces)):
+                            plan.add_chunk(piece, sep if j else out_sep + sep)
+                    elif span and splitter.fits(chars + len(src_sep) + seg_chars, tokens + seg_tokens):
+                        span.extend((src_sep, source))
+                        chars += len(src_sep) + seg_chars
+                        tokens += seg_tokens
+                    else:
+                        close_span()
+                        span.append(source)
+                        span_sep = out_sep
+                        chars, tokens = seg_chars, seg_tokens
+                out_sep, src_sep = tail, source_tail
+        close_span()
+        return plan
+    
+    @staticmethod
+    def _diff_sentences(old_paragraph: str, old_translation: str, paragraph: str) -> List[list]:
+        """
+        改动段落的句子级对比
+        上一版原文与译文句子数一致时视为一一对应，复用未改动句子的译文；否则整段重新翻译
+        """
+        old_sentences = split_sentences(old_paragraph)
+        old_translated = split_sentences(old_translation)
+        sentences = split_sentences(paragraph)
+        if len(old_sentences) != len(old_translated) or len(old_sentences) < 2:
+            return [[paragraph, None, "", ""]]
+        
+        # 新句子沿用译文中最常见的句间分隔（如中文无空格、英文一个空格）
+        tails = [tail for _, tail in old_translated[:-1] if "\n" not in tail]
+        default_tail = max(set(tails), key=tails.count) if tails else ""
+        segments = []
+        matcher = difflib.SequenceMatcher(None, [normalize_segment(b) for b, _ in old_sentences],
+                                          [normalize_segment(b) for b, _ in sentences], autojunk=False)
+        for op, i1, i2, j1, j2 in matcher.get_opcodes():
+            for k, j in enumerate(range(j1, j2)):
+                body, tail = sentences[j]
+                source_tail = tail
+                reused = old_translated[i1 + k] if op == "equal" else None
+                if j == len(sentences) - 1 or "\n" in tail:
+                    # 段落末尾和原文中的换行保持原样
+                    pass
+                elif reused is not None and reused[1]:
+                    tail = reused[1]
+                else:
+                    tail = default_tail
+                if reused is not None:
+                    segments.append([body, reused[0], tail, source_tail])
+                else:
+                    segments.append([body, None if body else "", tail, source_tail])
+        return segments
+    
+    def translate_pages(self,
+                        pages: Iterable[Dict],
+                        target_lang: str = "中文",
+                        source_lang: str = "auto",
+                        max_workers: Optional[int] = None,
+                        window: Optional[int] = None,
+                        doc_hash: Optional[str] = None,
+                        job_name: str = "") -> Generator[Dict, None, None]:
+        """
+        按页流水线翻译：边提取边翻译，按页码顺序返回
+        pages: DocumentProcessor.iter_pages() 等产生 {"page": 页码, "content": 文本} 的可迭代对象
+        window: 同时在途的最多页数（默认 max_workers 的两倍），读取下一页前会等待最早的页完成，
+            因此内存只与窗口大小有关，第一页在后面的页解析之前就已开始翻译
+        doc_hash: 文档标识（如文件哈希），有任务存储时用于保存检查点和断点续传
+        yield: 页面字典加上 "translation" 字段
+        失败的分块保留原文，并记录在 self.last_failures 中（含页码）
+        """
+        workers = max(1, max_workers or self.max_workers)
+        window = max(1, window or workers * 2)
+        self.last_failures = []
+        self.last_job_id = None
+        saved: Dict[str, str] = {}
+        if self.jobs is not None and doc_hash:
+            saved = self._open_job("", target_lang, source_lang, 0, job_name, doc_hash)
+        
+        executor = ThreadPoolExecutor(max_workers=workers)
+        inflight = deque()
+        chunk_count = 0
+        try:
+            for page in pages:
+                plan = self._plan_document(page.get("content", ""), target_lang, source_lang)
+                tasks = []
+                for chunk in plan.chunks:
+                    translation = saved.get(text_hash(chunk)) if saved else None
+                    if translation is None:
+                        translation = executor.submit(self._translate_chunk_with_retry,
+                                                      chunk, target_lang, source_lang)
+                    tasks.append(translation)
+                chunk_count += len(tasks)
+                inflight.append((page, plan, tasks))
+                # 窗口已满时等待最早的页；最早的页已完成时立即返回
+                while inflight and (len(inflight) >= window or self._page_ready(inflight[0][2])):
+                    yield self._collect_page(*inflight.popleft(), target_lang, source_lang)
+            while inflight:
+                yield self._collect_page(*inflight.popleft(), target_lang, source_lang)
+            if self.last_job_id is not None:
+                self.jobs.finish(self.last_job_id, len(self.last_failures), chunk_count)
+        finally:
+            # 调用方提前停止读取时，取消尚未开始的分块
+            executor.shutdown(wait=False, cancel_futures=True)
+    
+    @staticmethod
+    def _page_ready(tasks: List) -> bool:
+        return all(isinstance(t, str) or t.done() for t in tasks)
+    
+    def _collect_page(self, page: Dict, plan: '_DocumentPlan', tasks: List,
+                      target_lang: str, source_lang: str) -> Dict:
+        """等待一页的所有分块完成并拼接译文"""
+        results = []
+        for c, task in enumerate(tasks):
+            if isinstance(task, str):
+                results.append(task)
+                continue
+            try:
+                translated = task.result()
+            except Exception as e:
+                results.append(plan.chunks[c])
+                self.last_failures.append({"page": page.get("page"), "index": c, "error": str(e)})
+                continue
+            self._chunk_done(plan, c, translated, target_lang, source_lang)
+            results.append(translated)
+        return dict(page, translation=plan.assemble(results))
     
     def translate_document_stream(self, 
                                   text: str, 
-                                  target_lang: str = "中文") -> Generator[tuple, None, None]:
+                                  target_lang: str = "中文",
+                                  source_lang: str = "auto",
+                                  max_workers: Optional[int] = None) -> Generator[tuple, None, None]:
         """
-        流式翻译文档
-        yield: (chunk_index, total_chunks, translated_chunk)
+        流式翻译文档（并发翻译，按原文顺序输出）
+        yield: (chunk_index, total_chunks, translated_chunk)，chunk_index 从1开始
         """
-        chunks = self._split_text(text)
-        
-        for i, chunk in enumerate(chunks):
-            translated = self.translate_text(chunk, target_lang)
-            yield (i + 1, len(chunks), translated)
+        pending: Dict[int, str] = {}
+        next_index = 0
+        for index, total, translated, _ in self.translate_document_unordered(
+                text, target_lang, source_lang, max_workers):
+            pending[index] = translated
+            while next_index in pending:
+                yield (next_index + 1, total, pending.pop(next_index))
+                next_index += 1
+
+
+class _DocumentPlan:
+    """文档翻译计划：按原文顺序排列的输出单元，以及需要翻译的分块"""
+    
+    def __init__(self, units: List[tuple], chunks: List[str]):
+        # units: (前置分隔符, "text", 译文) 或 (前置分隔符, "chunk", 分块序号)
+        self.units = units
+        self.chunks = chunks
+    
+    def next_separator(self) -> str:
+        """下一个单元默认的前置分隔符（段落之间为空行）"""
+        return "\n\n" if self.units else ""
+    
+    def _separator(self, separator: Optional[str]) -> str:
+        return self.next_separator() if separator is None else separator
+    
+    def add_text(self, text: str, separator: Optional[str] = None):
+        self.units.append((self._separator(separator), "text", text))
+    
+    def add_chunk(self, chunk: str, separator: Optional[str] = None):
+        self.units.append((self._separator(separator), "chunk", len(self.chunks)))
+        self.chunks.append(chunk)
+    
+    def with_translations(self, translations: List[Optional[str]]) -> '_DocumentPlan':
+        """已有译文（与 chunks 对应，None 为没有）的分块换成文本单元，返回新的计划"""
+        plan = _DocumentPlan([], [])
+        for sep, kind, value in self.units:
+            if kind == "chunk" and translations[value] is None:
+                plan.units.append((sep, "chunk", len(plan.chunks)))
+                plan.chunks.append(self.chunks[value])
+            elif kind == "chunk":
+                plan.units.append((sep, "text", translations[value]))
+            else:
+                plan.units.append((sep, kind, value))
+        return plan
+    
+    def assemble(self, results: List[str]) -> str:
+        return "".join(sep + (value if kind == "text" else results[value]) for sep, kind, value in self.units)
@@ -4,6 +4,8 @@
 from duckduckgo_search import DDGS
 from typing import List, Dict
 
+from .token_budget import PromptBudget
+
 
 class WebSearcher:
     """网络搜索器"""
@@ -55,11 +57,16 @@ def search_and_summarize(query: str, llm_client, max_results: int = 5) -> str:
     if not results or "error" in results[0]:
         return "搜索失败，请稍后重试"
     
-    # 格式化搜索结果
+    # 格式化搜索结果（按模型上下文窗口截断）
     search_content = "\n\n".join([
         f"来源: {r['title']}\n{r['body']}"
         for r in results
     ])
+    budget = PromptBudget(getattr(llm_client, "model", None))
+    budget.add("instructions", query + "请综合以上信息，给出简洁准确的回答。如果信息不足，请说明。",
+               priority=10, truncatable=False)
+    budget.add("search", search_content)
+    search_content = budget.pack()["search"]
     
     prompt = f"""基于以下搜索结果回答问题：{query}
 
@@ -0,0 +1,68 @@
+"""
+iter_docx_paragraphs 与 python-docx 的段落文本对比
+"""
+import sys
+from pathlib import Path
+
+import pytest
+
+docx = pytest.importorskip("docx")
+from docx.oxml import parse_xml
+from docx.oxml.ns import nsdecls
+from docx.enum.text import WD_BREAK
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from modules.document_processor import iter_docx_paragraphs
+
+
+# 文本框：同一内容在 mc:Choice（wps:txbx）和 mc:Fallback（v:textbox）中各存一份
+TEXTBOX_RUN = (
+    '<w:r %s xmlns:mc="http://schemas.openxmlformats.org/markup-compatibility/2006"'
+    ' xmlns:wps="http://schemas.microsoft.com/office/word/2010/wordprocessingShape"'
+    ' xmlns:v="urn:schemas-microsoft-com:vml">'
+    '<mc:AlternateContent>'
+    '<mc:Choice Requires="wps"><w:drawing><wps:txbx><w:txbxContent>'
+    '<w:p><w:r><w:t>BOX</w:t></w:r></w:p>'
+    '</w:txbxContent></wps:txbx></w:drawing></mc:Choice>'
+    '<mc:Fallback><w:pict><v:textbox><w:txbxContent>'
+    '<w:p><w:r><w:t>BOX</w:t></w:r></w:p>'
+    '</w:txbxContent></v:textbox></w:pict></mc:Fallback>'
+    '</mc:AlternateContent></w:r>'
+) % nsdecls("w")
+
+HYPERLINK = (
+    '<w:hyperlink %s r:id="rId99"><w:r><w:t>link</w:t></w:r></w:hyperlink>'
+) % nsdecls("w", "r")
+
+
+def _make_document(path: Path):
+    document = docx.Document()
+    
+    paragraph = document.add_paragraph("main")
+    paragraph._p.append(parse_xml(TEXTBOX_RUN))
+    
+    paragraph = document.add_paragraph()
+    run = paragraph.add_run("before")
+    run.add_break(WD_BREAK.PAGE)
+    run.add_text("after")
+    run.add_break(WD_BREAK.COLUMN)
+    run.add_break()
+    run.add_text("line\tend")
+    
+    paragraph = document.add_paragraph("see ")
+    paragraph._p.append(parse_xml(HYPERLINK))
+    
+    document.add_paragraph("")
+    table = document.add_table(rows=1, cols=1)
+    table.cell(0, 0).text = "in table"
+    document.add_paragraph("last")
+    document.save(str(path))
+
+
+def test_matches_python_docx(tmp_path):
+    path = tmp_path / "sample.docx"
+    _make_document(path)
+    
+    expected = [p.text for p in docx.Document(str(path)).paragraphs]
+    assert list(iter_docx_paragraphs(str(path))) == expected
+    assert expected[:3] == ["main", "beforeafter\nline\tend", "see link"]
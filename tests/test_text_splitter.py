@@ -0,0 +1,41 @@
+"""
+TextSplitter 分块的长度限制与还原
+"""
+import random
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from modules.text_splitter import TextSplitter
+
+
+def _rejoin(chunks, separators):
+    return "".join(sep + chunk for sep, chunk in zip(separators, chunks))
+
+
+def test_paragraph_trailing_whitespace_respects_limit():
+    splitter = TextSplitter(4000)
+    for text in ["a" * 3990 + "\n" + " " * 200 + "\n\nnext",
+                 "Sentence. " * 399 + "x" * 9 + " " * 3000 + "\n\nnext",
+                 "x\n\n" + " " * 9000]:
+        chunks, separators = splitter.split_with_separators(text)
+        assert max(len(c) for c in chunks) <= 4000
+        assert _rejoin(chunks, separators) == text
+
+
+def test_leading_whitespace_is_kept():
+    text = "\n" + "x" * 45 + " ？ e.g. \n"
+    chunks, separators = TextSplitter(50).split_with_separators(text)
+    assert separators[0] == "\n"
+    assert _rejoin(chunks, separators) == text
+
+
+def test_random_texts_fit_and_rejoin():
+    rnd = random.Random(0)
+    alphabet = ["a", "b ", "。", ". ", "\n", "\n\n", " ", "   ", "，", "!", "x" * 30, "\t"]
+    for _ in range(2000):
+        max_chars = rnd.choice([10, 30, 50, 120])
+        text = "".join(rnd.choice(alphabet) for _ in range(rnd.randint(0, 200)))
+        chunks, separators = TextSplitter(max_chars).split_with_separators(text)
+        assert all(len(c) <= max_chars for c in chunks)
+        assert _rejoin(chunks, separators) == text